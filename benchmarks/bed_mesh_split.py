@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# Measure bed_mesh move splitting throughput on a 50x50 mesh
+#
+# This file may be distributed under the terms of the GNU GPLv3 license.
+import sys, pathlib, optparse, time, random, math
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent))
+from klippy.extras import bed_mesh  # noqa: E402
+
+
+class BenchConfig:
+    def __init__(self, options):
+        self.options = options
+
+    def getfloat(self, option, default, minval=None):
+        return self.options.get(option, default)
+
+
+def build_mesh(count, pps):
+    params = {
+        "min_x": 10.0,
+        "max_x": 290.0,
+        "min_y": 10.0,
+        "max_y": 290.0,
+        "x_count": count,
+        "y_count": count,
+        "mesh_x_pps": pps,
+        "mesh_y_pps": pps,
+        "algo": "bicubic" if pps else "direct",
+        "tension": 0.2,
+    }
+    # A warped bed with some probing noise
+    rand = random.Random(42)
+    matrix = [
+        [
+            0.2 * math.sin(i / count * 2.5) * math.cos(j / count * 3.0)
+            + rand.uniform(-0.005, 0.005)
+            for i in range(count)
+        ]
+        for j in range(count)
+    ]
+    z_mesh = bed_mesh.ZMesh(params, "bench")
+    z_mesh.build_mesh(matrix)
+    return z_mesh
+
+
+def generate_moves(count, length):
+    rand = random.Random(42)
+    pos = [150.0, 150.0, 0.2, 0.0]
+    positions = [pos]
+    for i in range(count):
+        x = min(max(pos[0] + rand.uniform(-length, length), 0.0), 300.0)
+        y = min(max(pos[1] + rand.uniform(-length, length), 0.0), 300.0)
+        pos = [x, y, 0.2, pos[3] + 0.1]
+        positions.append(pos)
+    return positions
+
+
+def measure_split(z_mesh, positions, check_distance):
+    config = BenchConfig(
+        {"move_check_distance": check_distance, "split_delta_z": 0.01}
+    )
+    splitter = bed_mesh.MoveSplitter(config, None)
+    splitter.initialize(z_mesh, 0.0)
+    segments = 0
+    start = time.perf_counter()
+    for i in range(len(positions) - 1):
+        moves = splitter.split_move(positions[i], positions[i + 1], 1.0)
+        segments += len(moves)
+    return segments, time.perf_counter() - start
+
+
+def main():
+    usage = "%prog [options]"
+    opts = optparse.OptionParser(usage)
+    opts.add_option(
+        "-n", "--count", type="int", default=20000, help="number of moves"
+    )
+    opts.add_option(
+        "-c",
+        "--check-distance",
+        type="float",
+        default=3.0,
+        help="bed_mesh move_check_distance",
+    )
+    options, args = opts.parse_args()
+    if args:
+        opts.error("Incorrect number of arguments")
+    numpy = bed_mesh.numpy
+    z_mesh = build_mesh(50, 0)
+    for length in [2.0, 20.0, 200.0]:
+        positions = generate_moves(options.count, length)
+        for name, module in [("python", None), ("numpy", numpy)]:
+            if name == "numpy" and numpy is None:
+                continue
+            bed_mesh.numpy = module
+            segments, elapsed = measure_split(
+                z_mesh, positions, options.check_distance
+            )
+            print(
+                "%s split, moves up to %.0fmm: %d segments in %.3fs"
+                " (%.0f segments/s, %.0f moves/s)"
+                % (
+                    name,
+                    length,
+                    segments,
+                    elapsed,
+                    segments / elapsed,
+                    options.count / elapsed,
+                )
+            )
+    bed_mesh.numpy = numpy
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# Measure host cost of decoding accelerometer sensor_bulk_data messages
+#
+# This file may be distributed under the terms of the GNU GPLv3 license.
+import sys, pathlib, optparse, time, random, struct
+import numpy
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent))
+from klippy.extras import bulk_sensor, adxl345  # noqa: E402
+
+AXES_MAP = [(0, adxl345.SCALE_XY), (1, adxl345.SCALE_XY), (2, adxl345.SCALE_Z)]
+
+
+# The previous implementation that unpacks and converts each sample
+# in Python
+def python_decode(raw_samples, unpack_fmt, time_base, inv_freq):
+    unpack = struct.Struct(unpack_fmt)
+    unpack_from = unpack.unpack_from
+    bytes_per_sample = unpack.size
+    samples_per_block = bulk_sensor.MAX_BULK_MSG_SIZE // bytes_per_sample
+    samples = []
+    for params in raw_samples:
+        msg_cdiff = params["sequence"] * samples_per_block
+        data = params["data"]
+        for i in range(len(data) // bytes_per_sample):
+            ptime = time_base + (msg_cdiff + i) * inv_freq
+            samples.append((ptime,) + unpack_from(data, i * bytes_per_sample))
+    (x_pos, x_scale), (y_pos, y_scale), (z_pos, z_scale) = AXES_MAP
+    count = 0
+    for ptime, xlow, ylow, zlow, xzhigh, yzhigh in samples:
+        if yzhigh & 0x80:
+            continue
+        rx = (xlow | ((xzhigh & 0x1F) << 8)) - ((xzhigh & 0x10) << 9)
+        ry = (ylow | ((yzhigh & 0x1F) << 8)) - ((yzhigh & 0x10) << 9)
+        rz = (zlow | ((xzhigh & 0xE0) << 3) | ((yzhigh & 0xE0) << 6)) - (
+            (yzhigh & 0x40) << 7
+        )
+        raw_xyz = (rx, ry, rz)
+        x = round(raw_xyz[x_pos] * x_scale, 6)
+        y = round(raw_xyz[y_pos] * y_scale, 6)
+        z = round(raw_xyz[z_pos] * z_scale, 6)
+        samples[count] = (round(ptime, 6), x, y, z)
+        count += 1
+    del samples[count:]
+    return samples
+
+
+class Chip:
+    def __init__(self):
+        self.axes_map = AXES_MAP
+        self.last_error_count = 0
+
+
+def native_decode(decoder, raw_samples, time_base, inv_freq):
+    samples_per_block = (
+        bulk_sensor.MAX_BULK_MSG_SIZE // decoder.bytes_per_sample
+    )
+    datas = [params["data"] for params in raw_samples]
+    msg_clocks = [
+        params["sequence"] * samples_per_block for params in raw_samples
+    ]
+    samples = decoder.decode(datas, msg_clocks, time_base, inv_freq)
+    return adxl345.ADXL345._convert_samples(Chip(), samples)
+
+
+def main():
+    usage = "%prog [options]"
+    opts = optparse.OptionParser(usage)
+    opts.add_option(
+        "-s",
+        "--seconds",
+        type="float",
+        default=60.0,
+        help="seconds of 3200Hz adxl345 data to decode",
+    )
+    options, args = opts.parse_args()
+    if args:
+        opts.error("Incorrect number of arguments")
+    rand = random.Random(0)
+    unpack_fmt = "BBBBB"
+    samples_per_block = bulk_sensor.MAX_BULK_MSG_SIZE // 5
+    msg_count = int(options.seconds * 3200 / samples_per_block)
+    raw_samples = []
+    for seq in range(msg_count):
+        data = bytearray()
+        for i in range(samples_per_block):
+            # Random readings (with the adxl345 error bit clear)
+            data += bytes([rand.randrange(256) for j in range(4)])
+            data.append(rand.randrange(128))
+        raw_samples.append({"sequence": seq, "data": bytes(data)})
+    decoder = bulk_sensor.BulkDataDecoder(unpack_fmt)
+    time_base, inv_freq = 100.0, 1.0 / 3200.0
+    res = {}
+    for name, func in [
+        (
+            "python",
+            lambda: python_decode(raw_samples, unpack_fmt, time_base, inv_freq),
+        ),
+        (
+            "native",
+            lambda: native_decode(decoder, raw_samples, time_base, inv_freq),
+        ),
+    ]:
+        start = time.process_time()
+        res[name] = func()
+        elapsed = time.process_time() - start
+        print(
+            "%s: %d samples in %.3fs cpu (%.0f samples/s)"
+            % (name, len(res[name]), elapsed, len(res[name]) / elapsed)
+        )
+    # Results may differ in the last rounded digit (numpy.round() is
+    # not correctly rounded like the builtin round())
+    diff = numpy.abs(numpy.array(res["python"]) - numpy.array(res["native"]))
+    print("max difference: %.9f" % (diff.max(),))
+
+
+if __name__ == "__main__":
+    main()
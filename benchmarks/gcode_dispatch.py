@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# Measure the rate at which dense G1 moves are dispatched to gcode_move
+#
+# This file may be distributed under the terms of the GNU GPLv3 license.
+import sys, pathlib, optparse, time, random
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent))
+from klippy import gcode  # noqa: E402
+from klippy.extras import gcode_move  # noqa: E402
+
+
+class BenchMutex:
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *args):
+        pass
+
+
+class BenchReactor:
+    def mutex(self):
+        return BenchMutex()
+
+
+class BenchToolHead:
+    def __init__(self):
+        self.move_count = 0
+
+    def move(self, newpos, speed):
+        self.move_count += 1
+
+    def get_position(self):
+        return [0.0, 0.0, 0.0, 0.0]
+
+
+class BenchPrinter:
+    command_error = gcode.CommandError
+    config_error = Exception
+
+    def __init__(self):
+        self.event_handlers = {}
+        self.objects = {"toolhead": BenchToolHead()}
+        self.reactor = BenchReactor()
+
+    def get_start_args(self):
+        return {}
+
+    def get_reactor(self):
+        return self.reactor
+
+    def get_printer(self):
+        return self
+
+    def register_event_handler(self, event, callback):
+        self.event_handlers.setdefault(event, []).append(callback)
+
+    def send_event(self, event, *params):
+        return [cb(*params) for cb in self.event_handlers.get(event, [])]
+
+    def add_object(self, name, obj):
+        self.objects[name] = obj
+
+    def lookup_object(self, name, default=None):
+        return self.objects.get(name, default)
+
+
+def setup_printer():
+    printer = BenchPrinter()
+    printer.add_object("gcode", gcode.GCodeDispatch(printer))
+    printer.add_object("gcode_move", gcode_move.load_config(printer))
+    printer.send_event("klippy:ready")
+    return printer
+
+
+def generate_moves(count):
+    rand = random.Random(42)
+    e = 0.0
+    lines = ["G90", "M83", "G1 F3000"]
+    for i in range(count):
+        x = rand.uniform(10.0, 200.0)
+        y = rand.uniform(10.0, 200.0)
+        e += rand.uniform(0.01, 0.05)
+        lines.append("G1 X%.3f Y%.3f E%.5f" % (x, y, e))
+        if i % 50 == 0:
+            lines.append("G1 X%.3f Y%.3f F%d ; travel" % (x, y, 12000))
+    return lines
+
+
+def run_bench(lines, use_fast):
+    printer = setup_printer()
+    gc = printer.lookup_object("gcode")
+    if not use_fast:
+        gc.fast_handlers.clear()
+        gc._build_fast_handlers()
+    start = time.perf_counter()
+    for line in lines:
+        gc.run_script(line)
+    duration = time.perf_counter() - start
+    move_count = printer.lookup_object("toolhead").move_count
+    return duration, move_count
+
+
+def main():
+    usage = "%prog [options]"
+    opts = optparse.OptionParser(usage)
+    opts.add_option(
+        "-n", "--count", type="int", default=200000, help="number of moves"
+    )
+    options, args = opts.parse_args()
+    if args:
+        opts.error("Incorrect number of arguments")
+    lines = generate_moves(options.count)
+    results = {}
+    for name, use_fast in [("generic", False), ("fast", True)]:
+        duration, move_count = run_bench(lines, use_fast)
+        results[name] = len(lines) / duration
+        print(
+            "%-8s %d lines (%d moves) in %.3fs: %.0f lines/s"
+            % (name, len(lines), move_count, duration, results[name])
+        )
+    print("speedup: %.2fx" % (results["fast"] / results["generic"],))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,435 @@
+#!/usr/bin/env python3
+# Measure the motion pipeline by running klippy in batch mode over
+# standard G-Code workloads
+#
+# Rates are calculated from the run time in excess of an empty (startup
+# only) run.  Peak RSS is that of the whole klippy process - the stages
+# run interleaved in one process so a per-stage peak is not available,
+# but the peak of the startup run is reported for reference.
+#
+# This file may be distributed under the terms of the GNU GPLv3 license.
+import sys, os, pathlib, optparse, time, math, random, json, subprocess
+import tempfile, platform
+
+KLIPPER_DIR = pathlib.Path(__file__).parent.parent
+STATS_PREFIX = "BENCHMARK_STATS"
+# Rates are not reported unless the workload run time is well above the
+# variation of the startup time
+STARTUP_NOISE_FRACTION = 0.05
+MIN_RUN_TIME_FACTOR = 3.0
+
+CONFIG = """
+[mcu]
+serial: /dev/null
+
+[stepper_x]
+step_pin: gpio0
+dir_pin: gpio1
+enable_pin: !gpio2
+microsteps: 16
+rotation_distance: 40
+endstop_pin: ^gpio3
+position_endstop: 0
+position_max: 250
+homing_speed: 50
+
+[stepper_y]
+step_pin: gpio4
+dir_pin: gpio5
+enable_pin: !gpio6
+microsteps: 16
+rotation_distance: 40
+endstop_pin: ^gpio7
+position_endstop: 0
+position_max: 250
+homing_speed: 50
+
+[stepper_z]
+step_pin: gpio8
+dir_pin: gpio9
+enable_pin: !gpio10
+microsteps: 16
+rotation_distance: 8
+endstop_pin: ^gpio11
+position_endstop: 0.5
+position_max: 200
+
+[extruder]
+step_pin: gpio12
+dir_pin: gpio13
+enable_pin: !gpio14
+microsteps: 16
+rotation_distance: 33.5
+nozzle_diameter: 0.400
+filament_diameter: 1.750
+max_extrude_only_distance: 500
+heater_pin: gpio15
+sensor_type: EPCOS 100K B57560G104F
+sensor_pin: analog0
+control: pid
+pid_Kp: 22.2
+pid_Ki: 1.08
+pid_Kd: 114
+min_temp: 0
+max_temp: 250
+min_extrude_temp: 0
+
+[printer]
+kinematics: cartesian
+max_velocity: 300
+max_accel: 3000
+max_z_velocity: 5
+max_z_accel: 100
+
+[input_shaper]
+shaper_freq_x: 50
+shaper_freq_y: 50
+
+[gcode_arcs]
+
+[probe]
+pin: gpio20
+z_offset: 1.0
+
+[bed_mesh]
+mesh_min: 10, 10
+mesh_max: 240, 240
+probe_count: 5, 5
+fade_start: 1
+fade_end: 10
+
+[bed_mesh default]
+version: 1
+points:
+    0.100, 0.050, -0.020, 0.010, 0.030
+    0.120, 0.080, 0.000, -0.050, -0.020
+    0.150, 0.060, 0.030, -0.080, -0.040
+    0.200, 0.100, 0.010, -0.100, -0.060
+    0.180, 0.090, 0.020, -0.070, -0.030
+x_count: 5
+y_count: 5
+mesh_x_pps: 2
+mesh_y_pps: 2
+algo: bicubic
+tension: 0.2
+min_x: 10.0
+max_x: 240.0
+min_y: 10.0
+max_y: 240.0
+
+[stepper_stats]
+
+[gcode_macro BENCHMARK_REPORT]
+gcode:
+  {action_respond_info("%s %s" % (
+      params.PREFIX, printer.stepper_stats.steppers|tojson))}
+"""
+
+
+######################################################################
+# Workloads
+######################################################################
+
+
+def gcode_header(use_mesh=False):
+    return [
+        "G28",
+        "G90",
+        "M83",
+        use_mesh and "BED_MESH_PROFILE LOAD=default" or "BED_MESH_CLEAR",
+        "G1 Z0.2 F3000",
+    ]
+
+
+# Spiral outer wall with continuous Z rise
+def workload_vase(scale):
+    lines = gcode_header()
+    segments, radius, z = 120, 40.0, 0.2
+    lines.append("G1 X%.3f Y125.000 F6000" % (125.0 + radius,))
+    for layer in range(int(400 * scale)):
+        for i in range(1, segments + 1):
+            angle = 2.0 * math.pi * i / segments
+            z += 0.2 / segments
+            lines.append(
+                "G1 X%.3f Y%.3f Z%.4f E%.5f F3600"
+                % (
+                    125.0 + radius * math.cos(angle),
+                    125.0 + radius * math.sin(angle),
+                    z,
+                    0.07,
+                )
+            )
+    return lines
+
+
+# Many short arcs as produced by arc welding slicer plugins
+def workload_arcs(scale):
+    lines = gcode_header()
+    lines.append("G1 X50 Y50 F6000")
+    rand = random.Random(42)
+    x, y = 50.0, 50.0
+    for i in range(int(4000 * scale)):
+        nx = min(max(x + rand.uniform(-15.0, 15.0), 20.0), 230.0)
+        ny = min(max(y + rand.uniform(-15.0, 15.0), 20.0), 230.0)
+        chord = math.hypot(nx - x, ny - y)
+        if chord < 1.0:
+            continue
+        ci, cj = (nx - x) / 2.0, (ny - y) / 2.0
+        lines.append(
+            "G%d X%.3f Y%.3f I%.3f J%.3f E%.4f F4800"
+            % (2 + i % 2, nx, ny, ci - cj * 0.3, cj + ci * 0.3, chord * 0.033)
+        )
+        x, y = nx, ny
+    return lines
+
+
+# Long travel moves across a bed mesh
+def workload_mesh_travel(scale):
+    lines = gcode_header(use_mesh=True)
+    rand = random.Random(42)
+    for i in range(int(4000 * scale)):
+        lines.append(
+            "G1 X%.3f Y%.3f F12000"
+            % (rand.uniform(15.0, 235.0), rand.uniform(15.0, 235.0))
+        )
+    return lines
+
+
+# Dense rectilinear infill made of short extrusion segments
+def workload_infill(scale):
+    lines = gcode_header()
+    rand = random.Random(42)
+    x, y, direction = 50.0, 50.0, 1.0
+    lines.append("G1 X%.3f Y%.3f F9000" % (x, y))
+    for i in range(int(125000 * scale)):
+        length = rand.uniform(0.3, 2.0)
+        x += direction * length
+        if not 50.0 <= x <= 200.0:
+            direction = -direction
+            x = min(max(x, 50.0), 200.0)
+            y += 0.45
+            if y > 200.0:
+                y = 50.0
+        lines.append("G1 X%.3f Y%.3f E%.5f F9000" % (x, y, length * 0.033))
+    return lines
+
+
+WORKLOADS = {
+    "vase": workload_vase,
+    "arcs": workload_arcs,
+    "mesh_travel": workload_mesh_travel,
+    "infill": workload_infill,
+}
+
+
+######################################################################
+# Batch mode runs
+######################################################################
+
+
+class error(Exception):
+    pass
+
+
+def run_klippy(tempdir, name, config, lines, dictionary):
+    base = os.path.join(tempdir, name)
+    with open(base + ".cfg", "w") as f:
+        f.write(config)
+    lines = lines + ["BENCHMARK_REPORT PREFIX=%s" % (STATS_PREFIX,)]
+    with open(base + ".gcode", "w") as f:
+        f.write("\n".join(lines) + "\n")
+    args = [sys.executable, "-m", "klippy", base + ".cfg"]
+    args += ["-i", base + ".gcode", "-o", base + ".out"]
+    args += ["-d", dictionary, "-l", base + ".log"]
+    start = time.perf_counter()
+    proc = subprocess.Popen(args, cwd=str(KLIPPER_DIR))
+    pid, status, rusage = os.wait4(proc.pid, 0)
+    wall_time = time.perf_counter() - start
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    steppers = None
+    if not proc.returncode:
+        with open(base + ".log", "r") as f:
+            for line in f:
+                if line.startswith(STATS_PREFIX + " "):
+                    steppers = json.loads(line.split(" ", 1)[1])
+    if steppers is None:
+        raise error("Run of workload '%s' failed" % (name,))
+    return {
+        "lines": len(lines),
+        "wall_time": wall_time,
+        "cpu_time": rusage.ru_utime + rusage.ru_stime,
+        # ru_maxrss is reported in kilobytes on Linux
+        "peak_rss_kb": rusage.ru_maxrss,
+        "steps": sum(s["step_count"] for s in steppers.values()),
+        "gen_time": sum(s["gen_time"] for s in steppers.values()),
+        "flush_time": sum(s["flush_time"] for s in steppers.values()),
+    }
+
+
+def best_run(tempdir, name, config, lines, options):
+    runs = [
+        run_klippy(tempdir, name, config, lines, options.dictionary)
+        for i in range(options.repeat)
+    ]
+    best = min(runs, key=lambda r: r["wall_time"])
+    slowest = max(r["wall_time"] for r in runs)
+    best["wall_time_spread"] = slowest - best["wall_time"]
+    return best
+
+
+def summarize(res, startup):
+    run_time = res["wall_time"] - startup["wall_time"]
+    noise = max(
+        startup["wall_time_spread"],
+        STARTUP_NOISE_FRACTION * startup["wall_time"],
+    )
+    lines_per_sec = steps_per_sec = None
+    if run_time > MIN_RUN_TIME_FACTOR * noise:
+        lines_per_sec = round(res["lines"] / run_time, 1)
+        steps_per_sec = round(res["steps"] / run_time, 1)
+    gcode_time = run_time - res["gen_time"] - res["flush_time"]
+    return {
+        "lines": res["lines"],
+        "steps": res["steps"],
+        "wall_time": round(res["wall_time"], 4),
+        "cpu_time": round(res["cpu_time"], 4),
+        "lines_per_sec": lines_per_sec,
+        "steps_per_sec": steps_per_sec,
+        "peak_rss_kb": res["peak_rss_kb"],
+        "startup_peak_rss_kb": startup["peak_rss_kb"],
+        "stages": {
+            "startup": round(startup["wall_time"], 4),
+            "gcode_and_planning": round(max(gcode_time, 0.0), 4),
+            "step_generation": round(res["gen_time"], 4),
+            "step_compression": round(res["flush_time"], 4),
+        },
+    }
+
+
+def get_git_version():
+    try:
+        out = subprocess.check_output(
+            ["git", "describe", "--always", "--tags", "--long", "--dirty"],
+            cwd=str(KLIPPER_DIR),
+            stderr=subprocess.DEVNULL,
+        )
+        return out.decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "?"
+
+
+def format_rate(rate):
+    if rate is None:
+        return "n/a"
+    return "%.0f" % (rate,)
+
+
+def format_change(new, old):
+    if not new or not old:
+        return "   n/a "
+    return "%+6.1f%%" % (100.0 * (new / old - 1.0),)
+
+
+def compare(results, old_results):
+    print("Comparison with %s:" % (old_results.get("version", "?"),))
+    for name, res in results["workloads"].items():
+        old = old_results.get("workloads", {}).get(name)
+        if old is None:
+            continue
+        print(
+            "  %-12s wall %s  lines/s %s  steps/s %s  rss %s"
+            % (
+                name,
+                format_change(res["wall_time"], old["wall_time"]),
+                format_change(res["lines_per_sec"], old["lines_per_sec"]),
+                format_change(res["steps_per_sec"], old["steps_per_sec"]),
+                format_change(res["peak_rss_kb"], old["peak_rss_kb"]),
+            )
+        )
+
+
+def main():
+    usage = "%prog [options] <dictionary>"
+    opts = optparse.OptionParser(usage)
+    opts.add_option(
+        "-o", "--output", type="string", help="write JSON results to file"
+    )
+    opts.add_option(
+        "-c", "--compare", type="string", help="JSON results to compare with"
+    )
+    opts.add_option(
+        "-w",
+        "--workload",
+        action="append",
+        choices=list(WORKLOADS),
+        help="workload to run (may be repeated, default is all)",
+    )
+    opts.add_option(
+        "-s", "--scale", type="float", default=1.0, help="workload size"
+    )
+    opts.add_option(
+        "-r", "--repeat", type="int", default=3, help="runs per workload"
+    )
+    opts.add_option(
+        "--danger-option",
+        action="append",
+        default=[],
+        help="extra [danger_options] setting (eg, native_lookahead=True)",
+    )
+    options, args = opts.parse_args()
+    if len(args) != 1:
+        opts.error("Incorrect number of arguments")
+    options.dictionary = os.path.abspath(args[0])
+    config = CONFIG
+    if options.danger_option:
+        config += "\n[danger_options]\n%s\n" % (
+            "\n".join(o.replace("=", ": ", 1) for o in options.danger_option)
+        )
+    results = {
+        "version": get_git_version(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "scale": options.scale,
+        "danger_options": options.danger_option,
+        "workloads": {},
+    }
+    with tempfile.TemporaryDirectory(prefix="klippy-bench-") as tempdir:
+        startup = best_run(tempdir, "startup", config, [], options)
+        for name in options.workload or list(WORKLOADS):
+            lines = WORKLOADS[name](options.scale)
+            res = best_run(tempdir, name, config, lines, options)
+            res = results["workloads"][name] = summarize(res, startup)
+            stages = res["stages"]
+            print(
+                "%-12s %6d lines %9d steps  wall %.3fs  %s lines/s"
+                "  %s steps/s  rss %dKiB  (gcode %.3fs, stepgen %.3fs,"
+                " compress %.3fs)"
+                % (
+                    name,
+                    res["lines"],
+                    res["steps"],
+                    res["wall_time"],
+                    format_rate(res["lines_per_sec"]),
+                    format_rate(res["steps_per_sec"]),
+                    res["peak_rss_kb"],
+                    stages["gcode_and_planning"],
+                    stages["step_generation"],
+                    stages["step_compression"],
+                )
+            )
+            if res["lines_per_sec"] is None:
+                sys.stderr.write(
+                    "Warning: run time of workload '%s' is within the"
+                    " noise of klippy startup (%.3fs) - increase --scale"
+                    " to report rates\n" % (name, stages["startup"])
+                )
+    if options.output:
+        with open(options.output, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if options.compare:
+        with open(options.compare, "r") as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
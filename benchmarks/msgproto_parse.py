@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# Measure mcu message encoding and parsing throughput
+#
+# This file may be distributed under the terms of the GNU GPLv3 license.
+import sys, pathlib, optparse, time, json
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent))
+from klippy import msgproto  # noqa: E402
+
+MESSAGES = {
+    "stepper_position oid=%c pos=%i": [3, -1234567],
+    "analog_in_state oid=%c next_clock=%u value=%hu": [5, 3123456789, 2048],
+    "trsync_state oid=%c can_trigger=%c trigger_reason=%c clock=%u": [
+        2,
+        1,
+        0,
+        2123456789,
+    ],
+    "sensor_bulk_data oid=%c sequence=%hu data=%*s": [
+        7,
+        1234,
+        bytes(range(48)),
+    ],
+    "queue_step oid=%c interval=%u count=%hu add=%hi": [4, 41234, 120, -7],
+}
+
+
+def measure(func, args, count):
+    start = time.perf_counter()
+    for i in range(count):
+        func(*args)
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    usage = "%prog [options]"
+    opts = optparse.OptionParser(usage)
+    opts.add_option(
+        "-n", "--count", type="int", default=200000, help="messages per test"
+    )
+    options, args = opts.parse_args()
+    if args:
+        opts.error("Incorrect number of arguments")
+    identify = {"responses": {}, "commands": {}}
+    for i, msgformat in enumerate(MESSAGES):
+        identify["responses"][msgformat] = 10 + i
+    mp = msgproto.MessageParser()
+    mp.process_identify(json.dumps(identify).encode(), decompress=False)
+    for msgformat, params in MESSAGES.items():
+        mf = mp.messages_by_name[msgformat.split()[0]]
+        msg = [0, 0] + mf.encode(params) + [0, 0, 0]
+        res = []
+        for name, encode, parse in [
+            (
+                "generic",
+                (lambda p, mf=mf: msgproto.MessageFormat.encode(mf, p)),
+                (lambda s, mf=mf: msgproto.MessageFormat.parse(mf, s, 2)),
+            ),
+            ("compiled", mf.encode, (lambda s, mf=mf: mf.parse(s, 2))),
+        ]:
+            enc_rate = measure(encode, (params,), options.count)
+            parse_rate = measure(parse, (msg,), options.count)
+            res.append(
+                "%s encode %.0f/s parse %.0f/s" % (name, enc_rate, parse_rate)
+            )
+        full_rate = measure(mp.parse, (msg,), options.count)
+        print("%s:" % (mf.name,))
+        print("  %s" % (", ".join(res),))
+        print("  MessageParser.parse %.0f msgs/s" % (full_rate,))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# Measure reactor timer dispatch cost as the number of timers grows
+#
+# This file may be distributed under the terms of the GNU GPLv3 license.
+import sys, pathlib, optparse, time, bisect
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent))
+from klippy import reactor  # noqa: E402
+
+
+# The previous implementation that scans every timer on each pass
+# (with the same statistics tracking as the current implementation)
+class ScanReactor(reactor.SelectReactor):
+    def __init__(self):
+        reactor.SelectReactor.__init__(self)
+        self._timers = []
+
+    def update_timer(self, timer_handler, waketime):
+        timer_handler.waketime = waketime
+        self._next_timer = min(self._next_timer, waketime)
+
+    def register_timer(self, callback, waketime=reactor._NEVER):
+        timer_handler = reactor.ReactorTimer(callback, waketime)
+        self._timers = self._timers + [timer_handler]
+        self._next_timer = min(self._next_timer, waketime)
+        return timer_handler
+
+    def _check_timers(self, eventtime, busy):
+        if eventtime < self._next_timer:
+            return min(1.0, max(0.001, self._next_timer - eventtime))
+        self._next_timer = self.NEVER
+        for t in self._timers:
+            waketime = t.waketime
+            if eventtime >= waketime:
+                t.waketime = self.NEVER
+                start = self.monotonic()
+                if waketime > reactor._NOW:
+                    lateness = start - waketime
+                    self._lateness_counts[
+                        bisect.bisect(reactor.LATENESS_BUCKETS, lateness)
+                    ] += 1
+                    if lateness > self._max_lateness:
+                        self._max_lateness = lateness
+                t.waketime = waketime = t.callback(eventtime)
+                self._note_timer_call(t, self.monotonic() - start)
+            self._next_timer = min(self._next_timer, waketime)
+        return 0.0
+
+
+class PeriodicTimer:
+    def __init__(self, r, interval, offset):
+        self.interval = interval
+        self.timer = r.register_timer(self.callback, offset)
+
+    def callback(self, eventtime):
+        return eventtime + self.interval
+
+
+def measure(reactor_class, timer_count, passes):
+    r = reactor_class()
+    # Mostly idle timers (eg, temperature sensors, fans and tmc checks)
+    # plus a few frequent ones (eg, serial flushing and step generation)
+    for i in range(timer_count):
+        interval = 0.001 if i < 4 else 0.100 + 0.9 * i / timer_count
+        PeriodicTimer(r, interval, i * 0.0001)
+    # Simulate the dispatch loop with 250us between passes
+    eventtime = 0.0
+    start = time.perf_counter()
+    for i in range(passes):
+        eventtime += 0.00025
+        r._check_timers(eventtime, False)
+    elapsed = time.perf_counter() - start
+    r.finalize()
+    return elapsed / passes
+
+
+def main():
+    usage = "%prog [options]"
+    opts = optparse.OptionParser(usage)
+    opts.add_option(
+        "-n",
+        "--passes",
+        type="int",
+        default=20000,
+        help="number of dispatch loop passes",
+    )
+    options, args = opts.parse_args()
+    if args:
+        opts.error("Incorrect number of arguments")
+    for timer_count in [10, 50, 200, 1000, 5000]:
+        res = []
+        for name, reactor_class in [
+            ("scan", ScanReactor),
+            ("heap", reactor.SelectReactor),
+        ]:
+            per_pass = measure(reactor_class, timer_count, options.passes)
+            res.append("%s %.2fus" % (name, per_pass * 1000000.0))
+        print("%5d timers: %s per pass" % (timer_count, ", ".join(res)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# Measure memory use and look-ahead processing time of toolhead moves
+#
+# This file may be distributed under the terms of the GNU GPLv3 license.
+import sys, pathlib, optparse, time, random, math, gc, tracemalloc
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent))
+from klippy import toolhead  # noqa: E402
+
+
+class BenchExtruder:
+    def calc_junction(self, prev_move, move):
+        return move.max_cruise_v2
+
+
+class BenchToolHead:
+    def __init__(self):
+        self.max_velocity = 300.0
+        self.max_accel = 3000.0
+        self.max_accel_to_decel = 1500.0
+        scv2 = 5.0**2
+        self.junction_deviation = scv2 * (math.sqrt(2.0) - 1.0) / 3000.0
+        self.extruder = BenchExtruder()
+        self.processed = 0
+
+    def _process_moves(self, moves):
+        self.processed += len(moves)
+
+
+def generate_positions(count):
+    rand = random.Random(42)
+    pos = [100.0, 100.0, 0.2, 0.0]
+    positions = [list(pos)]
+    for i in range(count):
+        angle = i * 0.05
+        pos = [
+            100.0 + 50.0 * math.cos(angle) + rand.uniform(-0.01, 0.01),
+            100.0 + 50.0 * math.sin(angle) + rand.uniform(-0.01, 0.01),
+            0.2,
+            pos[3] + 0.01,
+        ]
+        positions.append(pos)
+    return positions
+
+
+def measure_memory(positions):
+    th = BenchToolHead()
+    gc.collect()
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+    moves = [
+        toolhead.Move(th, positions[i], positions[i + 1], 100.0)
+        for i in range(len(positions) - 1)
+    ]
+    used = tracemalloc.get_traced_memory()[0] - start
+    tracemalloc.stop()
+    return used / len(moves)
+
+
+def measure_lookahead(positions, queue_class, flush_time):
+    th = BenchToolHead()
+    queue = queue_class(th)
+    queue.set_flush_time(flush_time)
+    gc.collect()
+    start_gc = sum(s["collections"] for s in gc.get_stats())
+    start = time.perf_counter()
+    for i in range(len(positions) - 1):
+        move = toolhead.Move(th, positions[i], positions[i + 1], 100.0)
+        queue.add_move(move)
+    add_time = time.perf_counter() - start
+    start = time.perf_counter()
+    queue.flush()
+    flush_time = time.perf_counter() - start
+    gc_count = sum(s["collections"] for s in gc.get_stats()) - start_gc
+    return add_time, flush_time, gc_count, th.processed
+
+
+def main():
+    usage = "%prog [options]"
+    opts = optparse.OptionParser(usage)
+    opts.add_option(
+        "-n", "--count", type="int", default=100000, help="number of moves"
+    )
+    options, args = opts.parse_args()
+    if args:
+        opts.error("Incorrect number of arguments")
+    positions = generate_positions(options.count)
+    per_move = measure_memory(positions)
+    print("memory: %.0f bytes per buffered move" % (per_move,))
+    tests = [
+        ("python", toolhead.LookAheadQueue),
+        ("native", toolhead.NativeLookAheadQueue),
+    ]
+    # Test lazy flushing of a normal queue and a single flush of a
+    # very long queue
+    for flush_name, queue_flush_time in [("lazy", 2.0), ("long", 1e9)]:
+        for name, queue_class in tests:
+            res = measure_lookahead(positions, queue_class, queue_flush_time)
+            add_time, flush_time, gc_count, processed = res
+            print(
+                "%s %s lookahead: %d moves, add %.3fs (%.0f moves/s),"
+                " final flush %.3fs, %d gc collections"
+                % (
+                    name,
+                    flush_name,
+                    processed,
+                    add_time,
+                    processed / add_time,
+                    flush_time,
+                    gc_count,
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -23,10 +23,13 @@ SOURCE_FILES = [
     "serialqueue.c",
     "stepcompress.c",
     "itersolve.c",
+    "stepgen.c",
     "trapq.c",
+    "lookahead.c",
     "pollreactor.c",
     "msgblock.c",
     "trdispatch.c",
+    "sensor_bulk.c",
     "kin_cartesian.c",
     "kin_corexy.c",
     "kin_corexz.c",
@@ -38,6 +41,7 @@ SOURCE_FILES = [
     "kin_extruder.c",
     "kin_shaper.c",
     "kin_idex.c",
+    "kin_mesh.c",
 ]
 DEST_LIB = "c_helper.so"
 OTHER_FILES = [
@@ -58,6 +62,11 @@ defs_stepcompress = """
         int step_count, interval, add;
     };
 
+    struct stepcompress_stats {
+        uint64_t step_count, queue_step_count;
+        double gen_time, flush_time;
+    };
+
     struct stepcompress *stepcompress_alloc(uint32_t oid);
     void stepcompress_fill(struct stepcompress *sc, uint32_t max_error
         , int32_t queue_step_msgtag, int32_t set_next_step_dir_msgtag);
@@ -76,6 +85,9 @@ defs_stepcompress = """
     int stepcompress_extract_old(struct stepcompress *sc
         , struct pull_history_steps *p, int max
         , uint64_t start_clock, uint64_t end_clock);
+    void stepcompress_set_stats_enabled(struct stepcompress *sc, int enabled);
+    void stepcompress_get_stats(struct stepcompress *sc
+        , struct stepcompress_stats *s);
 
     struct steppersync *steppersync_alloc(struct serialqueue *sq
         , struct stepcompress **sc_list, int sc_num, int move_num);
@@ -102,6 +114,16 @@ defs_itersolve = """
     double itersolve_get_commanded_pos(struct stepper_kinematics *sk);
 """
 
+defs_stepgen = """
+    struct stepgen_pool *stepgen_pool_alloc(int num_threads);
+    void stepgen_pool_free(struct stepgen_pool *sp);
+    int32_t stepgen_pool_generate(struct stepgen_pool *sp
+        , struct stepper_kinematics **sks, int sk_num, double flush_time);
+    int32_t stepgen_pool_flush(struct stepgen_pool *sp
+        , struct steppersync **ss_list, uint64_t *move_clocks
+        , uint64_t *clear_history_clocks, int ss_num);
+"""
+
 defs_trapq = """
     struct pull_move {
         double print_time, move_t;
@@ -125,6 +147,19 @@ defs_trapq = """
         , double start_time, double end_time);
 """
 
+defs_lookahead = """
+    struct lookahead *lookahead_alloc(void);
+    void lookahead_free(struct lookahead *la);
+    void lookahead_reset(struct lookahead *la);
+    int lookahead_add_move(struct lookahead *la, double move_d, double accel
+        , double max_start_v2, double max_cruise_v2, double delta_v2
+        , double max_smoothed_v2, double smooth_delta_v2);
+    int lookahead_flush(struct lookahead *la, int lazy);
+    void lookahead_get_junctions(struct lookahead *la, double *junctions
+        , int count);
+    void lookahead_pop_moves(struct lookahead *la, int count);
+"""
+
 defs_kin_cartesian = """
     struct stepper_kinematics *cartesian_stepper_alloc(char axis);
 """
@@ -186,6 +221,24 @@ defs_kin_idex = """
     struct stepper_kinematics * dual_carriage_alloc(void);
 """
 
+defs_kin_mesh = """
+    struct bed_mesh_grid *bed_mesh_grid_alloc(void);
+    void bed_mesh_grid_free(struct bed_mesh_grid *g);
+    int bed_mesh_grid_set(struct bed_mesh_grid *g, int x_count, int y_count
+        , double min_x, double min_y, double dist_x, double dist_y
+        , double z[]);
+    void bed_mesh_grid_set_params(struct bed_mesh_grid *g, double offset_x
+        , double offset_y, double fade_start, double fade_end
+        , double fade_target, double tool_offset);
+    double bed_mesh_grid_calc_adjust(struct bed_mesh_grid *g, double x
+        , double y, double z);
+    int bed_mesh_stepper_set_sk(struct stepper_kinematics *sk
+        , struct stepper_kinematics *orig_sk, struct bed_mesh_grid *grid);
+    void bed_mesh_stepper_set_active(struct stepper_kinematics *sk
+        , int is_active);
+    struct stepper_kinematics * bed_mesh_stepper_alloc(void);
+"""
+
 defs_serialqueue = """
     #define MESSAGE_MAX 64
     struct pull_queue_message {
@@ -230,6 +283,15 @@ defs_trdispatch = """
         , uint64_t expire_ticks, uint64_t min_extend_ticks);
 """
 
+defs_sensor_bulk = """
+    struct sensor_bulk_decoder *sensor_bulk_decoder_alloc(const char *format);
+    void sensor_bulk_decoder_free(struct sensor_bulk_decoder *sbd);
+    int sensor_bulk_decode(struct sensor_bulk_decoder *sbd
+        , const uint8_t *data, const int *data_lens, const double *msg_clocks
+        , int msg_count, double time_base, double inv_freq
+        , double *out, int max_rows);
+"""
+
 defs_pyhelper = """
     void set_python_logging_callback(void (*func)(const char *));
     double get_monotonic(void);
@@ -245,8 +307,11 @@ defs_all = [
     defs_std,
     defs_stepcompress,
     defs_itersolve,
+    defs_stepgen,
     defs_trapq,
+    defs_lookahead,
     defs_trdispatch,
+    defs_sensor_bulk,
     defs_kin_cartesian,
     defs_kin_corexy,
     defs_kin_corexz,
@@ -258,6 +323,7 @@ defs_all = [
     defs_kin_extruder,
     defs_kin_shaper,
     defs_kin_idex,
+    defs_kin_mesh,
 ]
 
 
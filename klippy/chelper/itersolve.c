@@ -143,8 +143,8 @@ check_active(struct stepper_kinematics *sk, struct move *m)
 }
 
 // Generate step times for a range of moves on the trapq
-int32_t __visible
-itersolve_generate_steps(struct stepper_kinematics *sk, double flush_time)
+static int32_t
+generate_steps(struct stepper_kinematics *sk, double flush_time)
 {
     double last_flush_time = sk->last_flush_time;
     sk->last_flush_time = flush_time;
@@ -211,6 +211,18 @@ itersolve_generate_steps(struct stepper_kinematics *sk, double flush_time)
     }
 }
 
+// Generate step times for a range of moves on the trapq
+int32_t __visible
+itersolve_generate_steps(struct stepper_kinematics *sk, double flush_time)
+{
+    if (likely(!sk->sc || !stepcompress_stats_enabled(sk->sc)))
+        return generate_steps(sk, flush_time);
+    double start = get_monotonic();
+    int32_t ret = generate_steps(sk, flush_time);
+    stepcompress_note_gen_time(sk->sc, get_monotonic() - start);
+    return ret;
+}
+
 // Check if the given stepper is likely to be active in the given time range
 double __visible
 itersolve_check_active(struct stepper_kinematics *sk, double flush_time)
@@ -0,0 +1,210 @@
+// Bed mesh z compensation applied during stepper pulse time generation
+//
+// This file may be distributed under the terms of the GNU GPLv3 license.
+
+#include <math.h> // floor
+#include <stddef.h> // offsetof
+#include <stdlib.h> // malloc
+#include <string.h> // memset
+#include "compiler.h" // __visible
+#include "itersolve.h" // struct stepper_kinematics
+#include "trapq.h" // struct move
+
+
+/****************************************************************
+ * Mesh grid
+ ****************************************************************/
+
+struct bed_mesh_grid {
+    int x_count, y_count;
+    double min_x, min_y, dist_x, dist_y;
+    double offset_x, offset_y;
+    double fade_start, fade_end, fade_target, tool_offset;
+    double *z;
+};
+
+// Locate the mesh cell of a coordinate (matches ZMesh._get_linear_index)
+static inline double
+get_linear_index(double coord, double mesh_min, double mesh_dist, int count
+                 , int *idx)
+{
+    double pos = floor((coord - mesh_min) / mesh_dist);
+    if (pos < 0.)
+        pos = 0.;
+    if (pos > count - 2)
+        pos = count - 2;
+    *idx = pos;
+    double t = (coord - (mesh_min + mesh_dist * *idx)) / mesh_dist;
+    return t < 0. ? 0. : (t > 1. ? 1. : t);
+}
+
+static inline double
+lerp(double t, double v0, double v1)
+{
+    return (1. - t) * v0 + t * v1;
+}
+
+// Bilinear interpolation of the mesh (matches ZMesh.calc_z)
+static double
+grid_calc_z(struct bed_mesh_grid *g, double x, double y)
+{
+    int xidx, yidx;
+    double tx = get_linear_index(x + g->offset_x, g->min_x, g->dist_x
+                                 , g->x_count, &xidx);
+    double ty = get_linear_index(y + g->offset_y, g->min_y, g->dist_y
+                                 , g->y_count, &yidx);
+    double *row0 = &g->z[yidx * g->x_count], *row1 = row0 + g->x_count;
+    double z0 = lerp(tx, row0[xidx], row0[xidx + 1]);
+    double z1 = lerp(tx, row1[xidx], row1[xidx + 1]);
+    return lerp(ty, z0, z1);
+}
+
+// Return the z adjustment at a position (matches BedMesh.get_z_factor)
+double __visible
+bed_mesh_grid_calc_adjust(struct bed_mesh_grid *g, double x, double y
+                          , double z)
+{
+    if (!g->z)
+        return 0.;
+    double fade_z = z + g->tool_offset, factor = 1.;
+    if (fade_z >= g->fade_end)
+        factor = 0.;
+    else if (fade_z >= g->fade_start)
+        factor = (g->fade_end - fade_z) / (g->fade_end - g->fade_start);
+    if (!factor)
+        return g->fade_target;
+    double mesh_z = grid_calc_z(g, x, y);
+    return factor * (mesh_z - g->fade_target) + g->fade_target;
+}
+
+int __visible
+bed_mesh_grid_set(struct bed_mesh_grid *g, int x_count, int y_count
+                  , double min_x, double min_y, double dist_x, double dist_y
+                  , double z[])
+{
+    free(g->z);
+    g->z = NULL;
+    if (x_count < 2 || y_count < 2)
+        return -1;
+    int count = x_count * y_count;
+    g->z = malloc(sizeof(g->z[0]) * count);
+    if (!g->z)
+        return -1;
+    memcpy(g->z, z, sizeof(g->z[0]) * count);
+    g->x_count = x_count;
+    g->y_count = y_count;
+    g->min_x = min_x;
+    g->min_y = min_y;
+    g->dist_x = dist_x;
+    g->dist_y = dist_y;
+    return 0;
+}
+
+void __visible
+bed_mesh_grid_set_params(struct bed_mesh_grid *g, double offset_x
+                         , double offset_y, double fade_start
+                         , double fade_end, double fade_target
+                         , double tool_offset)
+{
+    g->offset_x = offset_x;
+    g->offset_y = offset_y;
+    g->fade_start = fade_start;
+    g->fade_end = fade_end;
+    g->fade_target = fade_target;
+    g->tool_offset = tool_offset;
+}
+
+struct bed_mesh_grid * __visible
+bed_mesh_grid_alloc(void)
+{
+    struct bed_mesh_grid *g = malloc(sizeof(*g));
+    memset(g, 0, sizeof(*g));
+    return g;
+}
+
+void __visible
+bed_mesh_grid_free(struct bed_mesh_grid *g)
+{
+    free(g->z);
+    free(g);
+}
+
+
+/****************************************************************
+ * Kinematics wrapper
+ ****************************************************************/
+
+#define DUMMY_T 500.0
+
+struct bed_mesh_stepper {
+    struct stepper_kinematics sk;
+    struct stepper_kinematics *orig_sk;
+    struct bed_mesh_grid *grid;
+    struct move m;
+    int is_active;
+};
+
+static double
+bed_mesh_calc_position(struct stepper_kinematics *sk, struct move *m
+                       , double move_time)
+{
+    struct bed_mesh_stepper *ms = container_of(sk, struct bed_mesh_stepper, sk);
+    if (!ms->is_active)
+        return ms->orig_sk->calc_position_cb(ms->orig_sk, m, move_time);
+    struct coord c = move_get_coord(m, move_time);
+    c.z += bed_mesh_grid_calc_adjust(ms->grid, c.x, c.y, c.z);
+    ms->m.start_pos = c;
+    return ms->orig_sk->calc_position_cb(ms->orig_sk, &ms->m, DUMMY_T);
+}
+
+// A callback that forwards post_cb call to the original kinematics
+static void
+bed_mesh_commanded_pos_post_fixup(struct stepper_kinematics *sk)
+{
+    struct bed_mesh_stepper *ms = container_of(sk, struct bed_mesh_stepper, sk);
+    ms->orig_sk->commanded_pos = sk->commanded_pos;
+    ms->orig_sk->post_cb(ms->orig_sk);
+    sk->commanded_pos = ms->orig_sk->commanded_pos;
+}
+
+// Only kinematics with a stepper that moves only the z axis are supported
+int __visible
+bed_mesh_stepper_set_sk(struct stepper_kinematics *sk
+                        , struct stepper_kinematics *orig_sk
+                        , struct bed_mesh_grid *grid)
+{
+    if (orig_sk->active_flags != AF_Z)
+        return -1;
+    struct bed_mesh_stepper *ms = container_of(sk, struct bed_mesh_stepper, sk);
+    ms->sk.calc_position_cb = bed_mesh_calc_position;
+    ms->sk.active_flags = orig_sk->active_flags;
+    ms->orig_sk = orig_sk;
+    ms->grid = grid;
+    ms->sk.commanded_pos = orig_sk->commanded_pos;
+    ms->sk.last_flush_time = orig_sk->last_flush_time;
+    ms->sk.last_move_time = orig_sk->last_move_time;
+    if (orig_sk->post_cb)
+        ms->sk.post_cb = bed_mesh_commanded_pos_post_fixup;
+    return 0;
+}
+
+// Enable or disable compensation - the stepper must be idle
+void __visible
+bed_mesh_stepper_set_active(struct stepper_kinematics *sk, int is_active)
+{
+    struct bed_mesh_stepper *ms = container_of(sk, struct bed_mesh_stepper, sk);
+    ms->is_active = is_active;
+    // The z stepper moves during xy moves while compensation is active
+    ms->sk.active_flags = ms->orig_sk->active_flags;
+    if (is_active)
+        ms->sk.active_flags |= AF_X | AF_Y;
+}
+
+struct stepper_kinematics * __visible
+bed_mesh_stepper_alloc(void)
+{
+    struct bed_mesh_stepper *ms = malloc(sizeof(*ms));
+    memset(ms, 0, sizeof(*ms));
+    ms->m.move_t = 2. * DUMMY_T;
+    return &ms->sk;
+}
@@ -0,0 +1,217 @@
+// Look-ahead junction velocity planning
+//
+// This is a C implementation of LookAheadQueue.flush() in toolhead.py.
+// The python code remains the reference implementation - any change
+// there must be mirrored here (test/test_toolhead.py checks both
+// produce identical results).
+//
+// This file may be distributed under the terms of the GNU GPLv3 license.
+
+#include <math.h> // sqrt
+#include <stdlib.h> // malloc
+#include <string.h> // memset
+#include "compiler.h" // __visible
+#include "pyhelper.h" // errorf
+
+// Results must match the python code exactly, so don't allow the
+// compiler to fuse multiply and add operations
+#pragma GCC optimize ("fp-contract=off")
+
+struct lookahead_move {
+    double move_d, accel;
+    double max_start_v2, max_cruise_v2, delta_v2;
+    double max_smoothed_v2, smooth_delta_v2;
+    double start_v2, cruise_v2, end_v2;
+};
+
+struct lookahead {
+    struct lookahead_move *moves;
+    int count, size;
+};
+
+#define LOOKAHEAD_JUNCTION_SIZE 6
+
+// Same behavior as python's min() - the first argument wins on a tie
+static inline double
+pymin(double a, double b)
+{
+    return b < a ? b : a;
+}
+
+static inline void
+set_junction(struct lookahead_move *m, double start_v2, double cruise_v2
+             , double end_v2)
+{
+    m->start_v2 = start_v2;
+    m->cruise_v2 = cruise_v2;
+    m->end_v2 = end_v2;
+}
+
+// Allocate a new 'lookahead' object
+struct lookahead * __visible
+lookahead_alloc(void)
+{
+    struct lookahead *la = malloc(sizeof(*la));
+    memset(la, 0, sizeof(*la));
+    return la;
+}
+
+// Free memory associated with a 'lookahead' object
+void __visible
+lookahead_free(struct lookahead *la)
+{
+    if (!la)
+        return;
+    free(la->moves);
+    free(la);
+}
+
+// Remove all queued moves
+void __visible
+lookahead_reset(struct lookahead *la)
+{
+    la->count = 0;
+}
+
+// Add a move (after its junction limits have been calculated)
+int __visible
+lookahead_add_move(struct lookahead *la, double move_d, double accel
+                   , double max_start_v2, double max_cruise_v2
+                   , double delta_v2, double max_smoothed_v2
+                   , double smooth_delta_v2)
+{
+    if (la->count >= la->size) {
+        int size = la->size ? la->size * 2 : 1024;
+        struct lookahead_move *moves = realloc(la->moves
+                                               , size * sizeof(*moves));
+        if (!moves) {
+            errorf("lookahead_add_move: out of memory");
+            return -1;
+        }
+        la->moves = moves;
+        la->size = size;
+    }
+    struct lookahead_move *m = &la->moves[la->count++];
+    memset(m, 0, sizeof(*m));
+    m->move_d = move_d;
+    m->accel = accel;
+    m->max_start_v2 = max_start_v2;
+    m->max_cruise_v2 = max_cruise_v2;
+    m->delta_v2 = delta_v2;
+    m->max_smoothed_v2 = max_smoothed_v2;
+    m->smooth_delta_v2 = smooth_delta_v2;
+    return 0;
+}
+
+// Determine the junction speeds of the queued moves.  Returns the
+// number of moves (from the start of the queue) that are ready to be
+// flushed, or zero if no moves may be flushed yet.
+int __visible
+lookahead_flush(struct lookahead *la, int lazy)
+{
+    struct lookahead_move *moves = la->moves;
+    int update_flush_count = lazy, flush_count = la->count;
+    // Traverse queue from last to first move and determine maximum
+    // junction speed assuming the robot comes to a complete stop
+    // after the last move.  Delayed moves are always the moves
+    // directly after the current move.
+    int delayed = 0, i;
+    double next_end_v2 = 0., next_smoothed_v2 = 0., peak_cruise_v2 = 0.;
+    for (i = la->count - 1; i >= 0; i--) {
+        struct lookahead_move *m = &moves[i];
+        double reachable_start_v2 = next_end_v2 + m->delta_v2;
+        double start_v2 = pymin(m->max_start_v2, reachable_start_v2);
+        double reachable_smoothed_v2 = next_smoothed_v2 + m->smooth_delta_v2;
+        double smoothed_v2 = pymin(m->max_smoothed_v2, reachable_smoothed_v2);
+        if (smoothed_v2 < reachable_smoothed_v2) {
+            // It's possible for this move to accelerate
+            if (smoothed_v2 + m->smooth_delta_v2 > next_smoothed_v2
+                || delayed) {
+                // This move can decelerate or this is a full accel
+                // move after a full decel move
+                if (update_flush_count && peak_cruise_v2) {
+                    flush_count = i;
+                    update_flush_count = 0;
+                }
+                peak_cruise_v2 = pymin(
+                    m->max_cruise_v2
+                    , (smoothed_v2 + reachable_smoothed_v2) * .5);
+                if (delayed) {
+                    // Propagate peak_cruise_v2 to any delayed moves
+                    if (!update_flush_count && i < flush_count) {
+                        double mc_v2 = peak_cruise_v2;
+                        int j;
+                        for (j = i + 1; j <= i + delayed; j++) {
+                            struct lookahead_move *dm = &moves[j];
+                            double ms_v2 = dm->start_v2, me_v2 = dm->end_v2;
+                            mc_v2 = pymin(mc_v2, ms_v2);
+                            set_junction(dm, pymin(ms_v2, mc_v2), mc_v2
+                                         , pymin(me_v2, mc_v2));
+                        }
+                    }
+                    delayed = 0;
+                }
+            }
+            if (!update_flush_count && i < flush_count) {
+                double cruise_v2 = pymin(pymin(
+                    (start_v2 + reachable_start_v2) * .5, m->max_cruise_v2)
+                    , peak_cruise_v2);
+                set_junction(m, pymin(start_v2, cruise_v2), cruise_v2
+                             , pymin(next_end_v2, cruise_v2));
+            }
+        } else {
+            // Delay calculating this move until peak_cruise_v2 is known
+            m->start_v2 = start_v2;
+            m->end_v2 = next_end_v2;
+            delayed++;
+        }
+        next_end_v2 = start_v2;
+        next_smoothed_v2 = smoothed_v2;
+    }
+    if (update_flush_count)
+        return 0;
+    return flush_count;
+}
+
+// Fill 'junctions' with the velocities and phase times of the first
+// 'count' moves (start_v, cruise_v, end_v, accel_t, cruise_t, decel_t
+// for each move).  This is the equivalent of Move.set_junction().
+void __visible
+lookahead_get_junctions(struct lookahead *la, double *junctions, int count)
+{
+    int i;
+    for (i = 0; i < count && i < la->count; i++) {
+        struct lookahead_move *m = &la->moves[i];
+        double *j = &junctions[i * LOOKAHEAD_JUNCTION_SIZE];
+        // Determine accel, cruise, and decel portions of the move distance
+        double half_inv_accel = .5 / m->accel;
+        double accel_d = (m->cruise_v2 - m->start_v2) * half_inv_accel;
+        double decel_d = (m->cruise_v2 - m->end_v2) * half_inv_accel;
+        double cruise_d = m->move_d - accel_d - decel_d;
+        // Determine move velocities
+        double start_v = sqrt(m->start_v2);
+        double cruise_v = sqrt(m->cruise_v2);
+        double end_v = sqrt(m->end_v2);
+        j[0] = start_v;
+        j[1] = cruise_v;
+        j[2] = end_v;
+        // Determine time spent in each portion of move (time is the
+        // distance divided by average velocity)
+        j[3] = accel_d / ((start_v + cruise_v) * .5);
+        j[4] = cruise_d / cruise_v;
+        j[5] = decel_d / ((end_v + cruise_v) * .5);
+    }
+}
+
+// Remove the first 'count' moves from the queue
+void __visible
+lookahead_pop_moves(struct lookahead *la, int count)
+{
+    if (count >= la->count) {
+        la->count = 0;
+        return;
+    }
+    memmove(la->moves, &la->moves[count]
+            , (la->count - count) * sizeof(*la->moves));
+    la->count -= count;
+}
@@ -0,0 +1,131 @@
+// Decoding of sensor_bulk_data messages
+//
+// This file may be distributed under the terms of the GNU GPLv3 license.
+
+#include <stdint.h> // uint8_t
+#include <stdlib.h> // malloc
+#include <string.h> // memset
+#include "compiler.h" // __visible
+#include "pyhelper.h" // errorf
+
+// Timestamps must match the python code exactly, so don't allow the
+// compiler to fuse multiply and add operations
+#pragma GCC optimize ("fp-contract=off")
+
+// Sensor chips report fixed size samples that are packed into the
+// data field of sensor_bulk_data messages.  The host converts each
+// sample into a row of doubles (a timestamp followed by one column per
+// sample field).  All supported field types fit exactly in a double.
+
+#define MAX_FIELDS 16
+
+struct sensor_bulk_field {
+    uint8_t offset, size, is_signed;
+};
+
+struct sensor_bulk_decoder {
+    int field_count, sample_size, is_big_endian;
+    struct sensor_bulk_field fields[MAX_FIELDS];
+};
+
+// Create a decoder from a python "struct" style format (eg, "<hhh")
+struct sensor_bulk_decoder * __visible
+sensor_bulk_decoder_alloc(const char *format)
+{
+    struct sensor_bulk_decoder *sbd = malloc(sizeof(*sbd));
+    memset(sbd, 0, sizeof(*sbd));
+    const char *p = format;
+    if (*p == '<' || *p == '=' || *p == '@') {
+        p++;
+    } else if (*p == '>' || *p == '!') {
+        sbd->is_big_endian = 1;
+        p++;
+    }
+    for (; *p; p++) {
+        int size, is_signed;
+        switch (*p) {
+        case 'b': size = 1; is_signed = 1; break;
+        case 'B': size = 1; is_signed = 0; break;
+        case 'h': size = 2; is_signed = 1; break;
+        case 'H': size = 2; is_signed = 0; break;
+        case 'i': size = 4; is_signed = 1; break;
+        case 'I': size = 4; is_signed = 0; break;
+        default:
+            errorf("Unsupported sensor_bulk format '%s'", format);
+            free(sbd);
+            return NULL;
+        }
+        if (sbd->field_count >= MAX_FIELDS) {
+            errorf("Too many fields in sensor_bulk format '%s'", format);
+            free(sbd);
+            return NULL;
+        }
+        struct sensor_bulk_field *f = &sbd->fields[sbd->field_count++];
+        f->offset = sbd->sample_size;
+        f->size = size;
+        f->is_signed = is_signed;
+        sbd->sample_size += size;
+    }
+    if (!sbd->field_count) {
+        errorf("Empty sensor_bulk format '%s'", format);
+        free(sbd);
+        return NULL;
+    }
+    return sbd;
+}
+
+void __visible
+sensor_bulk_decoder_free(struct sensor_bulk_decoder *sbd)
+{
+    free(sbd);
+}
+
+static double
+decode_field(struct sensor_bulk_decoder *sbd, struct sensor_bulk_field *f
+             , const uint8_t *d)
+{
+    uint32_t v = 0;
+    int i;
+    if (sbd->is_big_endian)
+        for (i = 0; i < f->size; i++)
+            v = (v << 8) | d[i];
+    else
+        for (i = f->size - 1; i >= 0; i--)
+            v = (v << 8) | d[i];
+    if (!f->is_signed)
+        return v;
+    int shift = 32 - f->size * 8;
+    return (int32_t)(v << shift) >> shift;
+}
+
+// Decode the samples in a series of messages.  The data of all the
+// messages is concatenated in 'data' (with the length of each message
+// in 'data_lens').  The timestamp of sample 'i' of message 'm' is
+// time_base + (msg_clocks[m] + i) * inv_freq.  Returns the number of
+// rows stored in 'out'.
+int __visible
+sensor_bulk_decode(struct sensor_bulk_decoder *sbd, const uint8_t *data
+                   , const int *data_lens, const double *msg_clocks
+                   , int msg_count, double time_base, double inv_freq
+                   , double *out, int max_rows)
+{
+    int sample_size = sbd->sample_size, field_count = sbd->field_count;
+    int m, i, j, rows = 0;
+    for (m = 0; m < msg_count; m++) {
+        const uint8_t *d = data;
+        int count = data_lens[m] / sample_size;
+        data += data_lens[m];
+        double msg_clock = msg_clocks[m];
+        for (i = 0; i < count; i++, d += sample_size) {
+            if (rows >= max_rows)
+                return rows;
+            *out++ = time_base + (msg_clock + i) * inv_freq;
+            for (j = 0; j < field_count; j++) {
+                struct sensor_bulk_field *f = &sbd->fields[j];
+                *out++ = decode_field(sbd, f, &d[f->offset]);
+            }
+            rows++;
+        }
+    }
+    return rows;
+}
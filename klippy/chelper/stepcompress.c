@@ -46,6 +46,9 @@ struct stepcompress {
     // History tracking
     int64_t last_position;
     struct list_head history_list;
+    // Profiling
+    int stats_enabled;
+    struct stepcompress_stats stats;
 };
 
 struct step_move {
@@ -360,6 +363,8 @@ add_move(struct stepcompress *sc, uint64_t first_clock, struct step_move *move)
         qm->req_clock = first_clock;
     list_add_tail(&qm->node, &sc->msg_queue);
     sc->last_step_clock = last_clock;
+    sc->stats.step_count += move->count;
+    sc->stats.queue_step_count++;
 
     // Create and store move in history tracking
     struct history_steps *hs = malloc(sizeof(*hs));
@@ -664,6 +669,33 @@ stepcompress_extract_old(struct stepcompress *sc, struct pull_history_steps *p
     return res;
 }
 
+// Enable measuring the host time used to generate and flush steps
+void __visible
+stepcompress_set_stats_enabled(struct stepcompress *sc, int enabled)
+{
+    sc->stats_enabled = enabled;
+}
+
+int
+stepcompress_stats_enabled(struct stepcompress *sc)
+{
+    return sc->stats_enabled;
+}
+
+// Note host time used by the step generation of this stepper
+void
+stepcompress_note_gen_time(struct stepcompress *sc, double gen_time)
+{
+    sc->stats.gen_time += gen_time;
+}
+
+// Report step generation statistics
+void __visible
+stepcompress_get_stats(struct stepcompress *sc, struct stepcompress_stats *s)
+{
+    *s = sc->stats;
+}
+
 
 /****************************************************************
  * Step compress synchronization
@@ -778,7 +810,11 @@ steppersync_flush(struct steppersync *ss, uint64_t move_clock
     // Flush each stepcompress to the specified move_clock
     int i;
     for (i=0; i<ss->sc_num; i++) {
-        int ret = stepcompress_flush(ss->sc_list[i], move_clock);
+        struct stepcompress *sc = ss->sc_list[i];
+        double start = sc->stats_enabled ? get_monotonic() : 0.;
+        int ret = stepcompress_flush(sc, move_clock);
+        if (sc->stats_enabled)
+            sc->stats.flush_time += get_monotonic() - start;
         if (ret)
             return ret;
     }
@@ -11,6 +11,11 @@ struct pull_history_steps {
     int step_count, interval, add;
 };
 
+struct stepcompress_stats {
+    uint64_t step_count, queue_step_count;
+    double gen_time, flush_time;
+};
+
 struct stepcompress *stepcompress_alloc(uint32_t oid);
 void stepcompress_fill(struct stepcompress *sc, uint32_t max_error
                        , int32_t queue_step_msgtag
@@ -34,6 +39,11 @@ int stepcompress_queue_mq_msg(struct stepcompress *sc, uint64_t req_clock
 int stepcompress_extract_old(struct stepcompress *sc
                              , struct pull_history_steps *p, int max
                              , uint64_t start_clock, uint64_t end_clock);
+void stepcompress_set_stats_enabled(struct stepcompress *sc, int enabled);
+int stepcompress_stats_enabled(struct stepcompress *sc);
+void stepcompress_note_gen_time(struct stepcompress *sc, double gen_time);
+void stepcompress_get_stats(struct stepcompress *sc
+                            , struct stepcompress_stats *s);
 
 struct serialqueue;
 struct steppersync *steppersync_alloc(
@@ -0,0 +1,201 @@
+// Parallel step generation across steppers
+//
+// This file may be distributed under the terms of the GNU GPLv3 license.
+
+#include <pthread.h> // pthread_create
+#include <stdlib.h> // malloc
+#include <string.h> // memset
+#include "compiler.h" // __visible
+#include "itersolve.h" // itersolve_generate_steps
+#include "pyhelper.h" // report_errno
+#include "stepcompress.h" // steppersync_flush
+#include "trapq.h" // trapq_check_sentinels
+
+// Each stepper writes only to its own stepcompress queue, so steppers
+// may be generated concurrently.  The resulting queue_step messages
+// are only ordered (by clock) later in steppersync_flush(), so the
+// output sent to the mcu does not depend on thread scheduling.  Each
+// mcu has its own steppersync and serialqueue, so the steppersync of
+// different mcus may also be flushed concurrently.
+
+struct stepgen_pool;
+typedef int32_t (*stepgen_job_cb)(struct stepgen_pool *sp, int idx);
+
+struct stepgen_pool {
+    pthread_mutex_t lock; // protects variables below
+    pthread_cond_t cond, done_cond;
+    pthread_t *threads;
+    int num_threads, shutdown;
+    // Current job
+    stepgen_job_cb job_cb;
+    int32_t *results;
+    int job_num, next_idx, pending;
+    unsigned int generation;
+    // Job parameters
+    struct stepper_kinematics **sks;
+    double flush_time;
+    struct steppersync **ss_list;
+    uint64_t *move_clocks, *clear_history_clocks;
+};
+
+// Run any remaining items of the current job
+static void
+run_job(struct stepgen_pool *sp)
+{
+    pthread_mutex_lock(&sp->lock);
+    while (sp->next_idx < sp->job_num) {
+        int idx = sp->next_idx++;
+        pthread_mutex_unlock(&sp->lock);
+        sp->results[idx] = sp->job_cb(sp, idx);
+        pthread_mutex_lock(&sp->lock);
+        if (!--sp->pending)
+            pthread_cond_signal(&sp->done_cond);
+    }
+    pthread_mutex_unlock(&sp->lock);
+}
+
+static void *
+worker_thread(void *data)
+{
+    struct stepgen_pool *sp = data;
+    unsigned int generation = 0;
+    pthread_mutex_lock(&sp->lock);
+    for (;;) {
+        while (!sp->shutdown && generation == sp->generation)
+            pthread_cond_wait(&sp->cond, &sp->lock);
+        if (sp->shutdown)
+            break;
+        generation = sp->generation;
+        pthread_mutex_unlock(&sp->lock);
+        run_job(sp);
+        pthread_mutex_lock(&sp->lock);
+    }
+    pthread_mutex_unlock(&sp->lock);
+    return NULL;
+}
+
+// Run a job on the worker threads and the calling thread - returns
+// the index of the first failed item or -1 if all items succeeded
+static int
+run_parallel(struct stepgen_pool *sp, stepgen_job_cb job_cb, int job_num)
+{
+    int32_t results[job_num ? job_num : 1];
+    int i;
+    if (!sp->num_threads || job_num < 2) {
+        for (i = 0; i < job_num; i++)
+            if (job_cb(sp, i))
+                return i;
+        return -1;
+    }
+    pthread_mutex_lock(&sp->lock);
+    sp->job_cb = job_cb;
+    sp->results = results;
+    sp->job_num = sp->pending = job_num;
+    sp->next_idx = 0;
+    sp->generation++;
+    pthread_cond_broadcast(&sp->cond);
+    pthread_mutex_unlock(&sp->lock);
+    run_job(sp);
+    pthread_mutex_lock(&sp->lock);
+    while (sp->pending)
+        pthread_cond_wait(&sp->done_cond, &sp->lock);
+    sp->results = NULL;
+    sp->job_num = 0;
+    pthread_mutex_unlock(&sp->lock);
+    for (i = 0; i < job_num; i++)
+        if (results[i])
+            return i;
+    return -1;
+}
+
+static int32_t
+generate_job(struct stepgen_pool *sp, int idx)
+{
+    return itersolve_generate_steps(sp->sks[idx], sp->flush_time);
+}
+
+// Generate steps for a list of steppers - returns the index of the
+// first failed stepper or -1 on success
+int32_t __visible
+stepgen_pool_generate(struct stepgen_pool *sp, struct stepper_kinematics **sks
+                      , int sk_num, double flush_time)
+{
+    // Update trapq sentinels here as they are shared between steppers
+    int i;
+    for (i = 0; i < sk_num; i++)
+        if (sks[i]->tq)
+            trapq_check_sentinels(sks[i]->tq);
+    sp->sks = sks;
+    sp->flush_time = flush_time;
+    int ret = run_parallel(sp, generate_job, sk_num);
+    sp->sks = NULL;
+    return ret;
+}
+
+static int32_t
+flush_job(struct stepgen_pool *sp, int idx)
+{
+    return steppersync_flush(sp->ss_list[idx], sp->move_clocks[idx]
+                             , sp->clear_history_clocks[idx]);
+}
+
+// Flush the steppersync of several mcus - returns the index of the
+// first failed steppersync or -1 on success
+int32_t __visible
+stepgen_pool_flush(struct stepgen_pool *sp, struct steppersync **ss_list
+                   , uint64_t *move_clocks, uint64_t *clear_history_clocks
+                   , int ss_num)
+{
+    sp->ss_list = ss_list;
+    sp->move_clocks = move_clocks;
+    sp->clear_history_clocks = clear_history_clocks;
+    int ret = run_parallel(sp, flush_job, ss_num);
+    sp->ss_list = NULL;
+    return ret;
+}
+
+void __visible
+stepgen_pool_free(struct stepgen_pool *sp)
+{
+    if (!sp)
+        return;
+    pthread_mutex_lock(&sp->lock);
+    sp->shutdown = 1;
+    pthread_cond_broadcast(&sp->cond);
+    pthread_mutex_unlock(&sp->lock);
+    int i;
+    for (i = 0; i < sp->num_threads; i++) {
+        int ret = pthread_join(sp->threads[i], NULL);
+        if (ret)
+            report_errno("pthread_join", ret);
+    }
+    pthread_cond_destroy(&sp->done_cond);
+    pthread_cond_destroy(&sp->cond);
+    pthread_mutex_destroy(&sp->lock);
+    free(sp->threads);
+    free(sp);
+}
+
+// Allocate a pool - the calling thread also generates steps, so
+// num_threads is one more than the number of worker threads started
+struct stepgen_pool * __visible
+stepgen_pool_alloc(int num_threads)
+{
+    struct stepgen_pool *sp = malloc(sizeof(*sp));
+    memset(sp, 0, sizeof(*sp));
+    pthread_mutex_init(&sp->lock, NULL);
+    pthread_cond_init(&sp->cond, NULL);
+    pthread_cond_init(&sp->done_cond, NULL);
+    int count = num_threads > 1 ? num_threads - 1 : 0;
+    sp->threads = malloc(sizeof(sp->threads[0]) * (count ? count : 1));
+    int i;
+    for (i = 0; i < count; i++) {
+        int ret = pthread_create(&sp->threads[i], NULL, worker_thread, sp);
+        if (ret) {
+            report_errno("pthread_create", ret);
+            break;
+        }
+        sp->num_threads++;
+    }
+    return sp;
+}
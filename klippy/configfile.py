@@ -346,6 +346,7 @@ class PrinterConfig:
         self.unused_sections = []
         self.unused_options = []
         self.save_config_pending = False
+        self.status_version = 0
         gcode = self.printer.lookup_object("gcode")
         if "SAVE_CONFIG" not in gcode.ready_gcode_handlers:
             gcode.register_command(
@@ -567,6 +568,7 @@ class PrinterConfig:
         res = {"type": "runtime_warning", "message": msg}
         self.runtime_warnings.append(res)
         self.status_warnings = self.runtime_warnings + self.deprecate_warnings
+        self.status_version += 1
 
     def deprecate(self, section, option, value=None, msg=None):
         self.deprecated[(section, option, value)] = msg
@@ -583,6 +585,7 @@ class PrinterConfig:
         if value is not None:
             res["value"] = value
         self.status_warnings.append(res)
+        self.status_version += 1
 
     def _build_status(self, config):
         self.status_raw_config.clear()
@@ -608,6 +611,10 @@ class PrinterConfig:
             _type = "unused_section"
             msg = f"Section '{section}' is invalid"
             self.warn(_type, msg, section)
+        self.status_version += 1
+
+    def get_status_version(self):
+        return self.status_version
 
     def get_status(self, eventtime):
         return {
@@ -632,6 +639,7 @@ class PrinterConfig:
         pending[section][option] = svalue
         self.status_save_pending = pending
         self.save_config_pending = True
+        self.status_version += 1
         logging.info("save_config: set [%s] %s = %s", section, option, svalue)
 
     def remove_section(self, section):
@@ -641,6 +649,7 @@ class PrinterConfig:
             pending[section] = None
             self.status_save_pending = pending
             self.save_config_pending = True
+            self.status_version += 1
         elif (
             section in self.status_save_pending
             and self.status_save_pending[section] is not None
@@ -649,6 +658,7 @@ class PrinterConfig:
             del pending[section]
             self.status_save_pending = pending
             self.save_config_pending = True
+            self.status_version += 1
 
     def _disallow_include_conflicts(self, regular_data, cfgname, gcode):
         config = self._build_config_wrapper(regular_data, cfgname)
@@ -797,4 +807,5 @@ class PrinterConfig:
         else:
             # flag config updated to false since config saved with no restart
             self.save_config_pending = False
+            self.status_version += 1
             gcode.respond_info("Config update without restart successful")
@@ -4,6 +4,7 @@
 #
 # This file may be distributed under the terms of the GNU GPLv3 license.
 import logging
+import numpy
 from . import bulk_sensor, bus
 
 #
@@ -188,11 +189,10 @@ class ADS1220:
     # Measurement decoding
     def _convert_samples(self, samples):
         adc_factor = 1.0 / (1 << 23)
-        count = 0
-        for ptime, val in samples:
-            samples[count] = (round(ptime, 6), val, round(val * adc_factor, 9))
-            count += 1
-        del samples[count:]
+        val = samples[:, 1].astype(numpy.int64)
+        ptime = numpy.round(samples[:, 0], 6)
+        adc = numpy.round(val * adc_factor, 9)
+        return list(zip(ptime.tolist(), val.tolist(), adc.tolist()))
 
     # Start, stop, and process message batches
     def _start_measurements(self):
@@ -217,8 +217,7 @@ class ADS1220:
         logging.info("ADS1220 finished '%s' measurements", self.name)
 
     def _process_batch(self, eventtime):
-        samples = self.ffreader.pull_samples()
-        self._convert_samples(samples)
+        samples = self._convert_samples(self.ffreader.pull_samples())
         return {
             "data": samples,
             "errors": self.last_error_count,
@@ -3,7 +3,8 @@
 # Copyright (C) 2020-2023  Kevin O'Connor <kevin@koconnor.net>
 #
 # This file may be distributed under the terms of the GNU GPLv3 license.
-import logging, time, collections, multiprocessing, os, math
+import logging, time, multiprocessing, os, math
+import numpy
 from . import bus, bulk_sensor
 
 # ADXL345 registers
@@ -33,10 +34,6 @@ FREEFALL_ACCEL = 9.80665 * 1000.0
 SCALE_XY = 0.003774 * FREEFALL_ACCEL  # 1 / 265 (at 3.3V) mg/LSB
 SCALE_Z = 0.003906 * FREEFALL_ACCEL  # 1 / 256 (at 3.3V) mg/LSB
 
-Accel_Measurement = collections.namedtuple(
-    "Accel_Measurement", ("time", "accel_x", "accel_y", "accel_z")
-)
-
 
 # Helper class to obtain measurements
 class AccelQueryHelper:
@@ -45,60 +42,69 @@ class AccelQueryHelper:
         self.is_finished = False
         print_time = printer.lookup_object("toolhead").get_last_move_time()
         self.request_start_time = self.request_end_time = print_time
-        self.msgs = []
-        self.samples = []
+        self.msg_count = 0
+        # Rows of (time, accel_x, accel_y, accel_z)
+        self.samples = bulk_sensor.SampleBuffer(4)
+        self.keep_samples = True
+        self.stream_cb = None
+        self.stream_count = 0
+        self.has_end_time = False
+
+    def stream_samples(self, callback, keep_samples=True):
+        # Invoke callback(samples) with each new array of samples taken
+        # during the requested time range
+        self.stream_cb = callback
+        self.keep_samples = keep_samples
 
     def finish_measurements(self):
         toolhead = self.printer.lookup_object("toolhead")
         self.request_end_time = toolhead.get_last_move_time()
+        self.has_end_time = True
         toolhead.wait_moves()
         self.is_finished = True
 
+    def _stream_batch(self, data):
+        samples = numpy.array(data, dtype=numpy.float64).reshape(-1, 4)
+        times = samples[:, 0]
+        start = numpy.searchsorted(times, self.request_start_time, "left")
+        end = len(samples)
+        if self.has_end_time:
+            end = numpy.searchsorted(times, self.request_end_time, "right")
+        if end > start:
+            self.stream_count += end - start
+            self.stream_cb(samples[start:end])
+
     def handle_batch(self, msg):
         if self.is_finished:
             return False
-        if len(self.msgs) >= 10000:
+        if self.stream_cb is not None:
+            self._stream_batch(msg["data"])
+            if not self.keep_samples:
+                return True
+        if self.msg_count >= 10000:
             # Avoid filling up memory with too many samples
             return False
-        self.msgs.append(msg)
+        self.msg_count += 1
+        self.samples.append(msg["data"])
         return True
 
+    def _get_range(self):
+        times = self.samples.get_data()[:, 0]
+        start = numpy.searchsorted(times, self.request_start_time, "left")
+        end = numpy.searchsorted(times, self.request_end_time, "right")
+        return start, end
+
     def has_valid_samples(self):
-        for msg in self.msgs:
-            data = msg["data"]
-            first_sample_time = data[0][0]
-            last_sample_time = data[-1][0]
-            if (
-                first_sample_time > self.request_end_time
-                or last_sample_time < self.request_start_time
-            ):
-                continue
-            # The time intervals [first_sample_time, last_sample_time]
-            # and [request_start_time, request_end_time] have non-zero
-            # intersection. It is still theoretically possible that none
-            # of the samples from msgs fall into the time interval
-            # [request_start_time, request_end_time] if it is too narrow
-            # or on very heavy data losses. In practice, that interval
-            # is at least 1 second, so this possibility is negligible.
-            return True
-        return False
+        if not self.keep_samples:
+            return self.stream_count > 0
+        start, end = self._get_range()
+        return end > start
 
+    # Returns an array with a (time, accel_x, accel_y, accel_z) row for
+    # each sample taken during the requested time range
     def get_samples(self):
-        if not self.msgs:
-            return self.samples
-        total = sum([len(m["data"]) for m in self.msgs])
-        count = 0
-        self.samples = samples = [None] * total
-        for msg in self.msgs:
-            for samp_time, x, y, z in msg["data"]:
-                if samp_time < self.request_start_time:
-                    continue
-                if samp_time > self.request_end_time:
-                    break
-                samples[count] = Accel_Measurement(samp_time, x, y, z)
-                count += 1
-        del samples[count:]
-        return self.samples
+        start, end = self._get_range()
+        return self.samples.get_data()[start:end]
 
     def write_to_file(self, filename):
         def write_impl():
@@ -109,11 +115,7 @@ class AccelQueryHelper:
                 pass
             f = open(filename, "w")
             f.write("#time,accel_x,accel_y,accel_z\n")
-            samples = self.samples or self.get_samples()
-            for t, accel_x, accel_y, accel_z in samples:
-                f.write(
-                    "%.6f,%.6f,%.6f,%.6f\n" % (t, accel_x, accel_y, accel_z)
-                )
+            numpy.savetxt(f, self.get_samples(), fmt="%.6f", delimiter=",")
             f.close()
 
         write_proc = multiprocessing.Process(target=write_impl)
@@ -202,7 +204,7 @@ class AccelCommandHelper:
             self.printer.lookup_object("toolhead").dwell(1.0)
             aclient.finish_measurements()
             values = aclient.get_samples()
-            if not values:
+            if not len(values):
                 raise gcmd.error("No accelerometer measurements found")
             take = min(len(values), num_samples)
             num_samples -= take
@@ -341,23 +343,21 @@ class ADXL345:
     # Measurement decoding
     def _convert_samples(self, samples):
         (x_pos, x_scale), (y_pos, y_scale), (z_pos, z_scale) = self.axes_map
-        count = 0
-        for ptime, xlow, ylow, zlow, xzhigh, yzhigh in samples:
-            if yzhigh & 0x80:
-                self.last_error_count += 1
-                continue
-            rx = (xlow | ((xzhigh & 0x1F) << 8)) - ((xzhigh & 0x10) << 9)
-            ry = (ylow | ((yzhigh & 0x1F) << 8)) - ((yzhigh & 0x10) << 9)
-            rz = (zlow | ((xzhigh & 0xE0) << 3) | ((yzhigh & 0xE0) << 6)) - (
-                (yzhigh & 0x40) << 7
-            )
-            raw_xyz = (rx, ry, rz)
-            x = round(raw_xyz[x_pos] * x_scale, 6)
-            y = round(raw_xyz[y_pos] * y_scale, 6)
-            z = round(raw_xyz[z_pos] * z_scale, 6)
-            samples[count] = (round(ptime, 6), x, y, z)
-            count += 1
-        del samples[count:]
+        raw = samples[:, 1:].astype(numpy.int64)
+        is_valid = (raw[:, 4] & 0x80) == 0
+        self.last_error_count += len(raw) - numpy.count_nonzero(is_valid)
+        xlow, ylow, zlow, xzhigh, yzhigh = raw[is_valid].T
+        rx = (xlow | ((xzhigh & 0x1F) << 8)) - ((xzhigh & 0x10) << 9)
+        ry = (ylow | ((yzhigh & 0x1F) << 8)) - ((yzhigh & 0x10) << 9)
+        rz = (zlow | ((xzhigh & 0xE0) << 3) | ((yzhigh & 0xE0) << 6)) - (
+            (yzhigh & 0x40) << 7
+        )
+        raw_xyz = (rx, ry, rz)
+        x = numpy.round(raw_xyz[x_pos] * x_scale, 6)
+        y = numpy.round(raw_xyz[y_pos] * y_scale, 6)
+        z = numpy.round(raw_xyz[z_pos] * z_scale, 6)
+        ptime = numpy.round(samples[is_valid, 0], 6)
+        return list(zip(ptime.tolist(), x.tolist(), y.tolist(), z.tolist()))
 
     # Start, stop, and process message batches
     def _start_measurements(self):
@@ -394,8 +394,7 @@ class ADXL345:
         logging.info("ADXL345 finished '%s' measurements", self.name)
 
     def _process_batch(self, eventtime):
-        samples = self.ffreader.pull_samples()
-        self._convert_samples(samples)
+        samples = self._convert_samples(self.ffreader.pull_samples())
         if not samples:
             return {}
         return {
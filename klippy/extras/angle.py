@@ -760,6 +760,7 @@ class Angle:
         )
         mcu.register_config_callback(self._build_config)
         self.bulk_queue = bulk_sensor.BulkDataQueue(mcu, oid=oid)
+        self.decoder = bulk_sensor.BulkDataDecoder("<BH")
         # Process messages in batches
         self.batch_bulk = bulk_sensor.BatchBulkHelper(
             self.printer,
@@ -792,60 +793,57 @@ class Angle:
 
     # Measurement decoding
     def _extract_samples(self, raw_samples):
-        # Load variables to optimize inner loop below
-        sample_ticks = self.sample_ticks
-        start_clock = self.start_clock
-        clock_to_print_time = self.mcu.clock_to_print_time
+        # Determine the mcu clock of the first sample of each message
         last_sequence = self.last_sequence
-        last_angle = self.last_angle
-        time_shift = 0
-        static_delay = 0.0
-        last_chip_mcu_clock = last_chip_clock = chip_freq = inv_chip_freq = 0.0
-        is_tcode_absolute = self.sensor_helper.is_tcode_absolute
-        if is_tcode_absolute:
+        datas = [None] * len(raw_samples)
+        msg_clocks = [None] * len(raw_samples)
+        for i, params in enumerate(raw_samples):
+            seq_diff = (params["sequence"] - last_sequence) & 0xFFFF
+            last_sequence += seq_diff
+            datas[i] = params["data"]
+            msg_clocks[i] = last_sequence * SAMPLES_PER_BLOCK
+        self.last_sequence = last_sequence
+        # Decode samples into rows of (mclock, tcode, raw_angle)
+        samples = self.decoder.decode(
+            datas, msg_clocks, self.start_clock, self.sample_ticks
+        )
+        tcode = samples[:, 1].astype(numpy.int64)
+        is_valid = tcode != TCODE_ERROR
+        error_count = len(samples) - numpy.count_nonzero(is_valid)
+        mclock = samples[is_valid, 0]
+        tcode = tcode[is_valid]
+        raw_angle = samples[is_valid, 2].astype(numpy.int64)
+        if not len(raw_angle):
+            return [], error_count
+        # Unwrap angles
+        prev_angle = numpy.empty_like(raw_angle)
+        prev_angle[0] = self.last_angle
+        prev_angle[1:] = raw_angle[:-1]
+        angle_diff = (raw_angle - prev_angle) & 0xFFFF
+        angle_diff -= (angle_diff & 0x8000) << 1
+        angles = self.last_angle + numpy.cumsum(angle_diff)
+        self.last_angle = int(angles[-1])
+        # Calculate sample times
+        if self.sensor_helper.is_tcode_absolute:
+            # tcode is tle5012b frame counter
             tparams = self.sensor_helper.get_tcode_params()
             last_chip_mcu_clock, last_chip_clock, chip_freq = tparams
-            inv_chip_freq = 1.0 / chip_freq
+            mdiff = mclock - last_chip_mcu_clock
+            chip_mclock = last_chip_clock + numpy.trunc(
+                mdiff * chip_freq + 0.5
+            ).astype(numpy.int64)
+            cdiff = ((tcode << 10) - chip_mclock) & 0xFFFF
+            cdiff -= (cdiff & 0x8000) << 1
+            sclock = mclock + (cdiff - 0x800) * (1.0 / chip_freq)
+            static_delay = 0.0
         else:
-            time_shift = self.time_shift
+            # tcode is mcu clock offset shifted by time_shift
+            sclock = mclock + (tcode << self.time_shift)
             static_delay = self.sensor_helper.get_static_delay()
-        # Process every message in raw_samples
-        count = error_count = 0
-        samples = [None] * (len(raw_samples) * SAMPLES_PER_BLOCK)
-        for params in raw_samples:
-            seq_diff = (params["sequence"] - last_sequence) & 0xFFFF
-            last_sequence += seq_diff
-            samp_count = last_sequence * SAMPLES_PER_BLOCK
-            msg_mclock = start_clock + samp_count * sample_ticks
-            d = bytearray(params["data"])
-            for i in range(len(d) // BYTES_PER_SAMPLE):
-                d_ta = d[i * BYTES_PER_SAMPLE : (i + 1) * BYTES_PER_SAMPLE]
-                tcode = d_ta[0]
-                if tcode == TCODE_ERROR:
-                    error_count += 1
-                    continue
-                raw_angle = d_ta[1] | (d_ta[2] << 8)
-                angle_diff = (raw_angle - last_angle) & 0xFFFF
-                angle_diff -= (angle_diff & 0x8000) << 1
-                last_angle += angle_diff
-                mclock = msg_mclock + i * sample_ticks
-                if is_tcode_absolute:
-                    # tcode is tle5012b frame counter
-                    mdiff = mclock - last_chip_mcu_clock
-                    chip_mclock = last_chip_clock + int(mdiff * chip_freq + 0.5)
-                    cdiff = ((tcode << 10) - chip_mclock) & 0xFFFF
-                    cdiff -= (cdiff & 0x8000) << 1
-                    sclock = mclock + (cdiff - 0x800) * inv_chip_freq
-                else:
-                    # tcode is mcu clock offset shifted by time_shift
-                    sclock = mclock + (tcode << time_shift)
-                ptime = round(clock_to_print_time(sclock) - static_delay, 6)
-                samples[count] = (ptime, last_angle)
-                count += 1
-        self.last_sequence = last_sequence
-        self.last_angle = last_angle
-        del samples[count:]
-        return samples, error_count
+        ptime = numpy.round(
+            self.mcu.clock_to_print_time(sclock) - static_delay, 6
+        )
+        return list(zip(ptime.tolist(), angles.tolist())), error_count
 
     # Start, stop, and process message batches
     def _is_measuring(self):
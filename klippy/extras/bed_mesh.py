@@ -3,10 +3,16 @@
 # Copyright (C) 2018-2019 Eric Callahan <arksine.code@gmail.com>
 #
 # This file may be distributed under the terms of the GNU GPLv3 license.
-import logging, math, json, collections
+import os, logging, math, json, collections, functools, time
+from klippy import chelper
 from . import probe
 from .danger_options import get_danger_options
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 PROFILE_VERSION = 1
 PROFILE_OPTIONS = {
     "min_x": float,
@@ -49,6 +55,68 @@ def lerp(t, v0, v1):
     return (1.0 - t) * v0 + t * v1
 
 
+# Control point indexes and basis weights of the interpolated points
+# along one axis of a bicubic mesh
+@functools.lru_cache(maxsize=16)
+def get_bicubic_weights(mesh_cnt, mult):
+    last_pt = mesh_cnt - 1 - mult
+    targets = []
+    ctl_pts = []
+    weights = []
+    for x in range(mesh_cnt):
+        if x % mult == 0:
+            continue
+        if x < mult:
+            ctl_pts.append((0, 0, mult, 2 * mult))
+            t = x / float(mult)
+        elif x > last_pt:
+            i = last_pt
+            ctl_pts.append((i - mult, i, i + mult, i + mult))
+            t = (x - i) / float(mult)
+        else:
+            i = x - x % mult
+            ctl_pts.append((i - mult, i, i + mult, i + 2 * mult))
+            t = (x - i) / float(mult)
+        t2 = t * t
+        t3 = t2 * t
+        weights.append(
+            (2 * t3 - 3 * t2 + 1, -2 * t3 + 3 * t2, t3 - 2 * t2 + t, t3 - t2)
+        )
+        targets.append(x)
+    return (
+        numpy.array(targets, dtype=int),
+        numpy.array(ctl_pts, dtype=int).reshape(-1, 4).T,
+        numpy.array(weights).reshape(-1, 4).T,
+    )
+
+
+# Numerators and denominators of the lagrange basis of the interpolated
+# points along one axis of a mesh
+@functools.lru_cache(maxsize=16)
+def get_lagrange_weights(mesh_min, mesh_dist, mesh_cnt, mult):
+    lpts = [mesh_min + mesh_dist * i for i in range(0, mesh_cnt, mult)]
+    targets = [i for i in range(mesh_cnt) if i % mult]
+    numerators = []
+    denominators = []
+    for i in range(len(lpts)):
+        nums = []
+        for target in targets:
+            c = mesh_min + mesh_dist * target
+            n = 1.0
+            for j in range(len(lpts)):
+                if j != i:
+                    n *= c - lpts[j]
+            nums.append(n)
+        d = 1.0
+        for j in range(len(lpts)):
+            if j != i:
+                d *= lpts[i] - lpts[j]
+        numerators.append(nums)
+        denominators.append(d)
+    numerators = numpy.array(numerators).reshape(len(lpts), len(targets))
+    return numpy.array(targets, dtype=int), numerators, denominators
+
+
 # retreive commma separated pair from config
 def parse_config_pair(config, option, default, minval=None, maxval=None):
     pair = config.getintlist(option, (default, default))
@@ -131,6 +199,21 @@ class BedMesh:
         self.tool_offset = 0.0
         self.gcode = self.printer.lookup_object("gcode")
         self.splitter = MoveSplitter(config, self.gcode)
+        # z compensation during step generation (danger_options)
+        self.native_grid = None
+        self.native_stepper_kinematics = []
+        self.orig_stepper_kinematics = []
+        self.native_active = False
+        if get_danger_options().native_bed_mesh:
+            self.printer.register_event_handler(
+                "klippy:mcu_identify", self._handle_mcu_identify
+            )
+            self.printer.register_event_handler(
+                "homing:home_rails_begin", self._handle_homing
+            )
+            self.printer.register_event_handler(
+                "homing:homing_move_begin", self._handle_homing
+            )
         # setup persistent storage
         self.pmgr = ProfileManager(config, self)
         self.save_profile = self.pmgr.save_profile
@@ -181,7 +264,85 @@ class BedMesh:
         if get_danger_options().log_bed_mesh_at_startup:
             self.bmc.print_generated_points(logging.info, truncate=True)
 
+    def _handle_mcu_identify(self):
+        # Wrap the z steppers so that they apply the mesh adjustment
+        ffi_main, ffi_lib = chelper.get_ffi()
+        self.native_grid = ffi_main.gc(
+            ffi_lib.bed_mesh_grid_alloc(), ffi_lib.bed_mesh_grid_free
+        )
+        kin = self.printer.lookup_object("toolhead").get_kinematics()
+        for stepper in kin.get_steppers():
+            if not stepper.is_active_axis("z"):
+                continue
+            sk = stepper.get_stepper_kinematics()
+            mesh_sk = ffi_main.gc(
+                ffi_lib.bed_mesh_stepper_alloc(), ffi_lib.free
+            )
+            stepper.set_stepper_kinematics(mesh_sk)
+            res = ffi_lib.bed_mesh_stepper_set_sk(mesh_sk, sk, self.native_grid)
+            if res < 0:
+                stepper.set_stepper_kinematics(sk)
+                raise self.printer.config_error(
+                    "bed_mesh: native_bed_mesh requires kinematics with a"
+                    " dedicated z axis"
+                )
+            self.orig_stepper_kinematics.append(sk)
+            self.native_stepper_kinematics.append(mesh_sk)
+
+    def _handle_homing(self, *args):
+        self._native_suspend()
+
+    def _set_native_active(self, is_active):
+        ffi_main, ffi_lib = chelper.get_ffi()
+        for sk in self.native_stepper_kinematics:
+            ffi_lib.bed_mesh_stepper_set_active(sk, is_active)
+        self.native_active = is_active
+
+    def _native_suspend(self):
+        # Switch the toolhead back to compensated (physical) coordinates
+        if not self.native_active:
+            return
+        self.toolhead.flush_step_generation()
+        ffi_main, ffi_lib = chelper.get_ffi()
+        pos = self.toolhead.get_position()
+        pos[2] += ffi_lib.bed_mesh_grid_calc_adjust(
+            self.native_grid, pos[0], pos[1], pos[2]
+        )
+        self._set_native_active(False)
+        self.toolhead.set_position(pos)
+
+    def _native_resume(self):
+        # Load the mesh into the steppers and switch the toolhead to
+        # uncompensated (g-code) coordinates
+        pos = self.get_position()
+        mesh = self.z_mesh
+        z = [z for line in mesh.mesh_matrix for z in line]
+        ffi_main, ffi_lib = chelper.get_ffi()
+        ffi_lib.bed_mesh_grid_set(
+            self.native_grid,
+            mesh.mesh_x_count,
+            mesh.mesh_y_count,
+            mesh.mesh_x_min,
+            mesh.mesh_y_min,
+            mesh.mesh_x_dist,
+            mesh.mesh_y_dist,
+            z,
+        )
+        ffi_lib.bed_mesh_grid_set_params(
+            self.native_grid,
+            mesh.mesh_offsets[0],
+            mesh.mesh_offsets[1],
+            self.fade_start,
+            self.fade_end,
+            self.fade_target,
+            self.tool_offset,
+        )
+        self.toolhead.flush_step_generation()
+        self._set_native_active(True)
+        self.toolhead.set_position(pos)
+
     def set_mesh(self, mesh):
+        self._native_suspend()
         if mesh is not None and self.fade_end != self.FADE_DISABLE:
             self.log_fade_complete = True
             if self.base_fade_target is None:
@@ -233,7 +394,10 @@ class BedMesh:
 
     def get_position(self):
         # Return last, non-transformed position
-        if self.z_mesh is None:
+        if self.native_active:
+            # The steppers apply the z-adjustment
+            self.last_position[:] = self.toolhead.get_position()
+        elif self.z_mesh is None:
             # No mesh calibrated, so send toolhead position
             self.last_position[:] = self.toolhead.get_position()
             self.last_position[2] -= self.fade_target
@@ -260,6 +424,9 @@ class BedMesh:
         return list(self.last_position)
 
     def move(self, newpos, speed):
+        if self.native_stepper_kinematics and self.z_mesh is not None:
+            self._native_move(newpos, speed)
+            return
         factor = self.get_z_factor(newpos[2])
         if self.z_mesh is None or not factor:
             # No mesh calibrated, or mesh leveling phased out.
@@ -272,17 +439,30 @@ class BedMesh:
                 )
             self.toolhead.move([x, y, z + self.fade_target, e], speed)
         else:
-            self.splitter.build_move(self.last_position, newpos, factor)
-            while not self.splitter.traverse_complete:
-                split_move = self.splitter.split()
-                if split_move:
-                    self.toolhead.move(split_move, speed)
-                else:
-                    raise self.gcode.error(
-                        "Mesh Leveling: Error splitting move "
-                    )
+            split_moves = self.splitter.split_move(
+                self.last_position, newpos, factor
+            )
+            for split_move in split_moves:
+                self.toolhead.move(split_move, speed)
         self.last_position[:] = newpos
 
+    def _native_move(self, newpos, speed):
+        resumed = not self.native_active
+        if resumed:
+            self._native_resume()
+        if self.log_fade_complete and not self.get_z_factor(newpos[2]):
+            self.log_fade_complete = False
+            logging.info(
+                "bed_mesh fade complete: Current Z: %.4f fade_target: %.4f "
+                % (newpos[2], self.fade_target)
+            )
+        self.toolhead.move(newpos, speed)
+        self.last_position[:] = newpos
+        if resumed:
+            # Resuming changed the toolhead position during the move
+            gcode_move = self.printer.lookup_object("gcode_move")
+            gcode_move.reset_last_position()
+
     def get_status(self, eventtime=None):
         return self.status
 
@@ -345,6 +525,7 @@ class BedMesh:
 
     def cmd_BED_MESH_OFFSET(self, gcmd):
         if self.z_mesh is not None:
+            self._native_suspend()
             offsets = [None, None]
             for i, axis in enumerate(["X", "Y"]):
                 offsets[i] = gcmd.get_float(axis, None)
@@ -477,6 +658,9 @@ class BedMeshCalibrate:
         self.zero_reference_mode = ZrefMode.DISABLED
         self.faulty_regions = []
         self.substituted_indices = collections.OrderedDict()
+        self.probe_cache = ProbeResultCache(config)
+        self.cached_results = {}
+        self.cache_results = False
         self.bedmesh = bedmesh
         self.mesh_config = collections.OrderedDict()
         self._init_mesh_config(config)
@@ -956,7 +1140,8 @@ class BedMeshCalibrate:
             self.mesh_config["algo"] = gcmd.get("ALGORITHM").strip().lower()
             need_cfg_update = True
 
-        need_cfg_update |= self.set_adaptive_mesh(gcmd)
+        is_adaptive = self.set_adaptive_mesh(gcmd)
+        need_cfg_update |= is_adaptive
         probe_method = gcmd.get("METHOD", "automatic")
 
         if need_cfg_update:
@@ -972,6 +1157,7 @@ class BedMeshCalibrate:
             self._generate_points(gcmd.error, probe_method)
             pts = self._get_adjusted_points()
             self.probe_helper.update_probe_points(pts, 3)
+        return is_adaptive
 
     def _get_adjusted_points(self):
         adj_pts = []
@@ -997,10 +1183,70 @@ class BedMeshCalibrate:
         if not self._profile_name.strip():
             raise gcmd.error("Value for parameter 'PROFILE' must be specified")
         self.bedmesh.set_mesh(None)
-        self.update_config(gcmd)
+        is_adaptive = self.update_config(gcmd)
+        self.cached_results = {}
+        method = gcmd.get("METHOD", "automatic").lower()
+        probe = self.printer.lookup_object("probe", None)
+        self.cache_results = (
+            self.probe_cache.is_enabled()
+            and probe is not None
+            and method == "automatic"
+        )
+        if (
+            self.cache_results
+            and is_adaptive
+            and gcmd.get_int("PROBE_CACHE", 1, minval=0, maxval=1)
+        ):
+            # Only probe the points without a valid cached result
+            pts = self._get_adjusted_points()
+            self.cached_results = self.probe_cache.lookup(pts)
+            if self.cached_results:
+                gcmd.respond_info(
+                    "bed_mesh: reusing %d of %d cached probe results"
+                    % (len(self.cached_results), len(pts))
+                )
+            missing = [
+                pt for i, pt in enumerate(pts) if i not in self.cached_results
+            ]
+            if not missing:
+                self.probe_finalize(probe.get_offsets(), [])
+                return
+            self.probe_helper.update_probe_points(missing, 1)
         self.probe_helper.start_probe(gcmd)
 
+    def _merge_cached_results(self, offsets, positions):
+        # Combine probed positions with cached results and store the
+        # newly probed results in the cache
+        pts = self._get_adjusted_points()
+        probed_pts = [
+            pt for i, pt in enumerate(pts) if i not in self.cached_results
+        ]
+        if len(probed_pts) != len(positions):
+            return positions
+        self.probe_cache.store(
+            [(pt[0], pt[1], pos[2]) for pt, pos in zip(probed_pts, positions)]
+        )
+        if not self.cached_results:
+            return positions
+        if self.probe_helper.use_offsets:
+            x_offset, y_offset = offsets[:2]
+        else:
+            x_offset = y_offset = 0.0
+        merged = []
+        probed = iter(positions)
+        for i, pt in enumerate(pts):
+            if i in self.cached_results:
+                z = self.cached_results[i]
+                merged.append([pt[0] - x_offset, pt[1] - y_offset, z])
+            else:
+                merged.append(next(probed))
+        return merged
+
     def probe_finalize(self, offsets, positions):
+        if self.cache_results:
+            positions = self._merge_cached_results(offsets, positions)
+            self.cached_results = {}
+            self.cache_results = False
         x_offset, y_offset, z_offset = offsets
         positions = [[round(p[0], 2), round(p[1], 2), p[2]] for p in positions]
         if self.zero_reference_mode == ZrefMode.PROBE:
@@ -1160,6 +1406,99 @@ class BedMeshCalibrate:
             )
 
 
+class ProbeResultCache:
+    def __init__(self, config):
+        self.printer = config.get_printer()
+        self.max_age = (
+            config.getfloat("probe_cache_max_age", 0.0, minval=0.0) * 60.0
+        )
+        self.temp_tolerance = config.getfloat(
+            "probe_cache_temp_tolerance", 2.0, minval=0.0
+        )
+        self.filename = config.get("probe_cache_file", None)
+        if self.filename is not None:
+            self.filename = os.path.expanduser(self.filename)
+        # Cached results - list of [x, y, bed_temp, timestamp, z]
+        self.results = []
+        if self.is_enabled():
+            self._load()
+
+    def is_enabled(self):
+        return self.max_age > 0.0
+
+    def _get_bed_temp(self):
+        heater_bed = self.printer.lookup_object("heater_bed", None)
+        if heater_bed is None:
+            return 0.0
+        eventtime = self.printer.get_reactor().monotonic()
+        status = heater_bed.get_status(eventtime)
+        return status["target"] or status["temperature"]
+
+    def _evict(self, now):
+        self.results = [r for r in self.results if now - r[3] <= self.max_age]
+
+    def _load(self):
+        if self.filename is None:
+            return
+        try:
+            with open(self.filename, "r") as f:
+                results = json.load(f)
+            self.results = [[float(v) for v in r[:5]] for r in results]
+        except (OSError, ValueError, TypeError, IndexError):
+            logging.info("bed_mesh: Unable to load probe cache")
+            return
+        self._evict(time.time())
+
+    def _save(self):
+        if self.filename is None:
+            return
+        tmp_fname = self.filename + ".tmp"
+        try:
+            with open(tmp_fname, "w") as f:
+                json.dump(self.results, f, separators=(",", ":"))
+            os.replace(tmp_fname, self.filename)
+        except OSError:
+            logging.info("bed_mesh: Unable to write probe cache")
+
+    def lookup(self, points):
+        # Return a dict of point index to cached z for still valid results
+        now = time.time()
+        self._evict(now)
+        bed_temp = self._get_bed_temp()
+        latest = {}
+        for x, y, temp, timestamp, z in self.results:
+            if abs(temp - bed_temp) > self.temp_tolerance:
+                continue
+            key = (round(x, 1), round(y, 1))
+            if key not in latest or latest[key][0] < timestamp:
+                latest[key] = (timestamp, z)
+        found = {}
+        for i, (x, y) in enumerate(points):
+            res = latest.get((round(x, 1), round(y, 1)))
+            if res is not None:
+                found[i] = res[1]
+        return found
+
+    def store(self, results):
+        # Add probed (x, y, z) results, replacing those they supersede
+        now = time.time()
+        self._evict(now)
+        bed_temp = self._get_bed_temp()
+        keys = set((round(x, 1), round(y, 1)) for x, y, z in results)
+        self.results = [
+            r
+            for r in self.results
+            if (round(r[0], 1), round(r[1], 1)) not in keys
+            or abs(r[2] - bed_temp) > self.temp_tolerance
+        ]
+        self.results.extend([[x, y, bed_temp, now, z] for x, y, z in results])
+        self._save()
+
+
+# Number of check points at which a move is split using numpy
+SPLIT_VECTOR_POINTS = 8
+
+
 class MoveSplitter:
     def __init__(self, config, gcode):
         self.split_delta_z = config.getfloat(
@@ -1176,66 +1515,86 @@ class MoveSplitter:
         self.z_mesh = mesh
         self.fade_offset = fade_offset
 
-    def build_move(self, prev_pos, next_pos, factor):
-        self.prev_pos = tuple(prev_pos)
-        self.next_pos = tuple(next_pos)
-        self.current_pos = list(prev_pos)
-        self.z_factor = factor
-        self.z_offset = self._calc_z_offset(prev_pos)
-        self.traverse_complete = False
-        self.distance_checked = 0.0
-        axes_d = [self.next_pos[i] - self.prev_pos[i] for i in range(4)]
-        self.total_move_length = math.sqrt(sum([d * d for d in axes_d[:3]]))
-        self.axis_move = [not isclose(d, 0.0, abs_tol=1e-10) for d in axes_d]
-
-    def _calc_z_offset(self, pos):
+    def _calc_z_offset(self, pos, factor):
         z = self.z_mesh.calc_z(pos[0], pos[1])
         offset = self.fade_offset
-        return self.z_factor * (z - offset) + offset
-
-    def _set_next_move(self, distance_from_prev):
-        t = distance_from_prev / self.total_move_length
-        if t > 1.0 or t < 0.0:
-            raise self.gcode.error(
-                "bed_mesh: Slice distance is negative "
-                "or greater than entire move length"
-            )
-        for i in range(4):
-            if self.axis_move[i]:
-                self.current_pos[i] = lerp(
-                    t, self.prev_pos[i], self.next_pos[i]
+        return factor * (z - offset) + offset
+
+    def _split_python(self, prev_pos, next_pos, move_info, factor):
+        axis_move, total_move_length = move_info
+        check_distance = self.move_check_distance
+        z_offset = self._calc_z_offset(prev_pos, factor)
+        moves = []
+        pos = list(prev_pos)
+        distance_checked = 0.0
+        while distance_checked + check_distance < total_move_length:
+            distance_checked += check_distance
+            t = distance_checked / total_move_length
+            for i in range(4):
+                if axis_move[i]:
+                    pos[i] = lerp(t, prev_pos[i], next_pos[i])
+            next_z = self._calc_z_offset(pos, factor)
+            if abs(next_z - z_offset) >= self.split_delta_z:
+                z_offset = next_z
+                moves.append((pos[0], pos[1], pos[2] + z_offset, pos[3]))
+        return moves
+
+    def _split_numpy(self, prev_pos, next_pos, move_info, factor):
+        # Calculate the z offset of all check points at once (using the
+        # same operations as _split_python())
+        axis_move, total_move_length = move_info
+        check_distance = self.move_check_distance
+        count = int(total_move_length / check_distance) + 2
+        dists = numpy.add.accumulate(numpy.full(count, check_distance))
+        t = dists[dists < total_move_length] / total_move_length
+        xy = [
+            (1.0 - t) * prev_pos[i] + t * next_pos[i]
+            if axis_move[i]
+            else numpy.full(len(t), prev_pos[i])
+            for i in range(2)
+        ]
+        z = self.z_mesh.calc_z_array(xy[0], xy[1])
+        offset = self.fade_offset
+        z_offsets = factor * (z - offset) + offset
+        z_offset = self._calc_z_offset(prev_pos, factor)
+        if numpy.abs(z_offsets - z_offset).max() < self.split_delta_z:
+            return []
+        # Generate moves at the check points that change the z offset
+        moves = []
+        t = t.tolist()
+        for i, next_z in enumerate(z_offsets.tolist()):
+            if abs(next_z - z_offset) >= self.split_delta_z:
+                z_offset = next_z
+                pos = [
+                    lerp(t[i], prev_pos[j], next_pos[j])
+                    if axis_move[j]
+                    else prev_pos[j]
+                    for j in range(4)
+                ]
+                moves.append((pos[0], pos[1], pos[2] + z_offset, pos[3]))
+        return moves
+
+    def split_move(self, prev_pos, next_pos, factor):
+        # Return the list of moves needed to follow the mesh
+        axes_d = [next_pos[i] - prev_pos[i] for i in range(4)]
+        total_move_length = math.sqrt(sum([d * d for d in axes_d[:3]]))
+        axis_move = [not isclose(d, 0.0, abs_tol=1e-10) for d in axes_d]
+        moves = []
+        if axis_move[0] or axis_move[1]:
+            # X and/or Y axis move, check the z offset along the move
+            move_info = (axis_move, total_move_length)
+            check_count = total_move_length / self.move_check_distance
+            if numpy is not None and check_count > SPLIT_VECTOR_POINTS:
+                moves = self._split_numpy(prev_pos, next_pos, move_info, factor)
+            else:
+                moves = self._split_python(
+                    prev_pos, next_pos, move_info, factor
                 )
-
-    def split(self):
-        if not self.traverse_complete:
-            if self.axis_move[0] or self.axis_move[1]:
-                # X and/or Y axis move, traverse if necessary
-                while (
-                    self.distance_checked + self.move_check_distance
-                    < self.total_move_length
-                ):
-                    self.distance_checked += self.move_check_distance
-                    self._set_next_move(self.distance_checked)
-                    next_z = self._calc_z_offset(self.current_pos)
-                    if abs(next_z - self.z_offset) >= self.split_delta_z:
-                        self.z_offset = next_z
-                        return (
-                            self.current_pos[0],
-                            self.current_pos[1],
-                            self.current_pos[2] + self.z_offset,
-                            self.current_pos[3],
-                        )
-            # end of move reached
-            self.current_pos[:] = self.next_pos
-            self.z_offset = self._calc_z_offset(self.current_pos)
-            # Its okay to add Z-Offset to the final move, since it will not be
-            # used again.
-            self.current_pos[2] += self.z_offset
-            self.traverse_complete = True
-            return self.current_pos
-        else:
-            # Traverse complete
-            return None
+        # end of move reached
+        z_offset = self._calc_z_offset(next_pos, factor)
+        x, y, z, e = next_pos
+        moves.append([x, y, z + z_offset, e])
+        return moves
 
 
 class ZMesh:
@@ -1286,6 +1645,7 @@ class ZMesh:
         self.mesh_y_dist = (self.mesh_y_max - self.mesh_y_min) / (
             self.mesh_y_count - 1
         )
+        self.mesh_cells = None
 
     def get_mesh_matrix(self):
         if self.mesh_matrix is not None:
@@ -1340,7 +1700,17 @@ class ZMesh:
     def build_mesh(self, z_matrix):
         self.probed_matrix = z_matrix
         self._sample(z_matrix)
-        self.print_mesh(logging.debug)
+        self._update_mesh_cells()
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            self.print_mesh(logging.debug)
+
+    def _update_mesh_cells(self):
+        # Store the four corner values of each mesh cell for calc_z_array()
+        if numpy is None:
+            return
+        tbl = numpy.array(self.mesh_matrix, dtype=float)
+        corners = [tbl[:-1, :-1], tbl[:-1, 1:], tbl[1:, :-1], tbl[1:, 1:]]
+        self.mesh_cells = numpy.stack([c.ravel() for c in corners], axis=1)
 
     def set_zero_reference(self, xpos, ypos):
         offset = self.calc_z(xpos, ypos)
@@ -1352,6 +1722,7 @@ class ZMesh:
             for yidx in range(len(matrix)):
                 for xidx in range(len(matrix[yidx])):
                     matrix[yidx][xidx] -= offset
+        self._update_mesh_cells()
 
     def set_mesh_offsets(self, offsets):
         for i, o in enumerate(offsets):
@@ -1376,6 +1747,18 @@ class ZMesh:
             # No mesh table generated, no z-adjustment
             return 0.0
 
+    def calc_z_array(self, x, y):
+        # Calculate calc_z() for numpy arrays of coordinates.  The
+        # operations match calc_z() so the results are identical.
+        if self.mesh_cells is None:
+            return numpy.zeros(len(x))
+        tx, xidx = self._get_linear_index_array(x + self.mesh_offsets[0], 0)
+        ty, yidx = self._get_linear_index_array(y + self.mesh_offsets[1], 1)
+        cells = self.mesh_cells[yidx * (self.mesh_x_count - 1) + xidx]
+        z0 = (1.0 - tx) * cells[:, 0] + tx * cells[:, 1]
+        z1 = (1.0 - tx) * cells[:, 2] + tx * cells[:, 3]
+        return (1.0 - ty) * z0 + ty * z1
+
     def get_z_range(self):
         if self.mesh_matrix is not None:
             mesh_min = min([min(x) for x in self.mesh_matrix])
@@ -1415,10 +1798,32 @@ class ZMesh:
         t = (coord - cfunc(idx)) / mesh_dist
         return constrain(t, 0.0, 1.0), idx
 
+    def _get_linear_index_array(self, coord, axis):
+        if axis == 0:
+            mesh_min = self.mesh_x_min
+            mesh_cnt = self.mesh_x_count
+            mesh_dist = self.mesh_x_dist
+        else:
+            mesh_min = self.mesh_y_min
+            mesh_cnt = self.mesh_y_count
+            mesh_dist = self.mesh_y_dist
+        idx = numpy.floor((coord - mesh_min) / mesh_dist)
+        idx = numpy.minimum(numpy.maximum(idx, 0), mesh_cnt - 2).astype(int)
+        t = (coord - (mesh_min + mesh_dist * idx)) / mesh_dist
+        return numpy.minimum(numpy.maximum(t, 0.0), 1.0), idx
+
     def _sample_direct(self, z_matrix):
         self.mesh_matrix = z_matrix
 
+    def _init_mesh_array(self, z_matrix):
+        mesh = numpy.zeros((self.mesh_y_count, self.mesh_x_count))
+        mesh[:: self.y_mult, :: self.x_mult] = z_matrix
+        return mesh
+
     def _sample_lagrange(self, z_matrix):
+        if numpy is not None:
+            self._sample_lagrange_array(z_matrix)
+            return
         x_mult = self.x_mult
         y_mult = self.y_mult
         self.mesh_matrix = [
@@ -1451,6 +1856,31 @@ class ZMesh:
                 y = self.get_y_coordinate(j)
                 self.mesh_matrix[j][i] = self._calc_lagrange(ypts, y, i, 1)
 
+    def _sample_lagrange_array(self, z_matrix):
+        # Same calculation as _calc_lagrange() for all points at once
+        x_mult = self.x_mult
+        y_mult = self.y_mult
+        mesh = self._init_mesh_array(z_matrix)
+        # Interpolate X coordinates of the probed rows
+        targets, nums, dens = get_lagrange_weights(
+            self.mesh_x_min, self.mesh_x_dist, self.mesh_x_count, x_mult
+        )
+        total = 0.0
+        for i, d in enumerate(dens):
+            z = mesh[::y_mult, i * x_mult, None]
+            total += z * nums[i] / d
+        mesh[::y_mult, targets] = total
+        # Interpolate Y coordinates
+        targets, nums, dens = get_lagrange_weights(
+            self.mesh_y_min, self.mesh_y_dist, self.mesh_y_count, y_mult
+        )
+        total = 0.0
+        for i, d in enumerate(dens):
+            z = mesh[i * y_mult]
+            total += z * nums[i, :, None] / d
+        mesh[targets] = total
+        self.mesh_matrix = mesh.tolist()
+
     def _get_lagrange_coords(self):
         xpts = []
         ypts = []
@@ -1482,6 +1912,9 @@ class ZMesh:
 
     def _sample_bicubic(self, z_matrix):
         # should work for any number of probe points above 3x3
+        if numpy is not None:
+            self._sample_bicubic_array(z_matrix)
+            return
         x_mult = self.x_mult
         y_mult = self.y_mult
         c = self.mesh_params["tension"]
@@ -1513,6 +1946,37 @@ class ZMesh:
                 pts = self._get_y_ctl_pts(x, y)
                 self.mesh_matrix[y][x] = self._cardinal_spline(pts, c)
 
+    def _sample_bicubic_array(self, z_matrix):
+        # Same calculation as _cardinal_spline() for all points at once
+        x_mult = self.x_mult
+        y_mult = self.y_mult
+        c = self.mesh_params["tension"]
+        mesh = self._init_mesh_array(z_matrix)
+        # Interpolate X values of the probed rows
+        targets, ctl_pts, weights = get_bicubic_weights(
+            self.mesh_x_count, x_mult
+        )
+        rows = mesh[::y_mult]
+        pts = [rows[:, idx] for idx in ctl_pts]
+        mesh[::y_mult, targets] = self._cardinal_spline_array(pts, weights, c)
+        # Interpolate Y values
+        targets, ctl_pts, weights = get_bicubic_weights(
+            self.mesh_y_count, y_mult
+        )
+        pts = [mesh[idx] for idx in ctl_pts]
+        weights = weights[:, :, None]
+        mesh[targets] = self._cardinal_spline_array(pts, weights, c)
+        self.mesh_matrix = mesh.tolist()
+
+    def _cardinal_spline_array(self, p, weights, tension):
+        m1 = tension * (p[2] - p[0])
+        m2 = tension * (p[3] - p[1])
+        a = p[1] * weights[0]
+        b = p[2] * weights[1]
+        c = m1 * weights[2]
+        d = m2 * weights[3]
+        return a + b + c + d
+
     def _get_x_ctl_pts(self, x, y):
         # Fetch control points and t for a X value in the mesh
         x_mult = self.x_mult
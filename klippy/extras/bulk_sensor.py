@@ -3,7 +3,9 @@
 # Copyright (C) 2020-2023  Kevin O'Connor <kevin@koconnor.net>
 #
 # This file may be distributed under the terms of the GNU GPLv3 license.
-import logging, threading, struct
+import logging, threading, struct, base64, tempfile, numbers
+import numpy
+from klippy import chelper
 
 # This "bulk sensor" module facilitates the processing of sensor chip
 # measurements that do not require the host to respond with low
@@ -119,15 +121,78 @@ class BatchBulkHelper:
         wh.register_mux_endpoint(path, key, value, self._add_api_client)
 
 
+def _flatten_row(row):
+    out = []
+    for value in row:
+        if isinstance(value, (tuple, list)):
+            out.extend(value)
+        else:
+            out.append(value)
+    return out
+
+
+# Convert a list of sample rows to a 2d array of doubles (or return None
+# if the rows do not form a matrix of numbers)
+def _rows_to_array(data):
+    if not len(data):
+        return numpy.empty(0, dtype="<f8")
+    try:
+        values = numpy.array(data)
+    except ValueError:
+        # Rows of different lengths or containing nested lists
+        values = None
+    if values is not None and values.ndim == 2 and values.dtype.kind in "biuf":
+        return values.astype("<f8")
+    # Rows containing nested lists (eg, positions) are flattened
+    rows = []
+    for row in data:
+        if not isinstance(row, (tuple, list)):
+            return None
+        rows.append(_flatten_row(row))
+    cols = len(rows[0])
+    for row in rows:
+        if len(row) != cols:
+            return None
+        for value in row:
+            if not isinstance(value, numbers.Real):
+                return None
+    return numpy.array(rows, dtype="<f8")
+
+
+# Replace the "data" list of lists in a batch message with a base64
+# encoded array of little-endian doubles (one row per sample).  Messages
+# with rows that can't be packed (eg, None values) are left as JSON.
+def pack_binary_data(msg):
+    data = msg.get("data")
+    if data is None:
+        return msg
+    values = _rows_to_array(data)
+    if values is None:
+        return msg
+    rows = len(data)
+    cols = values.size // rows if rows else 0
+    out = dict(msg)
+    out["data"] = base64.b64encode(values.tobytes()).decode()
+    out["data_format"] = "binary"
+    out["data_shape"] = [rows, cols]
+    return out
+
+
 # A webhooks wrapper for use by BatchBulkHelper
 class BatchWebhooksClient:
     def __init__(self, web_request):
         self.cconn = web_request.get_client_connection()
         self.template = web_request.get_dict("response_template", {})
+        data_format = web_request.get_str("data_format", "json")
+        if data_format not in ("json", "binary"):
+            raise web_request.error("Unknown data_format '%s'" % (data_format,))
+        self.is_binary = data_format == "binary"
 
     def handle_batch(self, msg):
         if self.cconn.is_closed():
             return False
+        if self.is_binary:
+            msg = pack_binary_data(msg)
         tmp = dict(self.template)
         tmp["params"] = msg
         self.cconn.send(tmp)
@@ -157,6 +222,58 @@ class BulkDataQueue:
         self.pull_queue()
 
 
+# Number of rows after which a SampleBuffer is moved to a temporary file
+SAMPLE_BUFFER_MMAP_ROWS = 1 << 21
+
+
+# Helper class to accumulate fixed width sample rows in a numpy array.
+# The array is preallocated and doubles in size when full.  Very long
+# captures are moved to a memory mapped temporary file so that they do
+# not need to be held in host memory.
+class SampleBuffer:
+    def __init__(
+        self, columns, initial_rows=4096, mmap_rows=SAMPLE_BUFFER_MMAP_ROWS
+    ):
+        self.columns = columns
+        self.mmap_rows = mmap_rows
+        self.mmap_file = None
+        self.data = numpy.empty((initial_rows, columns))
+        self.count = 0
+
+    def _grow(self, min_rows):
+        rows = len(self.data)
+        while rows < min_rows:
+            rows *= 2
+        if rows <= self.mmap_rows:
+            data = numpy.empty((rows, self.columns))
+            data[: self.count] = self.data[: self.count]
+            self.data = data
+            return
+        if self.mmap_file is None:
+            self.mmap_file = tempfile.TemporaryFile(prefix="klippy-samples-")
+            self.mmap_file.write(self.data[: self.count].tobytes())
+        self.mmap_file.truncate(rows * self.columns * self.data.itemsize)
+        self.data = numpy.memmap(
+            self.mmap_file, self.data.dtype, "r+", shape=(rows, self.columns)
+        )
+
+    def append(self, rows):
+        if not len(rows):
+            return
+        count = self.count
+        new_count = count + len(rows)
+        if new_count > len(self.data):
+            self._grow(new_count)
+        self.data[count:new_count] = rows
+        self.count = new_count
+
+    def get_data(self):
+        return self.data[: self.count]
+
+    def __len__(self):
+        return self.count
+
+
 ######################################################################
 # Clock synchronization
 ######################################################################
@@ -238,15 +355,58 @@ class ClockSyncRegression:
 MAX_BULK_MSG_SIZE = 51
 
 
+# Helper to convert the data of sensor_bulk_data messages into an array
+# of samples (using the C helper code)
+class BulkDataDecoder:
+    def __init__(self, unpack_fmt):
+        self.bytes_per_sample = struct.calcsize(unpack_fmt)
+        self.columns = 1 + len(
+            struct.unpack(unpack_fmt, bytes(self.bytes_per_sample))
+        )
+        ffi_main, ffi_lib = chelper.get_ffi()
+        decoder = ffi_lib.sensor_bulk_decoder_alloc(unpack_fmt.encode())
+        if decoder == ffi_main.NULL:
+            raise ValueError(
+                "Unsupported bulk sensor format %s" % (unpack_fmt,)
+            )
+        self.decoder = ffi_main.gc(decoder, ffi_lib.sensor_bulk_decoder_free)
+        self.ffi_main, self.ffi_lib = ffi_main, ffi_lib
+
+    # Returns an array with a row (time, field1, field2, ...) for each
+    # sample in 'datas'.  The time of sample 'i' of 'datas[m]' is
+    # time_base + (msg_clocks[m] + i) * inv_freq.
+    def decode(self, datas, msg_clocks, time_base, inv_freq):
+        ffi_main = self.ffi_main
+        data = b"".join(datas)
+        data_lens = [len(d) for d in datas]
+        samples = numpy.empty(
+            (len(data) // self.bytes_per_sample, self.columns)
+        )
+        count = self.ffi_lib.sensor_bulk_decode(
+            self.decoder,
+            ffi_main.from_buffer(data),
+            data_lens,
+            msg_clocks,
+            len(datas),
+            time_base,
+            inv_freq,
+            ffi_main.from_buffer("double[]", samples),
+            len(samples),
+        )
+        return samples[:count]
+
+    def get_empty(self):
+        return numpy.empty((0, self.columns))
+
+
 # Read sensor_bulk_data and calculate timestamps for devices that take
 # samples at a fixed frequency (and produce fixed data size samples).
 class FixedFreqReader:
     def __init__(self, mcu, chip_clock_smooth, unpack_fmt):
         self.mcu = mcu
         self.clock_sync = ClockSyncRegression(mcu, chip_clock_smooth)
-        unpack = struct.Struct(unpack_fmt)
-        self.unpack_from = unpack.unpack_from
-        self.bytes_per_sample = unpack.size
+        self.decoder = BulkDataDecoder(unpack_fmt)
+        self.bytes_per_sample = self.decoder.bytes_per_sample
         self.samples_per_block = MAX_BULK_MSG_SIZE // self.bytes_per_sample
         self.last_sequence = self.max_query_duration = 0
         self.last_overflows = 0
@@ -315,34 +475,33 @@ class FixedFreqReader:
         else:
             self.clock_sync.update(avg_mcu_clock, chip_clock)
 
-    # Convert sensor_bulk_data responses into list of samples
+    # Convert sensor_bulk_data responses into an array of samples (one
+    # row of (time, field1, field2, ...) per sample)
     def pull_samples(self):
         # Query MCU for sample timing and update clock synchronization
         self._update_clock()
         # Pull sensor_bulk_data messages from local queue
         raw_samples = self.bulk_queue.pull_queue()
         if not raw_samples:
-            return []
-        # Load variables to optimize inner loop below
+            return self.decoder.get_empty()
+        # Determine the chip clock of the first sample of each message
         last_sequence = self.last_sequence
         time_base, chip_base, inv_freq = self.clock_sync.get_time_translation()
-        unpack_from = self.unpack_from
         bytes_per_sample = self.bytes_per_sample
         samples_per_block = self.samples_per_block
-        # Process every message in raw_samples
-        count = seq = 0
-        samples = [None] * (len(raw_samples) * samples_per_block)
-        for params in raw_samples:
+        datas = [None] * len(raw_samples)
+        msg_clocks = [None] * len(raw_samples)
+        seq = last_count = 0
+        for i, params in enumerate(raw_samples):
             seq_diff = (params["sequence"] - last_sequence) & 0xFFFF
             seq_diff -= (seq_diff & 0x8000) << 1
             seq = last_sequence + seq_diff
-            msg_cdiff = seq * samples_per_block - chip_base
-            data = params["data"]
-            for i in range(len(data) // bytes_per_sample):
-                ptime = time_base + (msg_cdiff + i) * inv_freq
-                udata = unpack_from(data, i * bytes_per_sample)
-                samples[count] = (ptime,) + udata
-                count += 1
-        self.clock_sync.set_last_chip_clock(seq * samples_per_block + i)
-        del samples[count:]
+            data = datas[i] = params["data"]
+            msg_clocks[i] = seq * samples_per_block - chip_base
+            last_count = len(data) // bytes_per_sample or last_count
+        # Decode all samples and calculate their timestamps
+        samples = self.decoder.decode(datas, msg_clocks, time_base, inv_freq)
+        self.clock_sync.set_last_chip_clock(
+            seq * samples_per_block + last_count - 1
+        )
         return samples
@@ -62,6 +62,11 @@ class DangerOptions:
         self.endstop_sample_count = config.getint(
             "endstop_sample_count", 4, minval=1
         )
+        self.native_lookahead = config.getboolean("native_lookahead", False)
+        self.native_bed_mesh = config.getboolean("native_bed_mesh", False)
+        self.step_generation_threads = config.getint(
+            "step_generation_threads", 1, minval=1
+        )
 
         if self.minimal_logging:
             self.log_statistics = False
@@ -187,7 +187,7 @@ class ArcSupport:
 
             if i == segments:
                 c = targetPos
-            # Convert coords into G1 commands
+            # Convert coords into G1 moves
             g1_params = {"X": c[0], "Y": c[1], "Z": c[2]}
             if e_per_move:
                 g1_params["E"] = e_base + e_per_move
@@ -195,8 +195,7 @@ class ArcSupport:
                     e_base += e_per_move
             if asF is not None:
                 g1_params["F"] = asF
-            g1_gcmd = self.gcode.create_gcode_command("G1", "G1", g1_params)
-            self.gcode_move.cmd_G1(g1_gcmd)
+            self.gcode_move.fast_G1(g1_params, gcmd.get_commandline())
 
 
 def load_config(config):
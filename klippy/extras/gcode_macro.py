@@ -3,8 +3,8 @@
 # Copyright (C) 2018-2021  Kevin O'Connor <kevin@koconnor.net>
 #
 # This file may be distributed under the terms of the GNU GPLv3 license.
-import traceback, logging, ast, copy, json, threading
-import jinja2, math
+import traceback, logging, ast, copy, json, threading, types
+import jinja2, jinja2.meta, math
 import typing
 
 from klippy import configfile
@@ -15,6 +15,24 @@ from klippy import configfile
 ######################################################################
 
 
+SCALAR_TYPES = {int, float, bool, str, type(None)}
+
+
+# Copy a get_status() result so that templates can not modify it.  This
+# is a faster copy.deepcopy() that shares values that are immutable.
+def copy_status(val):
+    vtype = type(val)
+    if vtype in SCALAR_TYPES:
+        return val
+    if vtype is dict:
+        return {k: copy_status(v) for k, v in val.items()}
+    if vtype is list:
+        return [copy_status(v) for v in val]
+    if isinstance(val, tuple) and all(type(v) in SCALAR_TYPES for v in val):
+        return val
+    return copy.deepcopy(val)
+
+
 # Wrapper for access to printer object get_status() methods
 class GetStatusWrapperJinja:
     def __init__(self, printer, eventtime=None):
@@ -31,7 +49,7 @@ class GetStatusWrapperJinja:
             raise KeyError(val)
         if self.eventtime is None:
             self.eventtime = self.printer.get_reactor().monotonic()
-        self.cache[sval] = res = copy.deepcopy(po.get_status(self.eventtime))
+        self.cache[sval] = res = copy_status(po.get_status(self.eventtime))
         return res
 
     def __contains__(self, val):
@@ -83,6 +101,67 @@ class GetStatusWrapperPython:
             raise
 
 
+# Methods that modify a value in place (a template calling them may not
+# render the same output from the same inputs)
+MUTATING_METHODS = {
+    "append",
+    "extend",
+    "insert",
+    "pop",
+    "remove",
+    "clear",
+    "sort",
+    "reverse",
+    "update",
+    "setdefault",
+    "popitem",
+    "add",
+    "discard",
+}
+
+
+# Determine the inputs of a template.  Returns the referenced context
+# variables and the printer objects accessed, or None if the template
+# output can not be determined from those inputs.
+def find_template_inputs(env, script):
+    ast = env.parse(script)
+    names = jinja2.meta.find_undeclared_variables(ast)
+    if ast.find(jinja2.nodes.ExprStmt) is not None:
+        return None
+    for node in ast.find_all(jinja2.nodes.Filter):
+        if node.name == "random":
+            return None
+    for node in ast.find_all(jinja2.nodes.Call):
+        if (
+            isinstance(node.node, jinja2.nodes.Getattr)
+            and node.node.attr in MUTATING_METHODS
+        ):
+            return None
+    objects = set()
+    printer_refs = 0
+    for node in ast.find_all(jinja2.nodes.Name):
+        if node.name == "printer":
+            if node.ctx != "load":
+                return None
+            printer_refs += 1
+    for node in ast.find_all((jinja2.nodes.Getattr, jinja2.nodes.Getitem)):
+        obj = node.node
+        if not isinstance(obj, jinja2.nodes.Name) or obj.name != "printer":
+            continue
+        if isinstance(node, jinja2.nodes.Getattr):
+            objects.add(node.attr.strip())
+        elif isinstance(node.arg, jinja2.nodes.Const):
+            objects.add(str(node.arg.value).strip())
+        else:
+            return None
+        printer_refs -= 1
+    if printer_refs:
+        # The printer wrapper is used other than by a fixed object name
+        return None
+    names.discard("printer")
+    return sorted(names), sorted(objects)
+
+
 # Wrapper around a Jinja2 template
 class TemplateWrapperJinja:
     def __init__(self, printer, env, name, script):
@@ -111,12 +190,48 @@ class TemplateWrapperJinja:
             )
             logging.exception(msg)
             raise printer.config_error(msg)
+        # Cache of the last render
+        self.inputs = find_template_inputs(env, script)
+        self.last_inputs = self.last_result = None
+
+    def _get_inputs(self, context):
+        if self.inputs is None:
+            return None
+        names, objects = self.inputs
+        values = []
+        for name in names:
+            val = context.get(name)
+            if isinstance(val, types.ModuleType):
+                # Modules (eg, math) are constants compared by identity
+                values.append(val)
+                continue
+            if callable(val):
+                # Actions and helpers may have side effects
+                return None
+            try:
+                values.append(copy_status(val))
+            except (TypeError, copy.Error):
+                # Values that can not be copied are never cached
+                return None
+        if objects:
+            status = context.get("printer")
+            if not isinstance(status, GetStatusWrapperJinja):
+                return None
+            for name in objects:
+                try:
+                    values.append(status[name])
+                except KeyError:
+                    values.append(None)
+        return values
 
     def render(self, context=None):
         if context is None:
             context = self.create_template_context()
         try:
-            return str(self.template.render(context))
+            inputs = self._get_inputs(context)
+            if inputs is not None and inputs == self.last_inputs:
+                return self.last_result
+            result = str(self.template.render(context))
         except Exception as e:
             msg = "Error evaluating '%s': %s" % (
                 self.name,
@@ -124,6 +239,9 @@ class TemplateWrapperJinja:
             )
             logging.exception(msg)
             raise self.gcode.error(msg)
+        self.last_inputs = inputs
+        self.last_result = result
+        return result
 
     def run_gcode_from_command(self, context=None):
         self.gcode.run_script_from_command(self.render(context))
@@ -433,6 +551,7 @@ class GCodeMacro:
             desc=self.cmd_SET_GCODE_VARIABLE_help,
         )
         self.in_script = False
+        self.status_version = 0
         self.variables = {}
         prefix = "variable_"
         for option in config.get_prefix_options(prefix):
@@ -457,6 +576,20 @@ class GCodeMacro:
         self.gcode.register_command(self.rename_existing, prev_cmd, desc=pdesc)
         self.gcode.register_command(self.alias, self.cmd, desc=self.cmd_desc)
 
+    # The variables dict is replaced (never modified) when a variable
+    # changes, so track assignments to report status changes
+    @property
+    def variables(self):
+        return self._variables
+
+    @variables.setter
+    def variables(self, variables):
+        self._variables = variables
+        self.status_version += 1
+
+    def get_status_version(self):
+        return self.status_version
+
     def get_status(self, eventtime):
         return self.variables
 
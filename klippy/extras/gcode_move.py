@@ -49,6 +49,9 @@ class GCodeMove:
             desc = getattr(self, "cmd_" + cmd + "_help", None)
             gcode.register_command(cmd, func, False, desc)
         gcode.register_command("G0", self.cmd_G1)
+        gcode.register_fast_command("G0", self.fast_G1)
+        gcode.register_fast_command("G1", self.fast_G1)
+        gcode.register_fast_command("G92", self.fast_G92)
         gcode.register_command("M114", self.cmd_M114, True)
         gcode.register_command(
             "GET_POSITION",
@@ -152,34 +155,39 @@ class GCodeMove:
         # Move
         params = gcmd.get_command_parameters()
         try:
-            for pos, axis in enumerate("XYZ"):
-                if axis in params:
-                    v = float(params[axis])
-                    if not self.absolute_coord:
-                        # value relative to position of last move
-                        self.last_position[pos] += v
-                    else:
-                        # value relative to base coordinate position
-                        self.last_position[pos] = v + self.base_position[pos]
-            if "E" in params:
-                v = float(params["E"]) * self.extrude_factor
-                if not self.absolute_coord or not self.absolute_extrude:
-                    # value relative to position of last move
-                    self.last_position[3] += v
-                else:
-                    # value relative to base coordinate position
-                    self.last_position[3] = v + self.base_position[3]
-            if "F" in params:
-                gcode_speed = float(params["F"])
-                if gcode_speed <= 0.0:
-                    raise gcmd.error(
-                        "Invalid speed in '%s'" % (gcmd.get_commandline(),)
-                    )
-                self.speed = gcode_speed * self.speed_factor
+            params = {a: float(params[a]) for a in "XYZEF" if a in params}
         except ValueError as e:
             raise gcmd.error(
                 "Unable to parse move '%s'" % (gcmd.get_commandline(),)
             )
+        self.fast_G1(params, gcmd.get_commandline())
+
+    def fast_G1(self, params, commandline):
+        # Move using already parsed float parameters
+        for pos, axis in enumerate("XYZ"):
+            if axis in params:
+                v = params[axis]
+                if not self.absolute_coord:
+                    # value relative to position of last move
+                    self.last_position[pos] += v
+                else:
+                    # value relative to base coordinate position
+                    self.last_position[pos] = v + self.base_position[pos]
+        if "E" in params:
+            v = params["E"] * self.extrude_factor
+            if not self.absolute_coord or not self.absolute_extrude:
+                # value relative to position of last move
+                self.last_position[3] += v
+            else:
+                # value relative to base coordinate position
+                self.last_position[3] = v + self.base_position[3]
+        if "F" in params:
+            gcode_speed = params["F"]
+            if gcode_speed <= 0.0:
+                raise self.printer.command_error(
+                    "Invalid speed in '%s'" % (commandline,)
+                )
+            self.speed = gcode_speed * self.speed_factor
         self.move_with_transform(self.last_position, self.speed)
 
     # G-Code coordinate manipulation
@@ -209,7 +217,12 @@ class GCodeMove:
 
     def cmd_G92(self, gcmd):
         # Set position
-        offsets = [gcmd.get_float(a, None) for a in "XYZE"]
+        self._set_position([gcmd.get_float(a, None) for a in "XYZE"])
+
+    def fast_G92(self, params, commandline):
+        self._set_position([params.get(a) for a in "XYZE"])
+
+    def _set_position(self, offsets):
         for i, offset in enumerate(offsets):
             if offset is not None:
                 if i == 3:
@@ -4,6 +4,7 @@
 #
 # This file may be distributed under the terms of the GNU GPLv3 license.
 import logging
+import numpy
 from . import bulk_sensor
 
 #
@@ -106,14 +107,18 @@ class HX71xBase:
     # Measurement decoding
     def _convert_samples(self, samples):
         adc_factor = 1.0 / (1 << 23)
-        count = 0
-        for ptime, val in samples:
-            if val == SAMPLE_ERROR_DESYNC or val == SAMPLE_ERROR_LONG_READ:
-                self.last_error_count += 1
-                break  # additional errors are duplicates
-            samples[count] = (round(ptime, 6), val, round(val * adc_factor, 9))
-            count += 1
-        del samples[count:]
+        val = samples[:, 1].astype(numpy.int64)
+        errors = numpy.flatnonzero(
+            (val == SAMPLE_ERROR_DESYNC) | (val == SAMPLE_ERROR_LONG_READ)
+        )
+        if len(errors):
+            self.last_error_count += 1
+            # additional errors are duplicates
+            samples = samples[: errors[0]]
+            val = val[: errors[0]]
+        ptime = numpy.round(samples[:, 0], 6)
+        adc = numpy.round(val * adc_factor, 9)
+        return list(zip(ptime.tolist(), val.tolist(), adc.tolist()))
 
     # Start, stop, and process message batches
     def _start_measurements(self):
@@ -142,8 +147,7 @@ class HX71xBase:
     def _process_batch(self, eventtime):
         prev_overflows = self.ffreader.get_last_overflows()
         prev_error_count = self.last_error_count
-        samples = self.ffreader.pull_samples()
-        self._convert_samples(samples)
+        samples = self._convert_samples(self.ffreader.pull_samples())
         overflows = self.ffreader.get_last_overflows() - prev_overflows
         errors = self.last_error_count - prev_error_count
         if errors > 0:
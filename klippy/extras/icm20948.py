@@ -10,6 +10,7 @@
 #               2016/06/DS-000189-ICM-20948-v1.3.pdf
 
 import logging
+import numpy
 from . import bus, adxl345, bulk_sensor
 
 ICM20948_ADDR = 0x68
@@ -121,14 +122,12 @@ class ICM20948:
     # Measurement decoding
     def _convert_samples(self, samples):
         (x_pos, x_scale), (y_pos, y_scale), (z_pos, z_scale) = self.axes_map
-        count = 0
-        for ptime, rx, ry, rz in samples:
-            raw_xyz = (rx, ry, rz)
-            x = round(raw_xyz[x_pos] * x_scale, 6)
-            y = round(raw_xyz[y_pos] * y_scale, 6)
-            z = round(raw_xyz[z_pos] * z_scale, 6)
-            samples[count] = (round(ptime, 6), x, y, z)
-            count += 1
+        raw_xyz = (samples[:, 1], samples[:, 2], samples[:, 3])
+        x = numpy.round(raw_xyz[x_pos] * x_scale, 6)
+        y = numpy.round(raw_xyz[y_pos] * y_scale, 6)
+        z = numpy.round(raw_xyz[z_pos] * z_scale, 6)
+        ptime = numpy.round(samples[:, 0], 6)
+        return list(zip(ptime.tolist(), x.tolist(), y.tolist(), z.tolist()))
 
     # Start, stop, and process message batches
     def _start_measurements(self):
@@ -177,8 +176,7 @@ class ICM20948:
         self.set_reg(REG_PWR_MGMT_2, SET_PWR_MGMT_2_OFF)
 
     def _process_batch(self, eventtime):
-        samples = self.ffreader.pull_samples()
-        self._convert_samples(samples)
+        samples = self._convert_samples(self.ffreader.pull_samples())
         if not samples:
             return {}
         return {
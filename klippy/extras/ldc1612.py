@@ -4,6 +4,7 @@
 #
 # This file may be distributed under the terms of the GNU GPLv3 license.
 import logging
+import numpy
 from . import bus, bulk_sensor
 
 MIN_MSG_TIME = 0.100
@@ -191,13 +192,12 @@ class LDC1612:
     # Measurement decoding
     def _convert_samples(self, samples):
         freq_conv = float(LDC1612_FREQ) / (1 << 28)
-        count = 0
-        for ptime, val in samples:
-            mv = val & 0x0FFFFFFF
-            if mv != val:
-                self.last_error_count += 1
-            samples[count] = (round(ptime, 6), round(freq_conv * mv, 3), 999.9)
-            count += 1
+        val = samples[:, 1].astype(numpy.int64)
+        mv = val & 0x0FFFFFFF
+        self.last_error_count += numpy.count_nonzero(mv != val)
+        ptime = numpy.round(samples[:, 0], 6)
+        freq = numpy.round(freq_conv * mv, 3)
+        return [(t, f, 999.9) for t, f in zip(ptime.tolist(), freq.tolist())]
 
     # Start, stop, and process message batches
     def _start_measurements(self):
@@ -239,8 +239,7 @@ class LDC1612:
         logging.info("LDC1612 finished '%s' measurements", self.name)
 
     def _process_batch(self, eventtime):
-        samples = self.ffreader.pull_samples()
-        self._convert_samples(samples)
+        samples = self._convert_samples(self.ffreader.pull_samples())
         if not samples:
             return {}
         if self.calibration is not None:
@@ -5,6 +5,7 @@
 #
 # This file may be distributed under the terms of the GNU GPLv3 license.
 import logging
+import numpy
 from . import bus, adxl345, bulk_sensor
 
 MPU9250_ADDR = 0x68
@@ -127,14 +128,12 @@ class MPU9250:
     # Measurement decoding
     def _convert_samples(self, samples):
         (x_pos, x_scale), (y_pos, y_scale), (z_pos, z_scale) = self.axes_map
-        count = 0
-        for ptime, rx, ry, rz in samples:
-            raw_xyz = (rx, ry, rz)
-            x = round(raw_xyz[x_pos] * x_scale, 6)
-            y = round(raw_xyz[y_pos] * y_scale, 6)
-            z = round(raw_xyz[z_pos] * z_scale, 6)
-            samples[count] = (round(ptime, 6), x, y, z)
-            count += 1
+        raw_xyz = (samples[:, 1], samples[:, 2], samples[:, 3])
+        x = numpy.round(raw_xyz[x_pos] * x_scale, 6)
+        y = numpy.round(raw_xyz[y_pos] * y_scale, 6)
+        z = numpy.round(raw_xyz[z_pos] * z_scale, 6)
+        ptime = numpy.round(samples[:, 0], 6)
+        return list(zip(ptime.tolist(), x.tolist(), y.tolist(), z.tolist()))
 
     # Start, stop, and process message batches
     def _start_measurements(self):
@@ -189,8 +188,7 @@ class MPU9250:
         self.set_reg(REG_PWR_MGMT_2, SET_PWR_MGMT_2_OFF)
 
     def _process_batch(self, eventtime):
-        samples = self.ffreader.pull_samples()
-        self._convert_samples(samples)
+        samples = self._convert_samples(self.ffreader.pull_samples())
         if not samples:
             return {}
         return {
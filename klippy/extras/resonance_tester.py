@@ -399,6 +399,14 @@ class ResonanceTester:
                     for chip in accel_chips:
                         aclient = chip.start_internal_client()
                         raw_values.append((axis, aclient, chip.name))
+                # Calculate the frequency response during the test (the
+                # samples only need to be kept to write the raw data)
+                freq_responses = {}
+                if helper is not None:
+                    for chip_axis, aclient, chip_name in raw_values:
+                        freq_responses[aclient] = helper.start_freq_response(
+                            aclient, keep_samples=raw_name_suffix is not None
+                        )
 
                 # Generate moves
                 test_seq = self.generator.gen_test()
@@ -431,7 +439,9 @@ class ResonanceTester:
                         raise gcmd.error(
                             "accelerometer '%s' measured no data" % (chip_name,)
                         )
-                    new_data = helper.process_accelerometer_data(aclient)
+                    new_data = helper.finish_freq_response(
+                        freq_responses[aclient]
+                    )
                     if calibration_data[axis] is None:
                         calibration_data[axis] = new_data
                     else:
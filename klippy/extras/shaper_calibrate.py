@@ -20,6 +20,9 @@ TEST_DAMPING_RATIOS = [0.075, 0.1, 0.15]
 
 AUTOTUNE_SHAPERS = ["zv", "mzv", "ei", "2hump_ei", "3hump_ei"]
 
+# Number of test frequencies evaluated at once when fitting a shaper
+FIT_FREQS_BLOCK = 128
+
 ######################################################################
 # Frequency response calculation and shaper auto-tuning
 ######################################################################
@@ -72,6 +75,82 @@ class CalibrationData:
         return self._psd_map[axis]
 
 
+class WelchAccumulator:
+    # Incremental version of ShaperCalibrate.calc_freq_response() that
+    # consumes accelerometer samples as they arrive, so that only the
+    # samples of the last (incomplete) window are kept in memory
+    def __init__(self, helper):
+        self.helper = helper
+        np = self.numpy = helper.numpy
+        self.sample_count = 0
+        self.start_time = self.end_time = 0.0
+        # Rows of (accel_x, accel_y, accel_z) not yet covered by a window
+        self.pending = np.empty((0, 3))
+        self.nfft = 0
+        self.window = None
+        self.window_count = 0
+        self.psd_sums = None
+
+    def _setup_windows(self, sampling_freq):
+        np = self.numpy
+        # Round up to the nearest power of 2 for faster FFT
+        nfft = 1 << int(sampling_freq * WINDOW_T_SEC - 1).bit_length()
+        self.nfft = nfft
+        self.window = np.kaiser(nfft, 6.0)
+        self.psd_sums = np.zeros((3, nfft // 2 + 1))
+
+    def add_samples(self, samples):
+        # Process an array of (time, accel_x, accel_y, accel_z) rows
+        np = self.numpy
+        if not len(samples):
+            return
+        if not self.sample_count:
+            self.start_time = samples[0, 0]
+        self.end_time = samples[-1, 0]
+        self.sample_count += len(samples)
+        pending = np.concatenate([self.pending, samples[:, 1:]])
+        if not self.nfft:
+            # The window size depends on the sampling frequency, which
+            # is estimated from the first samples
+            duration = self.end_time - self.start_time
+            if duration < WINDOW_T_SEC:
+                self.pending = pending
+                return
+            self._setup_windows(self.sample_count / duration)
+        nfft, window = self.nfft, self.window
+        overlap = nfft // 2
+        step = nfft - overlap
+        n_windows = (pending.shape[0] - overlap) // step
+        if n_windows <= 0:
+            self.pending = pending
+            return
+        for i in range(3):
+            x = self.helper._split_into_windows(pending[:, i], nfft, overlap)
+            # First detrend, then apply windowing function
+            x = window[:, None] * (x - np.mean(x, axis=0))
+            result = np.fft.rfft(x, n=nfft, axis=0)
+            self.psd_sums[i] += (np.conjugate(result) * result).real.sum(
+                axis=-1
+            )
+        self.window_count += n_windows
+        self.pending = pending[n_windows * step :].copy()
+
+    def get_calibration_data(self):
+        np = self.numpy
+        if not self.window_count:
+            return None
+        fs = self.sample_count / (self.end_time - self.start_time)
+        # Compensation for windowing loss and averaging over windows
+        scale = 1.0 / ((self.window**2).sum() * fs * self.window_count)
+        psd = self.psd_sums * scale
+        # Double the one-sided response, except for the 'DC' term and
+        # the unpaired Nyquist frequency
+        psd[:, 1:-1] *= 2.0
+        freqs = np.fft.rfftfreq(self.nfft, 1.0 / fs)
+        px, py, pz = psd
+        return CalibrationData(freqs, px + py + pz, px, py, pz)
+
+
 CalibrationResult = collections.namedtuple(
     "CalibrationResult",
     ("name", "freq", "vals", "vibrs", "smoothing", "score", "max_accel"),
@@ -91,10 +170,8 @@ class ShaperCalibrate:
                 "docs/Measuring_Resonances.md for more details)."
             )
 
-    def background_process_exec(self, method, args):
-        if self.printer is None:
-            return method(*args)
-        import queuelogger
+    def _start_background_process(self, method, args):
+        from klippy import queuelogger
 
         parent_conn, child_conn = multiprocessing.Pipe()
 
@@ -109,26 +186,57 @@ class ShaperCalibrate:
             child_conn.send((False, res))
             child_conn.close()
 
-        # Start a process to perform the calculation
         calc_proc = multiprocessing.Process(target=wrapper)
         calc_proc.daemon = True
         calc_proc.start()
-        # Wait for the process to finish
+        return calc_proc, parent_conn
+
+    def background_process_map(self, method, args_list):
+        if self.printer is None:
+            return [method(*args) for args in args_list]
+        # Start a process per calculation (up to one per cpu core)
+        max_procs = max(1, min(len(args_list), multiprocessing.cpu_count()))
+        results = [None] * len(args_list)
+        pending = list(enumerate(args_list))
+        running = {}
+        # Wait for the processes to finish
         reactor = self.printer.get_reactor()
         gcode = self.printer.lookup_object("gcode")
         eventtime = last_report_time = reactor.monotonic()
-        while calc_proc.is_alive():
+        while pending or running:
+            while pending and len(running) < max_procs:
+                idx, args = pending.pop(0)
+                running[idx] = self._start_background_process(method, args)
+            for idx, (calc_proc, parent_conn) in list(running.items()):
+                is_alive = calc_proc.is_alive()
+                is_err, res = True, None
+                if parent_conn.poll():
+                    try:
+                        is_err, res = parent_conn.recv()
+                    except EOFError:
+                        pass
+                elif is_alive:
+                    continue
+                del running[idx]
+                calc_proc.join()
+                parent_conn.close()
+                if is_err:
+                    if res is None:
+                        res = "exit code %s" % (calc_proc.exitcode,)
+                    for other_proc, other_conn in running.values():
+                        other_proc.terminate()
+                    raise self.error("Error in remote calculation: %s" % (res,))
+                results[idx] = res
+            if not running:
+                continue
             if eventtime > last_report_time + 5.0:
                 last_report_time = eventtime
                 gcode.respond_info("Wait for calculations..", log=False)
             eventtime = reactor.pause(eventtime + 0.1)
-        # Return results
-        is_err, res = parent_conn.recv()
-        if is_err:
-            raise self.error("Error in remote calculation: %s" % (res,))
-        calc_proc.join()
-        parent_conn.close()
-        return res
+        return results
+
+    def background_process_exec(self, method, args):
+        return self.background_process_map(method, [args])[0]
 
     def _split_into_windows(self, x, window_size, overlap):
         # Memory-efficient algorithm to split an input 'x' into a series
@@ -178,10 +286,9 @@ class ShaperCalibrate:
         if isinstance(raw_values, np.ndarray):
             data = raw_values
         else:
-            samples = raw_values.get_samples()
-            if not samples:
+            data = raw_values.get_samples()
+            if not len(data):
                 return None
-            data = np.array(samples)
 
         N = data.shape[0]
         T = data[-1, 0] - data[0, 0]
@@ -209,31 +316,58 @@ class ShaperCalibrate:
         calibration_data.set_numpy(self.numpy)
         return calibration_data
 
-    def _estimate_shaper(self, shaper, test_damping_ratio, test_freqs):
+    def start_freq_response(self, aclient, keep_samples=False):
+        # Calculate the frequency response while the accelerometer
+        # data is being collected
+        accumulator = WelchAccumulator(self)
+        aclient.stream_samples(accumulator.add_samples, keep_samples)
+        return accumulator
+
+    def finish_freq_response(self, accumulator):
+        calibration_data = accumulator.get_calibration_data()
+        if calibration_data is None:
+            raise self.error(
+                "Internal error processing accelerometer data: only %d"
+                " samples measured" % (accumulator.sample_count,)
+            )
+        calibration_data.set_numpy(self.numpy)
+        return calibration_data
+
+    def _estimate_shapers(self, A, T, test_damping_ratio, test_freqs):
+        # Estimate the response of several shapers at once (each row of
+        # A and T holds the impulses of one shaper)
         np = self.numpy
 
-        A, T = np.array(shaper[0]), np.array(shaper[1])
-        inv_D = 1.0 / A.sum()
+        inv_D = 1.0 / A.sum(axis=-1)
 
         omega = 2.0 * math.pi * test_freqs
         damping = test_damping_ratio * omega
         omega_d = omega * math.sqrt(1.0 - test_damping_ratio**2)
-        W = A * np.exp(np.outer(-damping, (T[-1] - T)))
-        S = W * np.sin(np.outer(omega_d, T))
-        C = W * np.cos(np.outer(omega_d, T))
-        return np.sqrt(S.sum(axis=1) ** 2 + C.sum(axis=1) ** 2) * inv_D
+        W = A[:, None, :] * np.exp(
+            -damping[:, None] * (T[:, -1:] - T)[:, None, :]
+        )
+        S = W * np.sin(omega_d[:, None] * T[:, None, :])
+        C = W * np.cos(omega_d[:, None] * T[:, None, :])
+        return (
+            np.sqrt(S.sum(axis=-1) ** 2 + C.sum(axis=-1) ** 2) * inv_D[:, None]
+        )
+
+    def _estimate_shaper(self, shaper, test_damping_ratio, test_freqs):
+        np = self.numpy
+        A, T = np.array([shaper[0]]), np.array([shaper[1]])
+        return self._estimate_shapers(A, T, test_damping_ratio, test_freqs)[0]
 
     def _estimate_remaining_vibrations(
-        self, shaper, test_damping_ratio, freq_bins, psd
+        self, A, T, test_damping_ratio, freq_bins, psd
     ):
-        vals = self._estimate_shaper(shaper, test_damping_ratio, freq_bins)
+        vals = self._estimate_shapers(A, T, test_damping_ratio, freq_bins)
         # The input shaper can only reduce the amplitude of vibrations by
         # SHAPER_VIBRATION_REDUCTION times, so all vibrations below that
         # threshold can be igonred
         vibr_threshold = psd.max() / shaper_defs.SHAPER_VIBRATION_REDUCTION
         remaining_vibrations = self.numpy.maximum(
             vals * psd - vibr_threshold, 0
-        ).sum()
+        ).sum(axis=-1)
         all_vibrations = self.numpy.maximum(psd - vibr_threshold, 0).sum()
         return (remaining_vibrations / all_vibrations, vals)
 
@@ -293,25 +427,46 @@ class ShaperCalibrate:
         psd = calibration_data.psd_sum[freq_bins <= max_freq]
         freq_bins = freq_bins[freq_bins <= max_freq]
 
-        best_res = None
-        results = []
-        for test_freq in test_freqs[::-1]:
-            shaper_vibrations = 0.0
-            shaper_vals = np.zeros(shape=freq_bins.shape)
-            shaper = shaper_cfg.init_func(test_freq, damping_ratio)
-            shaper_smoothing = self._get_shaper_smoothing(shaper, scv=scv)
-            if max_smoothing and shaper_smoothing > max_smoothing and best_res:
-                return best_res
-            # Exact damping ratio of the printer is unknown, pessimizing
-            # remaining vibrations over possible damping values
+        # Test frequencies are evaluated from the highest to the lowest,
+        # stopping at the first one that exceeds max_smoothing
+        test_freqs = test_freqs[::-1]
+        shapers = [
+            shaper_cfg.init_func(test_freq, damping_ratio)
+            for test_freq in test_freqs
+        ]
+        smoothings = [
+            self._get_shaper_smoothing(shaper, scv=scv) for shaper in shapers
+        ]
+        num_freqs = len(test_freqs)
+        if max_smoothing:
+            for i in range(1, num_freqs):
+                if smoothings[i] > max_smoothing:
+                    num_freqs = i
+                    break
+
+        # Exact damping ratio of the printer is unknown, pessimizing
+        # remaining vibrations over possible damping values.  Shapers are
+        # evaluated in blocks of test frequencies to limit memory usage.
+        A = np.array([shaper[0] for shaper in shapers[:num_freqs]])
+        T = np.array([shaper[1] for shaper in shapers[:num_freqs]])
+        all_vibrations = np.zeros(shape=(num_freqs,))
+        all_vals = np.zeros(shape=(num_freqs, freq_bins.shape[0]))
+        for start in range(0, num_freqs, FIT_FREQS_BLOCK):
+            end = start + FIT_FREQS_BLOCK
             for dr in test_damping_ratios:
                 vibrations, vals = self._estimate_remaining_vibrations(
-                    shaper, dr, freq_bins, psd
+                    A[start:end], T[start:end], dr, freq_bins, psd
                 )
-                shaper_vals = np.maximum(shaper_vals, vals)
-                if vibrations > shaper_vibrations:
-                    shaper_vibrations = vibrations
-            max_accel = self.find_shaper_max_accel(shaper, scv)
+                all_vals[start:end] = np.maximum(all_vals[start:end], vals)
+                all_vibrations[start:end] = np.maximum(
+                    all_vibrations[start:end], vibrations
+                )
+
+        best_idx = None
+        results = []
+        for i in range(num_freqs):
+            shaper_vibrations = all_vibrations[i]
+            shaper_smoothing = smoothings[i]
             # The score trying to minimize vibrations, but also accounting
             # the growth of smoothing. The formula itself does not have any
             # special meaning, it simply shows good results on real user data
@@ -321,24 +476,33 @@ class ShaperCalibrate:
             results.append(
                 CalibrationResult(
                     name=shaper_cfg.name,
-                    freq=test_freq,
-                    vals=shaper_vals,
+                    freq=test_freqs[i],
+                    vals=all_vals[i],
                     vibrs=shaper_vibrations,
                     smoothing=shaper_smoothing,
                     score=shaper_score,
-                    max_accel=max_accel,
+                    max_accel=None,
                 )
             )
-            if best_res is None or best_res.vibrs > results[-1].vibrs:
+            if best_idx is None or results[best_idx].vibrs > results[-1].vibrs:
                 # The current frequency is better for the shaper.
-                best_res = results[-1]
-        # Try to find an 'optimal' shapper configuration: the one that is not
-        # much worse than the 'best' one, but gives much less smoothing
-        selected = best_res
-        for res in results[::-1]:
-            if res.vibrs < best_res.vibrs * 1.1 and res.score < selected.score:
-                selected = res
-        return selected
+                best_idx = i
+        selected_idx = best_idx
+        if num_freqs == len(test_freqs):
+            # Try to find an 'optimal' shapper configuration: the one that
+            # is not much worse than the 'best' one, but gives much less
+            # smoothing
+            best_vibrs = results[best_idx].vibrs
+            for i in range(num_freqs - 1, -1, -1):
+                res = results[i]
+                if (
+                    res.vibrs < best_vibrs * 1.1
+                    and res.score < results[selected_idx].score
+                ):
+                    selected_idx = i
+        # Only the max_accel of the selected configuration is calculated
+        max_accel = self.find_shaper_max_accel(shapers[selected_idx], scv)
+        return results[selected_idx]._replace(max_accel=max_accel)
 
     def _bisect(self, func):
         left = right = 1.0
@@ -385,11 +549,15 @@ class ShaperCalibrate:
         best_shaper = None
         all_shapers = []
         shapers = shapers or AUTOTUNE_SHAPERS
-        for shaper_cfg in shaper_defs.INPUT_SHAPERS:
-            if shaper_cfg.name not in shapers:
-                continue
-            shaper = self.background_process_exec(
-                self.fit_shaper,
+        shaper_cfgs = [
+            shaper_cfg
+            for shaper_cfg in shaper_defs.INPUT_SHAPERS
+            if shaper_cfg.name in shapers
+        ]
+        # Fit each shaper in a separate background process
+        fitted_shapers = self.background_process_map(
+            self.fit_shaper,
+            [
                 (
                     shaper_cfg,
                     calibration_data,
@@ -399,8 +567,11 @@ class ShaperCalibrate:
                     max_smoothing,
                     test_damping_ratios,
                     max_freq,
-                ),
-            )
+                )
+                for shaper_cfg in shaper_cfgs
+            ],
+        )
+        for shaper in fitted_shapers:
             if logger is not None:
                 logger(
                     "Fitted shaper '%s' frequency = %.1f Hz "
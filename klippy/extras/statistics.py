@@ -4,6 +4,7 @@
 #
 # This file may be distributed under the terms of the GNU GPLv3 license.
 import os, time, logging
+from .. import reactor
 from .danger_options import get_danger_options
 
 
@@ -59,6 +60,52 @@ class PrinterSysStats:
         }
 
 
+class PrinterReactorStats:
+    def __init__(self, config):
+        self.reactor = config.get_printer().get_reactor()
+        self.last_stats = self.reactor.get_timer_stats()
+
+    def _get_lateness(self, counts):
+        names = ["<%.0fms" % (b * 1000.0,) for b in reactor.LATENESS_BUCKETS]
+        names.append(">%.0fms" % (reactor.LATENESS_BUCKETS[-1] * 1000.0,))
+        return dict(zip(names, counts))
+
+    def stats(self, eventtime):
+        stats = self.reactor.get_timer_stats()
+        last_stats, self.last_stats = self.last_stats, stats
+        counts = stats["lateness_counts"]
+        last_counts = last_stats["lateness_counts"]
+        # Report timers dispatched more than 5ms late in this interval
+        late_idx = reactor.LATENESS_BUCKETS.index(0.005) + 1
+        late = sum(counts[late_idx:]) - sum(last_counts[late_idx:])
+        busiest_name, busiest_time = "", 0.0
+        for name, timer in stats["timers"].items():
+            last_timer = last_stats["timers"].get(name)
+            t = timer["total_time"]
+            if last_timer is not None:
+                t -= last_timer["total_time"]
+            if t > busiest_time:
+                busiest_name, busiest_time = name, t
+        msg = "reactor_late=%d reactor_max_late=%.3f greenlets=%d" % (
+            late,
+            stats["max_lateness"],
+            stats["greenlets"],
+        )
+        if busiest_name:
+            msg += " busiest_timer=%s:%.3f" % (busiest_name, busiest_time)
+        return (False, msg)
+
+    def get_status(self, eventtime):
+        stats = self.reactor.get_timer_stats()
+        return {
+            "timer_lateness": self._get_lateness(stats["lateness_counts"]),
+            "max_lateness": stats["max_lateness"],
+            "greenlets": stats["greenlets"],
+            "idle_greenlets": stats["idle_greenlets"],
+            "timers": stats["timers"],
+        }
+
+
 class PrinterStats:
     def __init__(self, config):
         self.printer = config.get_printer()
@@ -88,4 +135,5 @@ class PrinterStats:
 
 def load_config(config):
     config.get_printer().add_object("system_stats", PrinterSysStats(config))
+    config.get_printer().add_object("reactor", PrinterReactorStats(config))
     return PrinterStats(config)
@@ -0,0 +1,57 @@
+# Host step generation statistics for each stepper
+#
+# This file may be distributed under the terms of the GNU GPLv3 license.
+
+
+class PrinterStepperStats:
+    def __init__(self, config):
+        self.printer = config.get_printer()
+        self.steppers = []
+        self.last_stats = {}
+        self.printer.register_event_handler("klippy:connect", self._connect)
+
+    def _connect(self):
+        motion_report = self.printer.lookup_object("motion_report")
+        for name, dstepper in sorted(motion_report.steppers.items()):
+            mcu_stepper = dstepper.mcu_stepper
+            mcu_stepper.set_step_stats_enabled(True)
+            self.steppers.append(mcu_stepper)
+            self.last_stats[name] = mcu_stepper.get_step_stats()
+
+    def stats(self, eventtime):
+        is_active = False
+        out = []
+        for mcu_stepper in self.steppers:
+            name = mcu_stepper.get_name()
+            stats = mcu_stepper.get_step_stats()
+            last_stats = self.last_stats[name]
+            self.last_stats[name] = stats
+            steps = stats["step_count"] - last_stats["step_count"]
+            msgs = stats["queue_step_count"] - last_stats["queue_step_count"]
+            is_active |= steps > 0
+            out.append(
+                "%s: steps=%d compression=%.1f gen_time=%.6f flush_time=%.6f"
+                % (
+                    name,
+                    steps,
+                    steps / msgs if msgs else 0.0,
+                    stats["gen_time"] - last_stats["gen_time"],
+                    stats["flush_time"] - last_stats["flush_time"],
+                )
+            )
+        return is_active, " ".join(out)
+
+    def get_status(self, eventtime):
+        steppers = {}
+        for mcu_stepper in self.steppers:
+            stats = mcu_stepper.get_step_stats()
+            msgs = stats["queue_step_count"]
+            stats["compression_ratio"] = (
+                stats["step_count"] / msgs if msgs else 0.0
+            )
+            steppers[mcu_stepper.get_name()] = stats
+        return {"steppers": steppers}
+
+
+def load_config(config):
+    return PrinterStepperStats(config)
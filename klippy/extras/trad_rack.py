@@ -9,7 +9,7 @@ from collections import deque
 from .homing import Homing, HomingMove
 from .. import chelper, toolhead
 from ..gcode import CommandError
-from ..stepper import LookupMultiRail
+from ..stepper import LookupMultiRail, StepGenerationPool
 from ..kinematics import extruder
 
 SERVO_NAME = "servo tr_servo"
@@ -2317,7 +2317,10 @@ class TradRackToolHead(toolhead.ToolHead, object):
         ]
         self.mcu = self.all_mcus[0]
         if hasattr(toolhead, "LookAheadQueue"):
-            self.lookahead = toolhead.LookAheadQueue(self)
+            if self.danger_options.native_lookahead:
+                self.lookahead = toolhead.NativeLookAheadQueue(self)
+            else:
+                self.lookahead = toolhead.LookAheadQueue(self)
             self.lookahead.set_flush_time(toolhead.BUFFER_TIME_HIGH)
         else:
             self.move_queue = toolhead.MoveQueue(self)
@@ -2387,6 +2390,10 @@ class TradRackToolHead(toolhead.ToolHead, object):
         self.trapq_append = ffi_lib.trapq_append
         self.trapq_finalize_moves = ffi_lib.trapq_finalize_moves
         self.step_generators = []
+        self.stepgen_pool = None
+        stepgen_threads = self.danger_options.step_generation_threads
+        if stepgen_threads > 1:
+            self.stepgen_pool = StepGenerationPool(stepgen_threads)
         # Create kinematic class
         gcode = self.printer.lookup_object("gcode")
         self.Coord = gcode.Coord
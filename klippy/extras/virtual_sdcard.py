@@ -3,10 +3,220 @@
 # Copyright (C) 2018-2024  Kevin O'Connor <kevin@koconnor.net>
 #
 # This file may be distributed under the terms of the GNU GPLv3 license.
-import os, sys, logging, io
+import os, logging, io, threading, queue, bisect, json, re
 
 VALID_GCODE_EXTS = ["gcode", "g", "gco"]
 
+READ_SIZE = 32768
+READ_AHEAD_BLOCKS = 8
+READ_WAIT_TIME = 0.005
+
+
+# Read a file in a background thread so that slow storage does not
+# stall the main thread.  Data is read with os.pread() so the file
+# object's position is not modified.
+class FileReadAhead:
+    def __init__(self, fileobj, position):
+        self.fd = fileobj.fileno()
+        self.position = position
+        self.blocks = queue.Queue(READ_AHEAD_BLOCKS)
+        self.is_stopped = False
+        self.thread = threading.Thread(target=self._read_thread)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _read_thread(self):
+        while not self.is_stopped:
+            try:
+                data = os.pread(self.fd, READ_SIZE, self.position)
+            except OSError as e:
+                self.blocks.put(e)
+                return
+            self.position += len(data)
+            self.blocks.put(data)
+            if not data:
+                return
+
+    def get_data(self):
+        # Returns the next block of data, b"" at end of file, None if
+        # the data is not yet available, or raises the read error
+        try:
+            data = self.blocks.get_nowait()
+        except queue.Empty:
+            return None
+        if isinstance(data, Exception):
+            raise data
+        return data
+
+    def stop(self):
+        # The thread exits after its current read - don't wait for it
+        # (that would block the main thread on slow storage)
+        self.is_stopped = True
+        # Make room for a pending put() so the thread can exit
+        while 1:
+            try:
+                self.blocks.get_nowait()
+            except queue.Empty:
+                break
+
+
+INDEX_VERSION = 2
+INDEX_MARKER_RE = re.compile(
+    rb"^[ \t]*(?:;LAYER_CHANGE|;LAYER:|EXCLUDE_OBJECT_START[ \t]+NAME=(\S+))",
+    re.MULTILINE,
+)
+
+
+# Map line numbers, layer changes, and object starts of a g-code file
+# to byte offsets.  The index is built in a background thread and is
+# cached in a hidden file next to the g-code file.
+class GCodeFileIndex:
+    def __init__(self, fname):
+        self.fname = fname
+        dname, bname = os.path.split(fname)
+        self.cache_fname = os.path.join(dname, ".%s.index" % (bname,))
+        self.block_offsets = []
+        self.block_lines = []
+        self.line_count = 0
+        self.layer_offsets = []
+        self.object_offsets = {}
+        self.file_size = self.scan_offset = 0
+        self.state = "building"
+        self.is_stopped = False
+        self.thread = threading.Thread(target=self._build_thread)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _build_thread(self):
+        try:
+            st = os.stat(self.fname)
+            key = [st.st_size, st.st_mtime_ns]
+            self.file_size = st.st_size
+            if not self._load_cache(key):
+                self._scan_file()
+                if self.is_stopped:
+                    return
+                self._save_cache(key)
+        except:
+            logging.exception("virtual_sdcard file index")
+            self.state = "error"
+            return
+        self.state = "ready"
+
+    def _scan_file(self):
+        offset = line = 0
+        partial_input = b""
+        with io.open(self.fname, "rb") as f:
+            while not self.is_stopped:
+                data = f.read(READ_SIZE)
+                if not data:
+                    break
+                data = partial_input + data
+                end = data.rfind(b"\n") + 1
+                partial_input = data[end:]
+                if not end:
+                    continue
+                self._add_block(data, end, offset, line)
+                line += data.count(b"\n", 0, end)
+                offset += end
+                self.scan_offset = offset
+        if partial_input and not self.is_stopped:
+            # Final line without a trailing newline
+            self._add_block(partial_input, len(partial_input), offset, line)
+            line += 1
+        self.line_count = line
+
+    def _add_block(self, data, end, offset, line):
+        self.block_offsets.append(offset)
+        self.block_lines.append(line)
+        for m in INDEX_MARKER_RE.finditer(data, 0, end):
+            pos = offset + m.start()
+            name = m.group(1)
+            if name is None:
+                self.layer_offsets.append(pos)
+            else:
+                name = name.decode(errors="replace").upper()
+                self.object_offsets.setdefault(name, []).append(pos)
+
+    def _load_cache(self, key):
+        try:
+            with io.open(self.cache_fname, "r") as f:
+                data = json.load(f)
+            if data["version"] != INDEX_VERSION or data["key"] != key:
+                return False
+            self.block_offsets = data["block_offsets"]
+            self.block_lines = data["block_lines"]
+            self.line_count = data["line_count"]
+            self.layer_offsets = data["layer_offsets"]
+            self.object_offsets = data["object_offsets"]
+        except (OSError, ValueError, KeyError):
+            return False
+        return True
+
+    def _save_cache(self, key):
+        data = {
+            "version": INDEX_VERSION,
+            "key": key,
+            "block_offsets": self.block_offsets,
+            "block_lines": self.block_lines,
+            "line_count": self.line_count,
+            "layer_offsets": self.layer_offsets,
+            "object_offsets": self.object_offsets,
+        }
+        tmp_fname = self.cache_fname + ".tmp"
+        try:
+            with io.open(tmp_fname, "w") as f:
+                json.dump(data, f, separators=(",", ":"))
+            os.replace(tmp_fname, self.cache_fname)
+        except OSError:
+            logging.info("Unable to write file index %s", self.cache_fname)
+
+    def stop(self):
+        self.is_stopped = True
+
+    def get_progress(self):
+        if not self.file_size:
+            return 0.0
+        return min(1.0, self.scan_offset / self.file_size)
+
+    def get_line_offset(self, line):
+        # Line numbers start at 1
+        line -= 1
+        if line < 0 or line >= self.line_count:
+            return None
+        i = bisect.bisect_right(self.block_lines, line) - 1
+        offset = self.block_offsets[i]
+        if i + 1 < len(self.block_offsets):
+            size = self.block_offsets[i + 1] - offset
+        else:
+            size = os.path.getsize(self.fname) - offset
+        with io.open(self.fname, "rb") as f:
+            f.seek(offset)
+            data = f.read(size)
+        pos = 0
+        for _ in range(line - self.block_lines[i]):
+            pos = data.index(b"\n", pos) + 1
+        return offset + pos
+
+    def get_layer_count(self):
+        return len(self.layer_offsets)
+
+    def get_layer(self, offset):
+        # Layer numbers start at 1 (0 is prior to the first layer)
+        return bisect.bisect_right(self.layer_offsets, offset)
+
+    def get_layer_offset(self, layer):
+        if layer < 1 or layer > len(self.layer_offsets):
+            return None
+        return self.layer_offsets[layer - 1]
+
+    def get_object_offset(self, name, offset=0):
+        offsets = self.object_offsets.get(name.upper(), [])
+        i = bisect.bisect_left(offsets, offset)
+        if i >= len(offsets):
+            return None
+        return offsets[i]
+
 
 DEFAULT_ERROR_GCODE = """
 {% if 'heaters' in printer %}
@@ -24,9 +234,11 @@ class VirtualSD:
         # sdcard state
         sd = config.get("path")
         self.with_subdirs = config.getboolean("with_subdirs", False)
+        self.use_file_index = config.getboolean("file_index", False)
         self.sdcard_dirname = os.path.normpath(os.path.expanduser(sd))
         self.current_file = None
         self.file_position = self.file_size = 0
+        self.file_index = None
         # Print Stat Tracking
         self.print_stats = self.printer.load_object(config, "print_stats")
         # Work timer
@@ -55,6 +267,11 @@ class VirtualSD:
             self.cmd_SDCARD_PRINT_FILE,
             desc=self.cmd_SDCARD_PRINT_FILE_help,
         )
+        self.gcode.register_command(
+            "SDCARD_SET_POSITION",
+            self.cmd_SDCARD_SET_POSITION,
+            desc=self.cmd_SDCARD_SET_POSITION_help,
+        )
 
     def handle_shutdown(self):
         if self.work_timer is not None:
@@ -70,9 +287,9 @@ class VirtualSD:
             logging.info(
                 "Virtual sdcard (%d): %s\nUpcoming (%d): %s",
                 readpos,
-                repr(data[:readcount]),
+                repr(data[:readcount].decode(errors="replace")),
                 self.file_position,
-                repr(data[readcount:]),
+                repr(data[readcount:].decode(errors="replace")),
             )
 
     def stats(self, eventtime):
@@ -110,12 +327,19 @@ class VirtualSD:
                 raise self.gcode.error("Unable to get file list")
 
     def get_status(self, eventtime):
+        layer = layer_count = None
+        index = self.file_index
+        if index is not None and index.state == "ready":
+            layer = index.get_layer(self.file_position)
+            layer_count = index.get_layer_count()
         return {
             "file_path": self.file_path(),
             "progress": self.progress(),
             "is_active": self.is_active(),
             "file_position": self.file_position,
             "file_size": self.file_size,
+            "layer": layer,
+            "layer_count": layer_count,
         }
 
     def file_path(self):
@@ -152,8 +376,14 @@ class VirtualSD:
             self.current_file.close()
             self.current_file = None
             self.print_stats.note_cancel()
+        self._clear_file_index()
         self.file_position = self.file_size = 0
 
+    def _clear_file_index(self):
+        if self.file_index is not None:
+            self.file_index.stop()
+            self.file_index = None
+
     # G-Code commands
     def cmd_error(self, gcmd):
         raise gcmd.error("SD write not supported")
@@ -163,6 +393,7 @@ class VirtualSD:
             self.do_pause()
             self.current_file.close()
             self.current_file = None
+        self._clear_file_index()
         self.file_position = self.file_size = 0
         self.print_stats.reset()
         self.printer.send_event("virtual_sdcard:reset_file")
@@ -191,6 +422,47 @@ class VirtualSD:
         self._load_file(gcmd, filename, check_subdirs=True)
         self.do_resume()
 
+    def _get_file_index(self, gcmd):
+        index = self.file_index
+        if index is None:
+            raise gcmd.error("No file index available")
+        if index.state == "building":
+            # Don't hold the G-Code mutex while a large file is scanned
+            raise gcmd.error(
+                "File index still building (%d%% complete), retry later"
+                % (index.get_progress() * 100.0,)
+            )
+        if index.state != "ready":
+            raise gcmd.error("Unable to index file")
+        return index
+
+    cmd_SDCARD_SET_POSITION_help = (
+        "Set the SD position from a line, layer, or object start"
+    )
+
+    def cmd_SDCARD_SET_POSITION(self, gcmd):
+        if self.work_timer is not None:
+            raise gcmd.error("SD busy")
+        line = gcmd.get_int("LINE", None, minval=1)
+        layer = gcmd.get_int("LAYER", None, minval=1)
+        obj = gcmd.get("OBJECT", None)
+        index = self._get_file_index(gcmd)
+        pos = 0
+        if line is not None:
+            pos = index.get_line_offset(line)
+            if pos is None:
+                raise gcmd.error("Line %d not found" % (line,))
+        elif layer is not None:
+            pos = index.get_layer_offset(layer)
+            if pos is None:
+                raise gcmd.error("Layer %d not found" % (layer,))
+        if obj is not None:
+            pos = index.get_object_offset(obj, pos)
+            if pos is None:
+                raise gcmd.error("Object %s not found" % (obj,))
+        self.file_position = pos
+        gcmd.respond_info("SD position set to %d" % (pos,))
+
     def cmd_M20(self, gcmd):
         # List SD card
         files = self.get_file_list(self.with_subdirs)
@@ -222,7 +494,7 @@ class VirtualSD:
             if fname not in flist:
                 fname = files_by_lower[fname.lower()]
             fname = os.path.join(self.sdcard_dirname, fname)
-            f = io.open(fname, "r", newline="")
+            f = io.open(fname, "rb")
             f.seek(0, os.SEEK_END)
             fsize = f.tell()
             f.seek(0)
@@ -234,6 +506,8 @@ class VirtualSD:
         self.current_file = f
         self.file_position = 0
         self.file_size = fsize
+        if self.use_file_index:
+            self.file_index = GCodeFileIndex(fname)
         self.print_stats.set_current_file(filename)
         self.printer.send_event("virtual_sdcard:load_file")
 
@@ -274,25 +548,28 @@ class VirtualSD:
     def work_handler(self, eventtime):
         logging.info("Starting SD card print (position %d)", self.file_position)
         self.reactor.unregister_timer(self.work_timer)
-        try:
-            self.current_file.seek(self.file_position)
-        except:
-            logging.exception("virtual_sdcard seek")
-            self.work_timer = None
-            return self.reactor.NEVER
+        reader = FileReadAhead(self.current_file, self.file_position)
         self.print_stats.note_start()
         gcode_mutex = self.gcode.get_mutex()
-        partial_input = ""
+        partial_input = b""
         lines = []
+        line_sizes = None
+        line_index = 0
         error_message = None
         while not self.must_pause_work:
-            if not lines:
+            if line_index >= len(lines):
                 # Read more data
                 try:
-                    data = self.current_file.read(8192)
+                    data = reader.get_data()
                 except:
                     logging.exception("virtual_sdcard read")
                     break
+                if data is None:
+                    # Still waiting on the read-ahead thread
+                    self.reactor.pause(
+                        self.reactor.monotonic() + READ_WAIT_TIME
+                    )
+                    continue
                 if not data:
                     # End of file
                     self.current_file.close()
@@ -300,10 +577,22 @@ class VirtualSD:
                     logging.info("Finished SD card print")
                     self.gcode.respond_raw("Done printing file")
                     break
-                lines = data.split("\n")
-                lines[0] = partial_input + lines[0]
-                partial_input = lines.pop()
-                lines.reverse()
+                data = partial_input + data
+                end = data.rfind(b"\n") + 1
+                partial_input = data[end:]
+                try:
+                    text = data[:end].decode()
+                except UnicodeDecodeError:
+                    logging.exception("virtual_sdcard read")
+                    break
+                lines = text.split("\n")
+                lines.pop()
+                # File positions are byte offsets - only non-ascii lines
+                # have a different size once encoded
+                line_sizes = None
+                if not text.isascii():
+                    line_sizes = [len(line.encode()) for line in lines]
+                line_index = 0
                 self.reactor.pause(self.reactor.NOW)
                 continue
             # Pause if any other request is pending in the gcode class
@@ -312,11 +601,14 @@ class VirtualSD:
                 continue
             # Dispatch command
             self.cmd_from_sd = True
-            line = lines.pop()
-            if sys.version_info.major >= 3:
-                next_file_position = self.file_position + len(line.encode()) + 1
-            else:
+            line = lines[line_index]
+            if line_sizes is None:
                 next_file_position = self.file_position + len(line) + 1
+            else:
+                next_file_position = (
+                    self.file_position + line_sizes[line_index] + 1
+                )
+            line_index += 1
             self.next_file_position = next_file_position
             try:
                 self.gcode.run_script(line)
@@ -334,14 +626,12 @@ class VirtualSD:
             self.file_position = self.next_file_position
             # Do we need to skip around?
             if self.next_file_position != next_file_position:
-                try:
-                    self.current_file.seek(self.file_position)
-                except:
-                    logging.exception("virtual_sdcard seek")
-                    self.work_timer = None
-                    return self.reactor.NEVER
+                reader.stop()
+                reader = FileReadAhead(self.current_file, self.file_position)
                 lines = []
-                partial_input = ""
+                line_index = 0
+                partial_input = b""
+        reader.stop()
         logging.info("Exiting SD card print (position %d)", self.file_position)
         self.work_timer = None
         self.cmd_from_sd = False
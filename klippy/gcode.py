@@ -156,6 +156,8 @@ class GCodeDispatch:
         self.mux_commands = {}
         self.gcode_help = {}
         self.status_commands = {}
+        self.fast_handlers = {}
+        self.active_fast_handlers = {}
         self._interrupt_counter = 0
         # Register commands needed before config file is loaded
         handlers = [
@@ -198,6 +200,7 @@ class GCodeDispatch:
             if cmd in self.base_gcode_handlers:
                 del self.base_gcode_handlers[cmd]
             self._build_status_commands()
+            self._build_fast_handlers()
             return old_cmd
         if desc is None and func.__doc__:
             desc = func.__doc__
@@ -226,6 +229,20 @@ class GCodeDispatch:
         if desc is not None:
             self.gcode_help[cmd] = desc
         self._build_status_commands()
+        self._build_fast_handlers()
+
+    def register_fast_command(self, cmd, fast_func):
+        # Register a handler for simple numeric commands (eg, "G1 X10 F600")
+        # that receives a dict of float parameters instead of a GCodeCommand.
+        # It is only used while the handler currently registered for the
+        # command remains active (ie, it is not overridden by a macro).
+        func = self.ready_gcode_handlers.get(cmd)
+        if func is None or not self.is_traditional_gcode(cmd):
+            raise self.printer.config_error(
+                "Can't register fast handler for '%s'" % (cmd,)
+            )
+        self.fast_handlers[cmd] = (func, fast_func)
+        self._build_fast_handlers()
 
     def register_mux_command(self, cmd, key, value, func, desc=None):
         prev = self.mux_commands.get(cmd)
@@ -262,6 +279,13 @@ class GCodeDispatch:
                 commands[cmd]["help"] = self.gcode_help[cmd]
         self.status_commands = commands
 
+    def _build_fast_handlers(self):
+        self.active_fast_handlers = {
+            cmd: fast_func
+            for cmd, (func, fast_func) in self.fast_handlers.items()
+            if self.gcode_handlers.get(cmd) is func
+        }
+
     def register_output_handler(self, cb):
         self.output_callbacks.append(cb)
 
@@ -271,6 +295,7 @@ class GCodeDispatch:
         self.is_printer_ready = False
         self.gcode_handlers = self.base_gcode_handlers
         self._build_status_commands()
+        self._build_fast_handlers()
         self._respond_state("Shutdown")
 
     def _handle_disconnect(self):
@@ -280,34 +305,52 @@ class GCodeDispatch:
         self.is_printer_ready = True
         self.gcode_handlers = self.ready_gcode_handlers
         self._build_status_commands()
+        self._build_fast_handlers()
         self._respond_state("Ready")
 
     # Parse input into commands
     args_r = re.compile("([A-Z_]+|[A-Z*])")
+    fast_cmd_r = re.compile(
+        r"(G[0-9]+)((?:\s+[A-Z][-+]?(?:[0-9]+\.?[0-9]*|\.[0-9]+))*)\s*$"
+    )
 
     def _process_commands(self, commands, need_ack=True):
+        fast_cmd_match = self.fast_cmd_r.match
         for line in commands:
             # Ignore comments and leading/trailing spaces
             line = origline = line.strip()
             cpos = line.find(";")
             if cpos >= 0:
                 line = line[:cpos]
-            # Break line into parts and determine command
-            parts = self.args_r.split(line.upper())
-            if "".join(parts[:2]) == "N":
-                # Skip line number at start of command
-                cmd = "".join(parts[3:5]).strip()
+            # Check for a plain numeric command with a fast handler
+            fast_handler = gcmd = None
+            m = fast_cmd_match(line)
+            if m is not None:
+                cmd = m.group(1)
+                fast_handler = self.active_fast_handlers.get(cmd)
+            if fast_handler is not None:
+                params = {p[0]: float(p[1:]) for p in m.group(2).split()}
             else:
-                cmd = "".join(parts[:3]).strip()
-            # Build gcode "params" dictionary
-            params = {
-                parts[i]: parts[i + 1].strip() for i in range(1, len(parts), 2)
-            }
-            gcmd = GCodeCommand(self, cmd, origline, params, need_ack)
+                # Break line into parts and determine command
+                parts = self.args_r.split(line.upper())
+                if "".join(parts[:2]) == "N":
+                    # Skip line number at start of command
+                    cmd = "".join(parts[3:5]).strip()
+                else:
+                    cmd = "".join(parts[:3]).strip()
+                # Build gcode "params" dictionary
+                params = {
+                    parts[i]: parts[i + 1].strip()
+                    for i in range(1, len(parts), 2)
+                }
+                gcmd = GCodeCommand(self, cmd, origline, params, need_ack)
             # Invoke handler for command
-            handler = self.gcode_handlers.get(cmd, self.cmd_default)
             try:
-                handler(gcmd)
+                if gcmd is None:
+                    fast_handler(params, origline)
+                else:
+                    handler = self.gcode_handlers.get(cmd, self.cmd_default)
+                    handler(gcmd)
             except self.error as e:
                 self._respond_error(str(e))
                 self.printer.send_event("gcode:command_error")
@@ -320,7 +363,10 @@ class GCodeDispatch:
                 self._respond_error(msg)
                 if not need_ack:
                     raise
-            gcmd.ack()
+            if gcmd is not None:
+                gcmd.ack()
+            elif need_ack:
+                self.respond_raw("ok")
 
     def run_script_from_command(self, script):
         self._process_commands(script.split("\n"), need_ack=False)
@@ -1420,20 +1420,24 @@ class MCU:
     def register_flush_callback(self, callback):
         self._flush_callbacks.append(callback)
 
-    def flush_moves(self, print_time, clear_history_time):
+    def prepare_flush_moves(self, print_time, clear_history_time):
         if self._steppersync is None:
-            return
+            return None
         clock = self.print_time_to_clock(print_time)
         if clock < 0:
-            return
+            return None
         for cb in self._flush_callbacks:
             cb(print_time, clock)
         clear_history_clock = max(
             0, self.print_time_to_clock(clear_history_time)
         )
-        ret = self._ffi_lib.steppersync_flush(
-            self._steppersync, clock, clear_history_clock
-        )
+        return self._steppersync, clock, clear_history_clock
+
+    def flush_moves(self, print_time, clear_history_time):
+        flush = self.prepare_flush_moves(print_time, clear_history_time)
+        if flush is None:
+            return
+        ret = self._ffi_lib.steppersync_flush(*flush)
         if ret:
             raise error(
                 "Internal error in MCU '%s' stepcompress" % (self._name,)
@@ -200,6 +200,93 @@ def convert_msg_format(msgformat):
     return msgformat
 
 
+# Generate python code specialized for a message's parameter types.
+# Integer parameters are encoded and parsed inline instead of with a
+# method call per parameter.
+def _gen_encode_int(v):
+    return [
+        "if %s >= 0xC000000 or %s < -0x4000000:" % (v, v),
+        "    out.append((%s >> 28) & 0x7F | 0x80)" % (v,),
+        "if %s >= 0x180000 or %s < -0x80000:" % (v, v),
+        "    out.append((%s >> 21) & 0x7F | 0x80)" % (v,),
+        "if %s >= 0x3000 or %s < -0x1000:" % (v, v),
+        "    out.append((%s >> 14) & 0x7F | 0x80)" % (v,),
+        "if %s >= 0x60 or %s < -0x20:" % (v, v),
+        "    out.append((%s >> 7) & 0x7F | 0x80)" % (v,),
+        "out.append(%s & 0x7F)" % (v,),
+    ]
+
+
+def _gen_parse_int(v, signed):
+    lines = [
+        "c = s[pos]",
+        "pos += 1",
+        "%s = c & 0x7F" % (v,),
+        "if (c & 0x60) == 0x60:",
+        "    %s |= -0x20" % (v,),
+        "while c & 0x80:",
+        "    c = s[pos]",
+        "    pos += 1",
+        "    %s = (%s << 7) | (c & 0x7F)" % (v, v),
+    ]
+    if not signed:
+        lines.append("%s &= 0xFFFFFFFF" % (v,))
+    return lines
+
+
+def _gen_message_code(msgid_len, names, kinds):
+    encode = ["out = list(msgid_bytes)"]
+    parse = ["pos += %d" % (msgid_len,)]
+    for i, kind in enumerate(kinds):
+        v = "v%d" % (i,)
+        if kind == "generic":
+            encode.append("pts[%d].encode(out, params[%d])" % (i, i))
+            parse.append("%s, pos = pts[%d].parse(s, pos)" % (v, i))
+            continue
+        encode.append("%s = params[%d]" % (v, i))
+        encode.extend(_gen_encode_int(v))
+        parse.extend(_gen_parse_int(v, kind == "int"))
+    encode.append("return out")
+    parse.append(
+        "return {%s}, pos"
+        % (", ".join("%r: v%d" % (n, i) for i, n in enumerate(names)),)
+    )
+    by_name = "return encode([%s])" % (
+        ", ".join("params[%r]" % (n,) for n in names),
+    )
+    code = ["def make(msgid_bytes, pts):"]
+    code.append("    def encode(params):")
+    code.extend("        " + l for l in encode)
+    code.append("    def encode_by_name(**params):")
+    code.append("        " + by_name)
+    code.append("    def parse(s, pos):")
+    code.extend("        " + l for l in parse)
+    code.append("    return encode, encode_by_name, parse")
+    return "\n".join(code) + "\n"
+
+
+# Compiled code is shared by all messages with the same parameter layout
+_message_code_cache = {}
+
+
+def _compile_message(msgid_bytes, param_names):
+    names = tuple(name for name, t in param_names)
+    kinds = []
+    for name, t in param_names:
+        if isinstance(t, PT_uint32):
+            kinds.append("int" if t.signed else "uint")
+        else:
+            kinds.append("generic")
+    key = (len(msgid_bytes), names, tuple(kinds))
+    make = _message_code_cache.get(key)
+    if make is None:
+        code = _gen_message_code(len(msgid_bytes), names, kinds)
+        ns = {}
+        exec(compile(code, "<msgproto %s>" % (" ".join(names),), "exec"), ns)
+        make = _message_code_cache[key] = ns["make"]
+    return make(list(msgid_bytes), [t for name, t in param_names])
+
+
 class MessageFormat:
     def __init__(self, msgid_bytes, msgformat, enumerations=None):
         if enumerations is None:
@@ -211,6 +298,10 @@ class MessageFormat:
         self.param_names = lookup_params(msgformat, enumerations)
         self.param_types = [t for name, t in self.param_names]
         self.name_to_type = dict(self.param_names)
+        # Replace the generic encode and parse methods with specialized code
+        self.encode, self.encode_by_name, self.parse = _compile_message(
+            msgid_bytes, self.param_names
+        )
 
     def encode(self, params):
         out = list(self.msgid_bytes)
@@ -345,7 +436,10 @@ class MessageParser:
         return str(params)
 
     def parse(self, s):
-        msgid, param_pos = self.msgid_parser.parse(s, MESSAGE_HEADER_SIZE)
+        msgid = s[MESSAGE_HEADER_SIZE]
+        if msgid >= 0x60:
+            # Not a single byte positive id
+            msgid, param_pos = self.msgid_parser.parse(s, MESSAGE_HEADER_SIZE)
         mid = self.messages_by_id.get(msgid, self.unknown)
         params, pos = mid.parse(s, MESSAGE_HEADER_SIZE)
         if pos != len(s) - MESSAGE_TRAILER_SIZE:
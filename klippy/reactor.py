@@ -3,18 +3,31 @@
 # Copyright (C) 2016-2020  Kevin O'Connor <kevin@koconnor.net>
 #
 # This file may be distributed under the terms of the GNU GPLv3 license.
-import os, gc, select, math, time, logging, queue
+import os, gc, select, math, time, logging, queue, bisect, heapq
 import greenlet
 from . import chelper, util
 
 _NOW = 0.0
 _NEVER = 9999999999999999.0
 
+# Upper bounds of the timer lateness histogram buckets
+LATENESS_BUCKETS = (0.001, 0.005, 0.010, 0.025, 0.050, 0.100, 0.250)
+
+
+def _get_callback_name(callback):
+    obj = getattr(callback, "__self__", None)
+    if obj is not None:
+        return "%s.%s" % (type(obj).__name__, callback.__name__)
+    return getattr(callback, "__qualname__", type(callback).__name__)
+
 
 class ReactorTimer:
     def __init__(self, callback, waketime):
         self.callback = callback
         self.waketime = waketime
+        self.name = None
+        # Current entry in the timer heap (other entries are stale)
+        self.heap_entry = None
 
 
 class ReactorCompletion:
@@ -49,6 +62,7 @@ class ReactorCallback:
     def __init__(self, reactor, callback, waketime):
         self.reactor = reactor
         self.timer = reactor.register_timer(self.invoke, waketime)
+        self.timer.name = _get_callback_name(callback)
         self.callback = callback
         self.completion = ReactorCompletion(reactor)
 
@@ -120,8 +134,13 @@ class SelectReactor:
         self._check_gc = gc_checking
         self._last_gc_times = [0.0, 0.0, 0.0]
         # Timers
-        self._timers = []
+        self._timers = set()
+        self._timer_heap = []
+        self._timer_seq = 0
         self._next_timer = self.NEVER
+        self._lateness_counts = [0] * (len(LATENESS_BUCKETS) + 1)
+        self._max_lateness = 0.0
+        self._timer_stats = {}
         # Callbacks
         self._pipe_fds = None
         self._async_queue = queue.Queue()
@@ -137,23 +156,67 @@ class SelectReactor:
         return tuple(self._last_gc_times)
 
     # Timers
-    def update_timer(self, timer_handler, waketime):
+    def _schedule_timer(self, timer_handler, waketime):
         timer_handler.waketime = waketime
+        if waketime >= self.NEVER:
+            timer_handler.heap_entry = None
+            return
+        # Any previous heap entry of the timer is now stale
+        self._timer_seq += 1
+        entry = (waketime, self._timer_seq, timer_handler)
+        timer_handler.heap_entry = entry
+        heap = self._timer_heap
+        heapq.heappush(heap, entry)
+        if len(heap) > 2 * len(self._timers) + 64:
+            # Discard stale entries (in place, as it may be in use)
+            heap[:] = [
+                t.heap_entry for t in self._timers if t.heap_entry is not None
+            ]
+            heapq.heapify(heap)
+
+    def update_timer(self, timer_handler, waketime):
+        if timer_handler in self._timers:
+            self._schedule_timer(timer_handler, waketime)
+        else:
+            timer_handler.waketime = waketime
         self._next_timer = min(self._next_timer, waketime)
 
     def register_timer(self, callback, waketime=NEVER):
         timer_handler = ReactorTimer(callback, waketime)
-        timers = list(self._timers)
-        timers.append(timer_handler)
-        self._timers = timers
+        self._timers.add(timer_handler)
+        self._schedule_timer(timer_handler, waketime)
         self._next_timer = min(self._next_timer, waketime)
         return timer_handler
 
     def unregister_timer(self, timer_handler):
+        self._timers.remove(timer_handler)
         timer_handler.waketime = self.NEVER
-        timers = list(self._timers)
-        timers.pop(timers.index(timer_handler))
-        self._timers = timers
+        timer_handler.heap_entry = None
+
+    def _note_timer_call(self, t, duration):
+        name = t.name
+        if name is None:
+            name = t.name = _get_callback_name(t.callback)
+        stats = self._timer_stats.get(name)
+        if stats is None:
+            stats = self._timer_stats[name] = [0, 0.0, 0.0]
+        stats[0] += 1
+        stats[1] += duration
+        if duration > stats[2]:
+            stats[2] = duration
+
+    def get_timer_stats(self):
+        timers = {
+            name: {"count": c, "total_time": t, "max_time": m}
+            for name, (c, t, m) in self._timer_stats.items()
+        }
+        return {
+            "lateness_counts": list(self._lateness_counts),
+            "max_lateness": self._max_lateness,
+            "timers": timers,
+            "greenlets": len(self._all_greenlets),
+            "idle_greenlets": len(self._greenlets),
+        }
 
     def _check_timers(self, eventtime, busy):
         if eventtime < self._next_timer:
@@ -174,16 +237,55 @@ class SelectReactor:
             return min(1.0, max(0.001, self._next_timer - eventtime))
         self._next_timer = self.NEVER
         g_dispatch = self._g_dispatch
-        for t in self._timers:
-            waketime = t.waketime
-            if eventtime >= waketime:
-                t.waketime = self.NEVER
-                t.waketime = waketime = t.callback(eventtime)
-                if g_dispatch is not self._g_dispatch:
-                    self._next_timer = min(self._next_timer, waketime)
-                    self._end_greenlet(g_dispatch)
-                    return 0.0
-            self._next_timer = min(self._next_timer, waketime)
+        heap = self._timer_heap
+        last_seq = self._timer_seq
+        deferred = []
+        while heap and heap[0][0] <= eventtime:
+            entry = heapq.heappop(heap)
+            t = entry[2]
+            if entry is not t.heap_entry:
+                # Stale entry from an update_timer() or unregister_timer()
+                continue
+            if entry[1] > last_seq:
+                # Timer was rescheduled during this pass - run it next pass
+                deferred.append(entry)
+                continue
+            # Keep deferred timers in the heap in case this callback pauses
+            for d in deferred:
+                heapq.heappush(heap, d)
+            deferred = []
+            t.heap_entry = None
+            t.waketime = self.NEVER
+            start = self.monotonic()
+            waketime = entry[0]
+            if waketime > _NOW:
+                # Track how late the timer was dispatched
+                lateness = start - waketime
+                self._lateness_counts[
+                    bisect.bisect(LATENESS_BUCKETS, lateness)
+                ] += 1
+                if lateness > self._max_lateness:
+                    self._max_lateness = lateness
+            waketime = t.callback(eventtime)
+            if t in self._timers:
+                self._schedule_timer(t, waketime)
+            else:
+                t.waketime = waketime
+            if g_dispatch is self._g_dispatch:
+                self._note_timer_call(t, self.monotonic() - start)
+            else:
+                # Duration is unknown as the callback paused
+                self._note_timer_call(t, 0.0)
+                self._next_timer = min(self._next_timer, waketime)
+                self._end_greenlet(g_dispatch)
+                return 0.0
+        for d in deferred:
+            heapq.heappush(heap, d)
+        # Find the next wake time (discarding any stale entries)
+        while heap and heap[0] is not heap[0][2].heap_entry:
+            heapq.heappop(heap)
+        if heap:
+            self._next_timer = min(self._next_timer, heap[0][0])
         return 0.0
 
     # Callbacks and Completions
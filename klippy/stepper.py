@@ -243,6 +243,21 @@ class MCU_stepper:
         )
         return (data, count)
 
+    def set_step_stats_enabled(self, enabled):
+        ffi_main, ffi_lib = chelper.get_ffi()
+        ffi_lib.stepcompress_set_stats_enabled(self._stepqueue, enabled)
+
+    def get_step_stats(self):
+        ffi_main, ffi_lib = chelper.get_ffi()
+        stats = ffi_main.new("struct stepcompress_stats *")
+        ffi_lib.stepcompress_get_stats(self._stepqueue, stats)
+        return {
+            "step_count": stats.step_count,
+            "queue_step_count": stats.queue_step_count,
+            "gen_time": stats.gen_time,
+            "flush_time": stats.flush_time,
+        }
+
     def get_stepper_kinematics(self):
         return self._stepper_kinematics
 
@@ -302,7 +317,7 @@ class MCU_stepper:
     def add_active_callback(self, cb):
         self._active_callbacks.append(cb)
 
-    def generate_steps(self, flush_time):
+    def prepare_generate_steps(self, flush_time):
         # Check for activity if necessary
         if self._active_callbacks:
             sk = self._stepper_kinematics
@@ -312,8 +327,11 @@ class MCU_stepper:
                 self._active_callbacks = []
                 for cb in cbs:
                     cb(ret)
+        return self._stepper_kinematics
+
+    def generate_steps(self, flush_time):
+        sk = self.prepare_generate_steps(flush_time)
         # Generate steps
-        sk = self._stepper_kinematics
         ret = self._itersolve_generate_steps(sk, flush_time)
         if ret:
             raise error("Internal error in stepcompress")
@@ -324,6 +342,57 @@ class MCU_stepper:
         return ffi_lib.itersolve_is_active_axis(self._stepper_kinematics, a)
 
 
+# Generate steps for several steppers (and flush the steppersync of
+# several mcus) in parallel native threads
+class StepGenerationPool:
+    def __init__(self, num_threads):
+        ffi_main, ffi_lib = chelper.get_ffi()
+        self._pool = ffi_main.gc(
+            ffi_lib.stepgen_pool_alloc(num_threads), ffi_lib.stepgen_pool_free
+        )
+        self._pool_generate = ffi_lib.stepgen_pool_generate
+        self._pool_flush = ffi_lib.stepgen_pool_flush
+
+    def generate_steps(self, step_generators, flush_time):
+        steppers = []
+        for sg in step_generators:
+            mcu_stepper = getattr(sg, "__self__", None)
+            if (
+                not isinstance(mcu_stepper, MCU_stepper)
+                or sg != mcu_stepper.generate_steps
+            ):
+                # Not an MCU_stepper - run it from this thread
+                sg(flush_time)
+                continue
+            steppers.append(mcu_stepper)
+        sks = [s.prepare_generate_steps(flush_time) for s in steppers]
+        ret = self._pool_generate(self._pool, sks, len(sks), flush_time)
+        if ret >= 0:
+            raise error(
+                "Internal error in stepper '%s' stepcompress"
+                % (steppers[ret].get_name(),)
+            )
+
+    def flush_moves(self, mcus, flush_time, clear_history_time):
+        flushes = []
+        for m in mcus:
+            flush = m.prepare_flush_moves(flush_time, clear_history_time)
+            if flush is not None:
+                flushes.append((m, flush))
+        ret = self._pool_flush(
+            self._pool,
+            [f[0] for m, f in flushes],
+            [f[1] for m, f in flushes],
+            [f[2] for m, f in flushes],
+            len(flushes),
+        )
+        if ret >= 0:
+            raise error(
+                "Internal error in MCU '%s' stepcompress"
+                % (flushes[ret][0].get_name(),)
+            )
+
+
 # Helper code to build a stepper object from a config section
 def PrinterStepper(config, units_in_radians=False):
     printer = config.get_printer()
@@ -5,6 +5,7 @@
 # This file may be distributed under the terms of the GNU GPLv3 license.
 import math, logging, importlib
 from . import chelper
+from .stepper import StepGenerationPool
 from .kinematics import extruder
 from .extras.danger_options import get_danger_options
 
@@ -15,17 +16,48 @@ from .extras.danger_options import get_danger_options
 
 # Class to track each move request
 class Move:
+    # Many moves may be buffered in the look-ahead queue, so avoid a
+    # per-instance __dict__ (and only allocate timing_callbacks on use)
+    __slots__ = (
+        "toolhead",
+        "start_pos",
+        "end_pos",
+        "accel",
+        "junction_deviation",
+        "timing_callbacks",
+        "is_kinematic_move",
+        "axes_d",
+        "move_d",
+        "axes_r",
+        "min_move_t",
+        "max_start_v2",
+        "max_cruise_v2",
+        "delta_v2",
+        "max_smoothed_v2",
+        "smooth_delta_v2",
+        "next_junction_v2",
+        "start_v",
+        "cruise_v",
+        "end_v",
+        "accel_t",
+        "cruise_t",
+        "decel_t",
+    )
+
     def __init__(self, toolhead, start_pos, end_pos, speed):
         self.toolhead = toolhead
         self.start_pos = tuple(start_pos)
         self.end_pos = tuple(end_pos)
         self.accel = toolhead.max_accel
         self.junction_deviation = toolhead.junction_deviation
-        self.timing_callbacks = []
+        self.timing_callbacks = None
         velocity = min(speed, toolhead.max_velocity)
         self.is_kinematic_move = True
-        self.axes_d = axes_d = [end_pos[i] - start_pos[i] for i in (0, 1, 2, 3)]
-        self.move_d = move_d = math.sqrt(sum([d * d for d in axes_d[:3]]))
+        dx = end_pos[0] - start_pos[0]
+        dy = end_pos[1] - start_pos[1]
+        dz = end_pos[2] - start_pos[2]
+        self.axes_d = axes_d = [dx, dy, dz, end_pos[3] - start_pos[3]]
+        self.move_d = move_d = math.sqrt(dx * dx + dy * dy + dz * dz)
         if move_d < 0.000000001:
             # Extrude only move
             self.end_pos = (
@@ -233,6 +265,75 @@ class LookAheadQueue:
             self.flush(lazy=True)
 
 
+# Look-ahead queue that uses the C implementation of the junction
+# planner (chelper/lookahead.c).  LookAheadQueue.flush() remains the
+# reference implementation.
+class NativeLookAheadQueue(LookAheadQueue):
+    def __init__(self, toolhead):
+        LookAheadQueue.__init__(self, toolhead)
+        self.ffi_main, ffi_lib = chelper.get_ffi()
+        self.planner = self.ffi_main.gc(
+            ffi_lib.lookahead_alloc(), ffi_lib.lookahead_free
+        )
+        self.planner_reset = ffi_lib.lookahead_reset
+        self.planner_add_move = ffi_lib.lookahead_add_move
+        self.planner_flush = ffi_lib.lookahead_flush
+        self.planner_get_junctions = ffi_lib.lookahead_get_junctions
+        self.planner_pop_moves = ffi_lib.lookahead_pop_moves
+        # Number of moves at the start of the queue known to the planner
+        self.planner_count = 0
+
+    def reset(self):
+        LookAheadQueue.reset(self)
+        self.planner_reset(self.planner)
+        self.planner_count = 0
+
+    def flush(self, lazy=False):
+        self.junction_flush = LOOKAHEAD_FLUSH_TIME
+        queue = self.queue
+        planner = self.planner
+        # Junction limits are final once a move is queued - pass any new
+        # moves to the planner
+        planner_add_move = self.planner_add_move
+        for i in range(self.planner_count, len(queue)):
+            move = queue[i]
+            ret = planner_add_move(
+                planner,
+                move.move_d,
+                move.accel,
+                move.max_start_v2,
+                move.max_cruise_v2,
+                move.delta_v2,
+                move.max_smoothed_v2,
+                move.smooth_delta_v2,
+            )
+            if ret:
+                raise MemoryError("Unable to queue move in lookahead planner")
+            self.planner_count = i + 1
+        flush_count = self.planner_flush(planner, lazy)
+        if not flush_count:
+            return
+        # Equivalent of Move.set_junction() for the flushed moves
+        junctions = self.ffi_main.new("double[]", flush_count * 6)
+        self.planner_get_junctions(planner, junctions, flush_count)
+        junctions = self.ffi_main.unpack(junctions, flush_count * 6)
+        for i in range(flush_count):
+            move = queue[i]
+            j = i * 6
+            move.start_v = junctions[j]
+            move.cruise_v = junctions[j + 1]
+            move.end_v = junctions[j + 2]
+            move.accel_t = junctions[j + 3]
+            move.cruise_t = junctions[j + 4]
+            move.decel_t = junctions[j + 5]
+        # Generate step times for all moves ready to be flushed
+        self.toolhead._process_moves(queue[:flush_count])
+        # Remove processed moves from the queue
+        del queue[:flush_count]
+        self.planner_pop_moves(planner, flush_count)
+        self.planner_count -= flush_count
+
+
 BUFFER_TIME_LOW = 1.0
 BUFFER_TIME_HIGH = 2.0
 BUFFER_TIME_START = 0.250
@@ -261,7 +362,10 @@ class ToolHead:
             m for n, m in self.printer.lookup_objects(module="mcu")
         ]
         self.mcu = self.all_mcus[0]
-        self.lookahead = LookAheadQueue(self)
+        if get_danger_options().native_lookahead:
+            self.lookahead = NativeLookAheadQueue(self)
+        else:
+            self.lookahead = LookAheadQueue(self)
         self.lookahead.set_flush_time(BUFFER_TIME_HIGH)
         self.commanded_pos = [0.0, 0.0, 0.0, 0.0]
         # Velocity and acceleration control
@@ -319,6 +423,10 @@ class ToolHead:
         self.trapq_append = ffi_lib.trapq_append
         self.trapq_finalize_moves = ffi_lib.trapq_finalize_moves
         self.step_generators = []
+        self.stepgen_pool = None
+        stepgen_threads = get_danger_options().step_generation_threads
+        if stepgen_threads > 1:
+            self.stepgen_pool = StepGenerationPool(stepgen_threads)
         # Create kinematics class
         gcode = self.printer.lookup_object("gcode")
         self.Coord = gcode.Coord
@@ -406,8 +514,13 @@ class ToolHead:
             self.print_time - self.kin_flush_delay,
         )
         sg_flush_time = max(sg_flush_want, flush_time)
-        for sg in self.step_generators:
-            sg(sg_flush_time)
+        if self.stepgen_pool is not None:
+            self.stepgen_pool.generate_steps(
+                self.step_generators, sg_flush_time
+            )
+        else:
+            for sg in self.step_generators:
+                sg(sg_flush_time)
         self.min_restart_time = max(self.min_restart_time, sg_flush_time)
         # Free trapq entries that are no longer needed
         clear_history_time = self.clear_history_time
@@ -417,8 +530,13 @@ class ToolHead:
         self.trapq_finalize_moves(self.trapq, free_time, clear_history_time)
         self.extruder.update_move_time(free_time, clear_history_time)
         # Flush stepcompress and mcu steppersync
-        for m in self.all_mcus:
-            m.flush_moves(flush_time, clear_history_time)
+        if self.stepgen_pool is not None:
+            self.stepgen_pool.flush_moves(
+                self.all_mcus, flush_time, clear_history_time
+            )
+        else:
+            for m in self.all_mcus:
+                m.flush_moves(flush_time, clear_history_time)
         self.last_flush_time = flush_time
 
     def _advance_move_time(self, next_print_time):
@@ -480,8 +598,9 @@ class ToolHead:
             next_move_time = (
                 next_move_time + move.accel_t + move.cruise_t + move.decel_t
             )
-            for cb in move.timing_callbacks:
-                cb(next_move_time)
+            if move.timing_callbacks is not None:
+                for cb in move.timing_callbacks:
+                    cb(next_move_time)
         # Generate steps for moves
         if self.special_queuing_state:
             self._update_drip_move_time(next_move_time)
@@ -768,6 +887,8 @@ class ToolHead:
         if last_move is None:
             callback(self.get_last_move_time())
             return
+        if last_move.timing_callbacks is None:
+            last_move.timing_callbacks = []
         last_move.timing_callbacks.append(callback)
 
     def note_mcu_movequeue_activity(self, mq_time, set_step_gen_time=False):
@@ -9,6 +9,11 @@ from . import gcode
 from . import APP_NAME
 from .extras.danger_options import get_danger_options
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 REQUEST_LOG_SIZE = 20
 
 # Json decodes strings as unicode types in Python 2.x.  This doesn't
@@ -33,6 +38,40 @@ if sys.version_info.major < 3:
         return data
 
 
+def _json_convert(obj):
+    # numpy bool/array objects aren't directly serializable;
+    # convert to regular types in case they leak into state dicts
+    # to avoid a shutdown
+    if isinstance(obj, numpy.bool_):
+        return bool(obj)
+    elif isinstance(obj, numpy.ndarray):
+        return obj.tolist()
+    # orjson doesn't serialize named tuples or float subclasses
+    elif isinstance(obj, tuple):
+        return list(obj)
+    elif isinstance(obj, float):
+        return float(obj)
+    # anything else will fail
+    logging.warning(
+        f"_json_convert: can't serialize object of type {type(obj)}: '{str(obj)}'"
+    )
+    return obj
+
+
+# Use the (much faster) orjson encoder if it is installed
+if orjson is not None:
+    ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+    def json_encode(data):
+        return orjson.dumps(data, default=_json_convert, option=ORJSON_OPTIONS)
+
+else:
+
+    def json_encode(data):
+        jmsg = json.dumps(data, separators=(",", ":"), default=_json_convert)
+        return jmsg.encode()
+
+
 class WebRequestError(gcode.CommandError):
     def __init__(
         self,
@@ -312,26 +351,9 @@ class ClientConnection:
             return
         self.send(result)
 
-    def _json_convert(self, obj):
-        # numpy bool/array objects aren't directly serializable;
-        # convert to regular types in case they leak into state dicts
-        # to avoid a shutdown
-        if isinstance(obj, numpy.bool_):
-            return bool(obj)
-        elif isinstance(obj, numpy.ndarray):
-            return obj.tolist()
-        # anything else will fail
-        logging.warning(
-            f"_json_convert: can't serialize object of type {type(obj)}: '{str(obj)}'"
-        )
-        return obj
-
-    def send(self, data):
+    def encode(self, data):
         try:
-            jmsg = json.dumps(
-                data, separators=(",", ":"), default=self._json_convert
-            )
-            self.send_buffer += jmsg.encode() + b"\x03"
+            return json_encode(data)
         except (TypeError, ValueError) as e:
             msg = "json encoding error: %s\ndata: %s" % (
                 str(e),
@@ -339,7 +361,15 @@ class ClientConnection:
             )
             logging.exception(msg)
             self.printer.invoke_shutdown(msg)
-            return
+            return None
+
+    def send(self, data):
+        jmsg = self.encode(data)
+        if jmsg is not None:
+            self.send_encoded(jmsg)
+
+    def send_encoded(self, jmsg):
+        self.send_buffer += jmsg + b"\x03"
         if not self.is_blocking:
             self._do_send()
 
@@ -551,6 +581,7 @@ class QueryStatusHelper:
         self.pending_queries = []
         self.query_timer = None
         self.last_query = {}
+        self.last_versions = {}
         # Register webhooks
         webhooks = printer.lookup_object("webhooks")
         webhooks.register_endpoint("objects/list", self._handle_list)
@@ -568,6 +599,10 @@ class QueryStatusHelper:
     def _do_query(self, eventtime):
         last_query = self.last_query
         query = self.last_query = {}
+        last_versions = self.last_versions
+        versions = self.last_versions = {}
+        unchanged = set()
+        encoded = []
         msglist = self.pending_queries
         self.pending_queries = []
         msglist.extend(self.clients.values())
@@ -585,12 +620,24 @@ class QueryStatusHelper:
                     po = self.printer.lookup_object(obj_name, None)
                     if po is None or not hasattr(po, "get_status"):
                         res = query[obj_name] = {}
+                    elif hasattr(po, "get_status_version"):
+                        # Reuse the last result if the object reports
+                        # that its status has not changed
+                        ver = versions[obj_name] = po.get_status_version()
+                        res = last_query.get(obj_name)
+                        if res is None or ver != last_versions.get(obj_name):
+                            res = po.get_status(eventtime)
+                        else:
+                            unchanged.add(obj_name)
+                        query[obj_name] = res
                     else:
                         res = query[obj_name] = po.get_status(eventtime)
                 if req_items is None:
                     req_items = list(res.keys())
                     if req_items:
                         subscription[obj_name] = req_items
+                if not is_query and obj_name in unchanged:
+                    continue
                 lres = last_query.get(obj_name, {})
                 cres = {}
                 for ri in req_items:
@@ -603,7 +650,20 @@ class QueryStatusHelper:
             if cquery or is_query:
                 tmp = dict(template)
                 tmp["params"] = {"eventtime": eventtime, "status": cquery}
-                send_func(tmp)
+                if is_query:
+                    send_func(tmp)
+                    continue
+                # Clients with the same subscription receive the same
+                # update - only encode it once
+                for prev_tmp, jmsg in encoded:
+                    if prev_tmp == tmp:
+                        break
+                else:
+                    jmsg = cconn.encode(tmp)
+                    if jmsg is None:
+                        continue
+                    encoded.append((tmp, jmsg))
+                cconn.send_encoded(jmsg)
         if not query:
             # Unregister timer if there are no longer any subscriptions
             reactor = self.printer.get_reactor()
@@ -188,7 +188,8 @@ class DataLogger:
                     aname = cfgname.split()[-1]
                     lname = "%s:%s" % (st, aname)
                     qcmd = "%s/dump_%s" % (st, st)
-                    self.send_subscribe(lname, qcmd, {"sensor": aname})
+                    params = {"sensor": aname, "data_format": "binary"}
+                    self.send_subscribe(lname, qcmd, params)
 
     def handle_dump(self, msg, raw_msg):
         msg_id = msg["id"]
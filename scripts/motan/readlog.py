@@ -3,7 +3,7 @@
 # Copyright (C) 2021  Kevin O'Connor <kevin@koconnor.net>
 #
 # This file may be distributed under the terms of the GNU GPLv3 license.
-import json, zlib
+import json, zlib, base64, array, sys
 import logging
 
 
@@ -613,6 +613,16 @@ class JsonLogReader:
             self.msgs = msgs = parts
 
 
+# Convert "binary" bulk sensor data (base64 encoded little-endian
+# doubles) back to a list of rows
+def unpack_binary_data(params):
+    rows, cols = params["data_shape"]
+    values = array.array("d", base64.b64decode(params["data"]))
+    if sys.byteorder != "little":
+        values.byteswap()
+    return [values[i * cols : (i + 1) * cols].tolist() for i in range(rows)]
+
+
 # Store messages in per-subscription queues until handlers are ready for them
 class JsonDispatcher:
     def __init__(self, log_prefix):
@@ -645,8 +655,11 @@ class JsonDispatcher:
                 pt = json_msg.get("toolhead", {}).get("estimated_print_time")
                 if pt is not None:
                     self.last_read_time = pt
+            params = json_msg["params"]
+            if params.get("data_format") == "binary":
+                params["data"] = unpack_binary_data(params)
             for mq in self.queues.get(qid, []):
-                mq.append(json_msg["params"])
+                mq.append(params)
 
 
 ######################################################################
@@ -0,0 +1,216 @@
+import random
+
+import numpy
+import pytest
+
+from klippy import chelper
+from klippy.extras import bed_mesh
+
+
+class Config:
+    def getfloat(self, option, default, minval=None):
+        return {"move_check_distance": 3.0, "split_delta_z": 0.01}[option]
+
+
+def build_mesh(algo, count, pps):
+    params = {
+        "min_x": 10.5,
+        "max_x": 190.25,
+        "min_y": 12.0,
+        "max_y": 188.7,
+        "x_count": count,
+        "y_count": count + 1,
+        "mesh_x_pps": pps,
+        "mesh_y_pps": pps + 1 if pps else 0,
+        "algo": algo,
+        "tension": 0.2,
+    }
+    rand = random.Random(42)
+    matrix = [
+        [rand.uniform(-0.3, 0.3) for i in range(params["x_count"])]
+        for j in range(params["y_count"])
+    ]
+    z_mesh = bed_mesh.ZMesh(params, "test")
+    z_mesh.build_mesh(matrix)
+    return z_mesh
+
+
+def generate_moves(count):
+    rand = random.Random(42)
+    pos = [100.0, 100.0, 0.2, 0.0]
+    positions = [pos]
+    for i in range(count):
+        length = rand.choice([2.0, 20.0, 200.0])
+        pos = [
+            pos[0] + rand.uniform(-length, length),
+            pos[1] + rand.uniform(-length, length),
+            pos[2] + rand.choice([0.0, 0.0, 0.2]),
+            pos[3] + rand.uniform(0.0, 5.0),
+        ]
+        positions.append(pos)
+    return positions
+
+
+def split_moves(z_mesh, positions):
+    splitter = bed_mesh.MoveSplitter(Config(), None)
+    splitter.initialize(z_mesh, 0.05)
+    moves = []
+    for i in range(len(positions) - 1):
+        split = splitter.split_move(positions[i], positions[i + 1], 0.5)
+        moves.append([list(m) for m in split])
+    return moves
+
+
+@pytest.mark.parametrize(
+    "algo,count,pps", [("bicubic", 6, 3), ("lagrange", 4, 2), ("direct", 9, 0)]
+)
+def test_numpy_matches_python(monkeypatch, algo, count, pps):
+    positions = generate_moves(500)
+    z_mesh = build_mesh(algo, count, pps)
+    moves = split_moves(z_mesh, positions)
+    assert max(len(m) for m in moves) > bed_mesh.SPLIT_VECTOR_POINTS
+    monkeypatch.setattr(bed_mesh, "numpy", None)
+    python_mesh = build_mesh(algo, count, pps)
+    assert python_mesh.mesh_matrix == z_mesh.mesh_matrix
+    assert split_moves(python_mesh, positions) == moves
+
+
+def test_split_move_end_position():
+    z_mesh = build_mesh("bicubic", 6, 3)
+    splitter = bed_mesh.MoveSplitter(Config(), None)
+    splitter.initialize(z_mesh, 0.0)
+    moves = splitter.split_move(
+        [20.0, 20.0, 1.0, 0.0], [20.0, 20.0, 2.0, 1.0], 1
+    )
+    assert moves == [[20.0, 20.0, 2.0 + z_mesh.calc_z(20.0, 20.0), 1.0]]
+
+
+def test_calc_z_array_matches_calc_z():
+    z_mesh = build_mesh("bicubic", 6, 3)
+    z_mesh.set_mesh_offsets([1.5, -2.0])
+    z_mesh.set_zero_reference(100.0, 100.0)
+    rand = random.Random(42)
+    # Include points outside of the mesh, which use the nearest cell
+    x = [rand.uniform(0.0, 200.0) for i in range(1000)]
+    y = [rand.uniform(0.0, 200.0) for i in range(1000)]
+    z = z_mesh.calc_z_array(numpy.array(x), numpy.array(y))
+    assert z.tolist() == [z_mesh.calc_z(x[i], y[i]) for i in range(1000)]
+
+
+def python_adjust(z_mesh, fade, x, y, z):
+    bmesh = object.__new__(bed_mesh.BedMesh)
+    bmesh.fade_start, bmesh.fade_end, bmesh.fade_target = fade
+    bmesh.fade_dist = bmesh.fade_end - bmesh.fade_start
+    bmesh.tool_offset = 0.1
+    factor = bmesh.get_z_factor(z)
+    return (
+        factor * (z_mesh.calc_z(x, y) - bmesh.fade_target) + bmesh.fade_target
+    )
+
+
+def test_native_adjust_matches_python():
+    ffi_main, ffi_lib = chelper.get_ffi()
+    z_mesh = build_mesh("bicubic", 6, 3)
+    z_mesh.set_mesh_offsets([1.5, -2.0])
+    grid = ffi_main.gc(
+        ffi_lib.bed_mesh_grid_alloc(), ffi_lib.bed_mesh_grid_free
+    )
+    ffi_lib.bed_mesh_grid_set(
+        grid,
+        z_mesh.mesh_x_count,
+        z_mesh.mesh_y_count,
+        z_mesh.mesh_x_min,
+        z_mesh.mesh_y_min,
+        z_mesh.mesh_x_dist,
+        z_mesh.mesh_y_dist,
+        [z for line in z_mesh.mesh_matrix for z in line],
+    )
+    fade = (1.0, 10.0, 0.05)
+    ffi_lib.bed_mesh_grid_set_params(grid, 1.5, -2.0, *fade, 0.1)
+    # Wrap a cartesian z stepper
+    orig_sk = ffi_main.gc(ffi_lib.cartesian_stepper_alloc(b"z"), ffi_lib.free)
+    sk = ffi_main.gc(ffi_lib.bed_mesh_stepper_alloc(), ffi_lib.free)
+    assert ffi_lib.bed_mesh_stepper_set_sk(sk, orig_sk, grid) == 0
+    assert not ffi_lib.itersolve_is_active_axis(sk, b"x")
+    ffi_lib.bed_mesh_stepper_set_active(sk, 1)
+    assert ffi_lib.itersolve_is_active_axis(sk, b"x")
+    rand = random.Random(42)
+    for i in range(2000):
+        x, y = rand.uniform(0.0, 200.0), rand.uniform(0.0, 200.0)
+        z = rand.choice([0.2, 5.0, 20.0, rand.uniform(-1.0, 12.0)])
+        adj = python_adjust(z_mesh, fade, x, y, z)
+        assert ffi_lib.bed_mesh_grid_calc_adjust(grid, x, y, z) == adj
+        pos = ffi_lib.itersolve_calc_position_from_coord(sk, x, y, z)
+        assert pos == z + adj
+    ffi_lib.bed_mesh_stepper_set_active(sk, 0)
+    assert not ffi_lib.itersolve_is_active_axis(sk, b"x")
+    assert ffi_lib.itersolve_calc_position_from_coord(sk, 1.0, 2.0, 3.0) == 3.0
+    xy_sk = ffi_main.gc(ffi_lib.corexy_stepper_alloc(b"+"), ffi_lib.free)
+    assert ffi_lib.bed_mesh_stepper_set_sk(sk, xy_sk, grid) < 0
+
+
+class CacheConfig:
+    def __init__(self, printer, options):
+        self.printer = printer
+        self.options = options
+
+    def get_printer(self):
+        return self.printer
+
+    def get(self, option, default):
+        return self.options.get(option, default)
+
+    def getfloat(self, option, default, minval=None):
+        return self.options.get(option, default)
+
+
+class CachePrinter:
+    class Reactor:
+        def monotonic(self):
+            return 0.0
+
+    class HeaterBed:
+        target = 60.0
+
+        def get_status(self, eventtime):
+            return {"temperature": 59.5, "target": self.target}
+
+    def __init__(self):
+        self.heater_bed = self.HeaterBed()
+
+    def lookup_object(self, name, default=None):
+        return {"heater_bed": self.heater_bed}.get(name, default)
+
+    def get_reactor(self):
+        return self.Reactor()
+
+
+def test_probe_result_cache(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(bed_mesh.time, "time", lambda: now[0])
+    printer = CachePrinter()
+    options = {
+        "probe_cache_max_age": 10.0,
+        "probe_cache_file": str(tmp_path / "cache.json"),
+    }
+    cache = bed_mesh.ProbeResultCache(CacheConfig(printer, options))
+    assert cache.is_enabled()
+    assert cache.lookup([(10.0, 10.0)]) == {}
+    cache.store([(10.0, 10.0, 1.5), (50.0, 10.0, 1.25)])
+    now[0] += 60.0
+    cache.store([(50.0, 10.0, 1.0)])
+    points = [(50.04, 10.0), (90.0, 10.0), (10.0, 10.0)]
+    assert cache.lookup(points) == {0: 1.0, 2: 1.5}
+    # Results are only reused at a similar bed temperature
+    printer.heater_bed.target = 65.0
+    assert cache.lookup(points) == {}
+    cache.store([(90.0, 10.0, 0.5)])
+    printer.heater_bed.target = 61.0
+    assert cache.lookup(points) == {0: 1.0, 2: 1.5}
+    # Results persist across restarts and expire
+    reloaded = bed_mesh.ProbeResultCache(CacheConfig(printer, options))
+    assert reloaded.lookup(points) == {0: 1.0, 2: 1.5}
+    now[0] += 9.5 * 60.0
+    assert reloaded.lookup(points) == {0: 1.0}
+    disabled = bed_mesh.ProbeResultCache(CacheConfig(printer, {}))
+    assert not disabled.is_enabled()
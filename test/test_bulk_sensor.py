@@ -0,0 +1,96 @@
+import base64
+import random
+import struct
+
+import numpy
+
+from klippy.extras import bulk_sensor
+
+
+FORMATS = ["BBBBB", "<hhh", ">hhh", ">I", "<i", "<BH"]
+
+
+def unpack(msg):
+    data = base64.b64decode(msg["data"])
+    return numpy.frombuffer(data, "<f8").reshape(msg["data_shape"]).tolist()
+
+
+def test_pack_binary_data():
+    samples = [(3292.432935, -535.44309, -1529.8374, 9561.4), (1.0, 2, 3, 4)]
+    msg = {"data": samples, "overflows": 0}
+    packed = bulk_sensor.pack_binary_data(msg)
+    assert packed["overflows"] == 0
+    assert packed["data_format"] == "binary"
+    assert packed["data_shape"] == [2, 4]
+    assert unpack(packed) == [list(s) for s in samples]
+
+
+def test_pack_binary_data_nested():
+    moves = [
+        (4.05, 1.0, 0.0, 0.0, (300.0, 0.0, 0.0), (0.0, 0.0, 0.0)),
+        (5.054, 0.001, 0.0, 3000.0, (300.0, 0.0, 0.0), (-1.0, 0.0, 0.0)),
+    ]
+    packed = bulk_sensor.pack_binary_data({"data": moves})
+    assert packed["data_shape"] == [2, 10]
+    row = [5.054, 0.001, 0.0, 3000.0, 300.0, 0.0, 0.0, -1.0, 0.0, 0.0]
+    assert unpack(packed)[1] == row
+
+
+def test_pack_binary_data_fallback():
+    msgs = [
+        {"data": [(1.0, 2.0, 3.0, None), (2.0, 3.0, 4.0, None)]},
+        {"data": [(1.0, 2.0, 3.0), (2.0, 3.0)]},
+        {"data": [(1.0, (2.0, 3.0)), (2.0, (3.0,))]},
+        {"data": [(1.0, (2.0, None)), (2.0, (3.0, 4.0))]},
+    ]
+    for msg in msgs:
+        assert bulk_sensor.pack_binary_data(msg) is msg
+
+
+def random_data(rand, unpack_fmt, count):
+    size = struct.calcsize(unpack_fmt)
+    # Include a partial sample at the end of some messages
+    extra = rand.choice([0, 0, 1])
+    return bytes(rand.randrange(256) for i in range(size * count + extra))
+
+
+def test_decode_matches_struct():
+    rand = random.Random(42)
+    for unpack_fmt in FORMATS:
+        decoder = bulk_sensor.BulkDataDecoder(unpack_fmt)
+        size = struct.calcsize(unpack_fmt)
+        per_msg = bulk_sensor.MAX_BULK_MSG_SIZE // size
+        datas = [
+            random_data(rand, unpack_fmt, rand.randrange(per_msg + 1))
+            for i in range(20)
+        ]
+        msg_clocks = [i * per_msg - 3.5 for i in range(len(datas))]
+        time_base, inv_freq = 123.456, 0.000312
+        samples = decoder.decode(datas, msg_clocks, time_base, inv_freq)
+        expected = []
+        for data, msg_clock in zip(datas, msg_clocks):
+            for i in range(len(data) // size):
+                ptime = time_base + (msg_clock + i) * inv_freq
+                udata = struct.unpack_from(unpack_fmt, data, i * size)
+                expected.append((ptime,) + udata)
+        assert samples.shape == (len(expected), decoder.columns)
+        assert [tuple(row) for row in samples.tolist()] == expected
+
+
+def test_decode_empty():
+    decoder = bulk_sensor.BulkDataDecoder("<hhh")
+    assert decoder.decode([], [], 0.0, 1.0).shape == (0, 4)
+    assert decoder.decode([b"\x01"], [0.0], 0.0, 1.0).shape == (0, 4)
+    assert decoder.get_empty().shape == (0, 4)
+
+
+def test_sample_buffer():
+    rows = numpy.arange(400.0).reshape(100, 4)
+    for mmap_rows in [1 << 20, 32]:
+        buf = bulk_sensor.SampleBuffer(4, initial_rows=8, mmap_rows=mmap_rows)
+        buf.append([])
+        for i in range(0, 100, 7):
+            buf.append(rows[i : i + 7].tolist())
+        assert len(buf) == 100
+        assert buf.get_data().tolist() == rows.tolist()
+        assert (buf.mmap_file is not None) == (mmap_rows == 32)
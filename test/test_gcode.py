@@ -0,0 +1,98 @@
+import pytest
+
+import klippy.gcode
+
+
+class Printer:
+    command_error = klippy.gcode.CommandError
+    config_error = Exception
+
+    class Reactor:
+        def mutex(self):
+            return None
+
+    def __init__(self):
+        self.events = []
+
+    def get_start_args(self):
+        return {}
+
+    def get_reactor(self):
+        return self.Reactor()
+
+    def register_event_handler(self, event, callback):
+        pass
+
+    def send_event(self, event, *params):
+        self.events.append(event)
+
+
+@pytest.fixture
+def gcode():
+    gcode = klippy.gcode.GCodeDispatch(Printer())
+    gcode._handle_ready()
+    gcode.responses = []
+    gcode.register_output_handler(gcode.responses.append)
+    return gcode
+
+
+def register_g1(gcode):
+    calls = []
+
+    def cmd_G1(gcmd):
+        calls.append(("slow", dict(gcmd.get_command_parameters())))
+
+    def fast_G1(params, commandline):
+        calls.append(("fast", params))
+
+    gcode.register_command("G1", cmd_G1)
+    gcode.register_fast_command("G1", fast_G1)
+    return calls
+
+
+@pytest.mark.parametrize(
+    "line,params",
+    [
+        ("G1", {}),
+        ("G1 X10 Y-2.5 E.4 F1200", {"X": 10.0, "Y": -2.5, "E": 0.4, "F": 1200}),
+        ("  G1 X1.  Z+3 ; comment", {"X": 1.0, "Z": 3.0}),
+    ],
+)
+def test_fast_path(gcode, line, params):
+    calls = register_g1(gcode)
+    gcode._process_commands([line])
+    assert calls == [("fast", params)]
+    assert gcode.responses == ["ok"]
+
+
+@pytest.mark.parametrize(
+    "line",
+    ["g1 x10", "G1X10", "N5 G1 X10*12", "G1 X1e5", "G1 X", "G1 X1.2.3"],
+)
+def test_fast_path_fallback(gcode, line):
+    calls = register_g1(gcode)
+    gcode._process_commands([line])
+    assert [kind for kind, params in calls] == ["slow"]
+
+
+def test_fast_path_overridden(gcode):
+    calls = register_g1(gcode)
+    prev = gcode.register_command("G1", None)
+    gcode.register_command("G1", lambda gcmd: prev(gcmd))
+    gcode._process_commands(["G1 X10"])
+    assert calls == [("slow", {"G": "1", "X": "10"})]
+    gcode.register_command("G1", None)
+    gcode.register_command("G1", prev)
+    gcode._process_commands(["G1 X10"])
+    assert calls[-1] == ("fast", {"X": 10.0})
+
+
+def test_fast_path_error(gcode):
+    def fast_G1(params, commandline):
+        raise gcode.error("bad move")
+
+    gcode.register_command("G1", lambda gcmd: None)
+    gcode.register_fast_command("G1", fast_G1)
+    gcode._process_commands(["G1 X10"])
+    assert gcode.responses == ["!! bad move", "ok"]
+    assert gcode.printer.events == ["gcode:command_error"]
@@ -0,0 +1,111 @@
+import collections
+
+import jinja2
+
+from klippy.extras import gcode_macro
+
+Coord = collections.namedtuple("Coord", ("x", "y"))
+
+
+class StatusObject:
+    def __init__(self, status):
+        self.status = status
+        self.status_calls = 0
+
+    def get_status(self, eventtime):
+        self.status_calls += 1
+        return self.status
+
+
+class Printer:
+    class Reactor:
+        def monotonic(self):
+            return 0.0
+
+    class GCode:
+        error = Exception
+
+    def __init__(self, objects):
+        self.objects = dict(objects)
+        self.objects["gcode"] = self.GCode()
+        macro = object.__new__(gcode_macro.PrinterGCodeMacro)
+        macro.printer = self
+        self.objects["gcode_macro"] = macro
+
+    def lookup_object(self, name, default=None):
+        return self.objects.get(name, default)
+
+    def get_reactor(self):
+        return self.Reactor()
+
+
+def make_env():
+    return jinja2.Environment(
+        "{%", "%}", "{", "}", extensions=["jinja2.ext.do"]
+    )
+
+
+def find_inputs(script):
+    return gcode_macro.find_template_inputs(make_env(), script)
+
+
+def test_find_template_inputs():
+    assert find_inputs("{printer.toolhead.position.x} {val}") == (
+        ["val"],
+        ["toolhead"],
+    )
+    assert find_inputs("{printer['gcode_macro foo'].a}") == (
+        [],
+        ["gcode_macro foo"],
+    )
+    assert find_inputs("{printer[name].a}") is None
+    assert find_inputs("{% if 'fan' in printer %}1{% endif %}") is None
+    assert find_inputs("{% do val.append(1) %}") is None
+    assert find_inputs("{ [1, 2]|random }") is None
+
+
+def test_render_cache():
+    obj = StatusObject({"value": 1})
+    printer = Printer({"obj": obj})
+    script = "{printer.obj.value} {extra}"
+    template = gcode_macro.TemplateWrapperJinja(
+        printer, make_env(), "test", script
+    )
+    calls = []
+    template.template.render = lambda context: calls.append(1) or "x"
+    context = printer.objects["gcode_macro"].create_template_context
+    template.render(dict(context(), extra=1))
+    template.render(dict(context(), extra=1))
+    assert len(calls) == 1
+    template.render(dict(context(), extra=2))
+    obj.status = {"value": 2}
+    template.render(dict(context(), extra=2))
+    assert len(calls) == 3
+    # Actions may have side effects and are never cached
+    template.render(dict(context(), extra=lambda: None))
+    template.render(dict(context(), extra=lambda: None))
+    assert len(calls) == 5
+
+
+def test_copy_status():
+    status = {"pos": Coord(1.0, 2.0), "list": [1, [2]], "nested": ([3],)}
+    copied = gcode_macro.copy_status(status)
+    assert copied == status
+    assert copied["pos"] is status["pos"]
+    assert copied["list"][1] is not status["list"][1]
+    assert copied["nested"][0] is not status["nested"][0]
+
+
+def test_render_math():
+    obj = StatusObject({"x": 16.0})
+    printer = Printer({"toolhead": obj})
+    script = "{ math.sqrt(printer.toolhead.x) }"
+    template = gcode_macro.TemplateWrapperJinja(
+        printer, make_env(), "test", script
+    )
+    context = printer.objects["gcode_macro"].create_template_context
+    assert template.render(context()) == "4.0"
+    assert template.render(context()) == "4.0"
+    assert obj.status_calls == 2
+    obj.status = {"x": 25.0}
+    assert template.render(context()) == "5.0"
@@ -0,0 +1,88 @@
+import json
+import random
+
+from klippy import msgproto
+
+IDENTIFY = {
+    "commands": {
+        "config_stepper oid=%c step_pin=%u dir_pin=%u invert_step=%c": 10,
+        "queue_step oid=%c interval=%u count=%hu add=%hi": 11,
+        "spi_send oid=%c data=%*s": 12,
+    },
+    "responses": {
+        "stepper_position oid=%c pos=%i": 20,
+        "analog_in_state oid=%c next_clock=%u value=%hu": 21,
+        "trsync_state oid=%c can_trigger=%c trigger_reason=%c clock=%u": 22,
+        "sensor_bulk_data oid=%c sequence=%hu data=%*s": 23,
+        "shutdown clock=%u static_string_id=%hu": 200,
+    },
+    "output": {"debug a=%u b=%i": 30},
+    "enumerations": {
+        "pin": {"PA0": [0, 16]},
+        "static_string_id": {"Timer too close": 3},
+    },
+}
+
+INT_VALUES = {
+    "%u": [0, 1, 0x5F, 0x60, 0x2FFF, 0x3000, 0x17FFFF, 0x180000, 0xFFFFFFFF],
+    "%i": [0, -1, -0x20, -0x21, -0x1001, 0x7FFFFFFF, -0x80000000, 12345],
+    "%hu": [0, 0x7F, 0x80, 0xFFFF],
+    "%hi": [0, -1, -0x8000, 0x7FFF],
+    "%c": [0, 0x7F, 0x80, 0xFF],
+}
+
+
+def make_parser():
+    mp = msgproto.MessageParser()
+    mp.process_identify(json.dumps(IDENTIFY).encode(), decompress=False)
+    return mp
+
+
+def random_params(rand, mp, msgformat):
+    params = []
+    for arg in msgformat.split()[1:]:
+        name, fmt = arg.split("=")
+        t = mp.messages_by_name[msgformat.split()[0]].name_to_type[name]
+        if isinstance(t, msgproto.Enumeration):
+            params.append(rand.choice(list(t.enums)))
+        elif fmt == "%*s":
+            params.append(bytes(rand.randrange(256) for i in range(9)))
+        else:
+            params.append(rand.choice(INT_VALUES[fmt]))
+    return params
+
+
+def test_compiled_matches_generic():
+    mp = make_parser()
+    rand = random.Random(42)
+    formats = list(IDENTIFY["commands"]) + list(IDENTIFY["responses"])
+    for msgformat in formats * 50:
+        mf = mp.messages_by_name[msgformat.split()[0]]
+        params = random_params(rand, mp, msgformat)
+        cmd = mf.encode(params)
+        assert cmd == msgproto.MessageFormat.encode(mf, params)
+        by_name = dict(zip([n for n, t in mf.param_names], params))
+        assert mf.encode_by_name(**by_name) == cmd
+        msg = [0, 0] + cmd + [0, 0, 0]
+        res = mf.parse(msg, 2)
+        assert res == msgproto.MessageFormat.parse(mf, msg, 2)
+        assert res == (by_name, len(msg) - 3)
+        parsed = mp.parse(msg)
+        assert parsed.pop("#name") == mf.name
+        assert parsed == by_name
+
+
+def test_create_command():
+    mp = make_parser()
+    cmd = mp.create_command("queue_step oid=3 interval=40000 count=12 add=-5")
+    mf = mp.messages_by_name["queue_step"]
+    assert cmd == msgproto.MessageFormat.encode(mf, [3, 40000, 12, -5])
+    cmd = mp.create_command(
+        "config_stepper oid=1 step_pin=PA3 dir_pin=PA4 invert_step=0"
+    )
+    assert mp.messages_by_name["config_stepper"].parse(cmd, 0)[0] == {
+        "oid": 1,
+        "step_pin": "PA3",
+        "dir_pin": "PA4",
+        "invert_step": 0,
+    }
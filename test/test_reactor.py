@@ -0,0 +1,92 @@
+from klippy import reactor
+
+
+class Counter:
+    def __init__(self, r, count, interval):
+        self.reactor = r
+        self.calls = []
+        self.count = count
+        self.interval = interval
+        self.timer = r.register_timer(self.callback, r.monotonic())
+
+    def callback(self, eventtime):
+        self.calls.append(eventtime)
+        if len(self.calls) >= self.count:
+            return self.reactor.NEVER
+        return eventtime + self.interval
+
+
+def test_timer_stats():
+    r = reactor.Reactor()
+    fast = Counter(r, 20, 0.001)
+    slow = Counter(r, 3, 0.005)
+
+    def pausing(eventtime):
+        r.pause(r.monotonic() + 0.002)
+        return r.NEVER
+
+    def finish(eventtime):
+        r.end()
+        return r.NEVER
+
+    r.register_timer(pausing, r.monotonic())
+    r.register_callback(finish, r.monotonic() + 0.1)
+    r.run()
+    stats = r.get_timer_stats()
+    r.finalize()
+    assert len(fast.calls) == 20 and len(slow.calls) == 3
+    timers = stats["timers"]
+    assert timers["Counter.callback"]["count"] == 23
+    assert timers["test_timer_stats.<locals>.pausing"]["count"] == 1
+    assert timers["test_timer_stats.<locals>.finish"]["count"] == 1
+    assert timers["ReactorGreenlet.switch"]["count"] == 1
+    assert timers["Counter.callback"]["max_time"] >= 0.0
+    assert sum(stats["lateness_counts"]) >= 25
+    assert stats["max_lateness"] >= 0.0
+    assert stats["greenlets"] >= 2
+
+
+def test_timer_scheduling():
+    r = reactor.Reactor()
+    order = []
+    start = r.monotonic()
+
+    def make_cb(name, ret):
+        def cb(eventtime):
+            order.append(name)
+            return ret(eventtime)
+
+        return cb
+
+    # Rescheduling discards the old wake time
+    moved = r.register_timer(make_cb("moved", lambda e: r.NEVER), start)
+    r.update_timer(moved, start + 0.020)
+    r.register_timer(make_cb("first", lambda e: r.NEVER), start + 0.010)
+
+    # A timer that unregisters itself is not run again
+    def unregister(eventtime):
+        order.append("unregister")
+        r.unregister_timer(timer)
+        return eventtime
+
+    timer = r.register_timer(unregister, start + 0.005)
+    # A timer that always wants to run does not starve other timers
+    busy = r.register_timer(make_cb("busy", lambda e: r.NOW), start + 0.030)
+    r.register_timer(make_cb("late", lambda e: r.NEVER), start + 0.031)
+
+    def finish(eventtime):
+        r.unregister_timer(busy)
+        r.end()
+        return r.NEVER
+
+    r.register_timer(finish, start + 0.050)
+    r.run()
+    r.finalize()
+    busy_count = order.count("busy")
+    assert busy_count > 1
+    assert [n for n in order if n != "busy"] == [
+        "unregister",
+        "first",
+        "moved",
+        "late",
+    ]
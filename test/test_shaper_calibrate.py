@@ -0,0 +1,96 @@
+import math
+
+import numpy
+
+from klippy.extras import shaper_calibrate, shaper_defs
+
+
+def estimate_shaper(shaper, damping_ratio, test_freqs):
+    # Response of a single shaper calculated one test frequency at a time
+    A, T = shaper
+    vals = []
+    for freq in test_freqs:
+        omega = 2.0 * math.pi * freq
+        damping = damping_ratio * omega
+        omega_d = omega * math.sqrt(1.0 - damping_ratio**2)
+        S = C = 0.0
+        for a, t in zip(A, T):
+            w = a * math.exp(-damping * (T[-1] - t))
+            S += w * math.sin(omega_d * t)
+            C += w * math.cos(omega_d * t)
+        vals.append(math.sqrt(S**2 + C**2) / sum(A))
+    return vals
+
+
+def make_calibration_data():
+    freq_bins = numpy.arange(0.0, 200.0, 1.5625)
+    psd = 1000.0 / (1.0 + ((freq_bins - 47.0) / 3.0) ** 2)
+    psd += 300.0 / (1.0 + ((freq_bins - 110.0) / 5.0) ** 2)
+    return shaper_calibrate.CalibrationData(freq_bins, psd, psd, psd, psd)
+
+
+def test_estimate_shapers():
+    helper = shaper_calibrate.ShaperCalibrate(None)
+    test_freqs = numpy.arange(5.0, 200.0, 2.5)
+    for cfg in shaper_defs.INPUT_SHAPERS:
+        shapers = [cfg.init_func(freq, 0.1) for freq in [30.0, 55.5, 80.0]]
+        A = numpy.array([s[0] for s in shapers])
+        T = numpy.array([s[1] for s in shapers])
+        vals = helper._estimate_shapers(A, T, 0.075, test_freqs)
+        for shaper, shaper_vals in zip(shapers, vals):
+            expected = estimate_shaper(shaper, 0.075, test_freqs)
+            assert numpy.allclose(shaper_vals, expected, rtol=1e-12)
+            single = helper._estimate_shaper(shaper, 0.075, test_freqs)
+            assert (single == shaper_vals).all()
+
+
+def test_fit_shaper():
+    helper = shaper_calibrate.ShaperCalibrate(None)
+    calibration_data = make_calibration_data()
+    best, all_shapers = helper.find_best_shaper(calibration_data, scv=5.0)
+    assert [s.name for s in all_shapers] == shaper_calibrate.AUTOTUNE_SHAPERS
+    assert best in all_shapers
+    for cfg in shaper_defs.INPUT_SHAPERS:
+        if cfg.name not in shaper_calibrate.AUTOTUNE_SHAPERS:
+            continue
+        res = all_shapers[shaper_calibrate.AUTOTUNE_SHAPERS.index(cfg.name)]
+        shaper = cfg.init_func(res.freq, shaper_defs.DEFAULT_DAMPING_RATIO)
+        assert res.max_accel == helper.find_shaper_max_accel(shaper, 5.0)
+        assert res.smoothing == helper._get_shaper_smoothing(shaper, scv=5.0)
+        assert res.vals.shape == calibration_data.freq_bins.shape
+    # Test frequencies above max_smoothing are not considered
+    smooth, all_smooth = helper.find_best_shaper(
+        calibration_data, scv=5.0, max_smoothing=0.08
+    )
+    for res, limited in zip(all_shapers, all_smooth):
+        assert limited.freq >= res.freq or limited.smoothing <= 0.08
+
+
+def test_welch_accumulator():
+    helper = shaper_calibrate.ShaperCalibrate(None)
+    rand = numpy.random.default_rng(0)
+    times = 100.0 + numpy.arange(3200 * 12) / 3197.5
+    data = numpy.zeros((len(times), 4))
+    data[:, 0] = times
+    data[:, 1] = 3000.0 * numpy.sin(2.0 * math.pi * 42.0 * times)
+    data[:, 2] = 1000.0 * numpy.sin(2.0 * math.pi * 97.0 * times)
+    data[:, 3] = 9800.0
+    data[:, 1:] += rand.normal(scale=50.0, size=(len(times), 3))
+    expected = helper.calc_freq_response(data)
+    accumulator = shaper_calibrate.WelchAccumulator(helper)
+    pos = 0
+    while pos < len(data):
+        # Batches of varying size, as delivered by the bulk sensor client
+        count = int(rand.integers(0, 2000))
+        accumulator.add_samples(data[pos : pos + count])
+        pos += count
+        assert len(accumulator.pending) < 2 * 2048 + 2000
+    calibration_data = accumulator.get_calibration_data()
+    assert (calibration_data.freq_bins == expected.freq_bins).all()
+    for axis in ["x", "y", "z", "all"]:
+        assert numpy.allclose(
+            calibration_data.get_psd(axis), expected.get_psd(axis), rtol=1e-9
+        )
+    empty = shaper_calibrate.WelchAccumulator(helper)
+    empty.add_samples(data[:1000])
+    assert empty.get_calibration_data() is None
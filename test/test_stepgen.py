@@ -0,0 +1,76 @@
+import random
+
+from klippy import chelper
+
+STEPPERS = [
+    ("corexy_stepper_alloc", b"+"),
+    ("corexy_stepper_alloc", b"-"),
+    ("cartesian_stepper_alloc", b"x"),
+    ("cartesian_stepper_alloc", b"y"),
+    ("cartesian_stepper_alloc", b"z"),
+]
+
+
+def fill_trapq(ffi_lib, tq):
+    rand = random.Random(42)
+    print_time, pos = 0.1, [100.0, 100.0, 0.2]
+    for i in range(500):
+        axes_r = [rand.uniform(-1.0, 1.0) for i in range(3)]
+        axes_r[2] *= 0.1
+        move_t = rand.uniform(0.001, 0.02)
+        ffi_lib.trapq_append(
+            tq, print_time, 0.0, move_t, 0.0, *pos, *axes_r, 100.0, 100.0, 0.0
+        )
+        print_time += move_t
+        pos = [p + r * 100.0 * move_t for p, r in zip(pos, axes_r)]
+    return print_time
+
+
+def generate(pool_threads):
+    ffi_main, ffi_lib = chelper.get_ffi()
+    tq = ffi_main.gc(ffi_lib.trapq_alloc(), ffi_lib.trapq_free)
+    end_time = fill_trapq(ffi_lib, tq)
+    scs, sks = [], []
+    for oid, (alloc, param) in enumerate(STEPPERS):
+        sc = ffi_main.gc(
+            ffi_lib.stepcompress_alloc(oid), ffi_lib.stepcompress_free
+        )
+        ffi_lib.stepcompress_fill(sc, 25, 1, 2)
+        sk = ffi_main.gc(getattr(ffi_lib, alloc)(param), ffi_lib.free)
+        ffi_lib.itersolve_set_stepcompress(sk, sc, 0.0125)
+        ffi_lib.itersolve_set_trapq(sk, tq)
+        ffi_lib.itersolve_set_position(sk, 100.0, 100.0, 0.2)
+        scs.append(sc)
+        sks.append(sk)
+    ss = ffi_main.gc(
+        ffi_lib.steppersync_alloc(ffi_main.NULL, scs, len(scs), 16),
+        ffi_lib.steppersync_free,
+    )
+    ffi_lib.steppersync_set_time(ss, 0.0, 1000000.0)
+    pool = ffi_main.gc(
+        ffi_lib.stepgen_pool_alloc(pool_threads), ffi_lib.stepgen_pool_free
+    )
+    flush_time = 0.0
+    while flush_time < end_time + 0.1:
+        flush_time += 0.05
+        ret = ffi_lib.stepgen_pool_generate(pool, sks, len(sks), flush_time)
+        assert ret == -1
+    steps = []
+    hist = ffi_main.new("struct pull_history_steps[4096]")
+    for sc in scs:
+        assert ffi_lib.stepcompress_reset(sc, 0) == 0
+        count = ffi_lib.stepcompress_extract_old(sc, hist, 4096, 0, 1 << 62)
+        assert 0 < count < 4096
+        steps.append(
+            [
+                (h.first_clock, h.step_count, h.interval, h.add)
+                for h in hist[0:count]
+            ]
+        )
+    return steps
+
+
+def test_threaded_matches_single():
+    single = generate(1)
+    assert generate(4) == single
+    assert generate(len(STEPPERS) + 3) == single
@@ -0,0 +1,65 @@
+from klippy import chelper
+
+
+def test_step_stats():
+    ffi_main, ffi_lib = chelper.get_ffi()
+    sc = ffi_main.gc(ffi_lib.stepcompress_alloc(1), ffi_lib.stepcompress_free)
+    ffi_lib.stepcompress_fill(sc, 25, 1, 2)
+    ss = ffi_main.gc(
+        ffi_lib.steppersync_alloc(ffi_main.NULL, [sc], 1, 16),
+        ffi_lib.steppersync_free,
+    )
+    ffi_lib.steppersync_set_time(ss, 0.0, 1000000.0)
+    tq = ffi_main.gc(ffi_lib.trapq_alloc(), ffi_lib.trapq_free)
+    # 10mm move: 0.5mm accel, 9mm cruise, 0.5mm decel
+    ffi_lib.trapq_append(
+        tq,
+        0.1,
+        0.01,
+        0.09,
+        0.01,
+        0.0,
+        0.0,
+        0.0,
+        1.0,
+        0.0,
+        0.0,
+        0.0,
+        100.0,
+        10000.0,
+    )
+    sk = ffi_main.gc(ffi_lib.cartesian_stepper_alloc(b"x"), ffi_lib.free)
+    ffi_lib.itersolve_set_stepcompress(sk, sc, 0.0125)
+    ffi_lib.itersolve_set_trapq(sk, tq)
+    stats = ffi_main.new("struct stepcompress_stats *")
+    ffi_lib.stepcompress_set_stats_enabled(sc, 1)
+    assert ffi_lib.itersolve_generate_steps(sk, 0.3) == 0
+    assert ffi_lib.stepcompress_reset(sc, 0) == 0
+    ffi_lib.stepcompress_get_stats(sc, stats)
+    assert stats.step_count == 800
+    assert 0 < stats.queue_step_count < 100
+    assert stats.gen_time > 0.0
+    # Timing is only measured when enabled
+    ffi_lib.stepcompress_set_stats_enabled(sc, 0)
+    gen_time = stats.gen_time
+    ffi_lib.trapq_append(
+        tq,
+        0.3,
+        0.01,
+        0.09,
+        0.01,
+        10.0,
+        0.0,
+        0.0,
+        -1.0,
+        0.0,
+        0.0,
+        0.0,
+        100.0,
+        10000.0,
+    )
+    assert ffi_lib.itersolve_generate_steps(sk, 0.5) == 0
+    assert ffi_lib.stepcompress_reset(sc, 0) == 0
+    ffi_lib.stepcompress_get_stats(sc, stats)
+    assert stats.step_count == 1600
+    assert stats.gen_time == gen_time
@@ -0,0 +1,92 @@
+import math
+import random
+
+import klippy.toolhead
+
+
+class Extruder:
+    def calc_junction(self, prev_move, move):
+        return move.max_cruise_v2
+
+
+class ToolHead:
+    def __init__(self):
+        self.max_velocity = 300.0
+        self.max_accel = 3000.0
+        self.max_accel_to_decel = 1500.0
+        scv2 = 5.0**2
+        self.junction_deviation = scv2 * (math.sqrt(2.0) - 1.0) / 3000.0
+        self.extruder = Extruder()
+        self.processed = []
+
+    def _process_moves(self, moves):
+        for move in moves:
+            self.processed.append(
+                (
+                    move.start_v,
+                    move.cruise_v,
+                    move.end_v,
+                    move.accel_t,
+                    move.cruise_t,
+                    move.decel_t,
+                )
+            )
+
+
+def make_moves(toolhead, count):
+    rand = random.Random(0)
+    pos = [0.0, 0.0, 0.0, 0.0]
+    moves = []
+    for i in range(count):
+        newpos = [
+            pos[0] + rand.uniform(-2.0, 2.0),
+            pos[1] + rand.uniform(-2.0, 2.0),
+            pos[2],
+            pos[3] + rand.uniform(0.0, 0.1),
+        ]
+        speed = rand.choice([50.0, 150.0, 300.0])
+        moves.append(klippy.toolhead.Move(toolhead, pos, newpos, speed))
+        pos = newpos
+    return moves
+
+
+def run_queue(queue_class, count, seed):
+    toolhead = ToolHead()
+    queue = queue_class(toolhead)
+    moves = make_moves(toolhead, count)
+    rand = random.Random(seed)
+    for move in moves:
+        if rand.random() < 0.05:
+            # Slow moves break up the junction speed ramps
+            move.limit_speed(rand.uniform(1.0, 20.0), 500.0)
+        queue.add_move(move)
+        if rand.random() < 0.001:
+            queue.flush()
+    queue.flush()
+    return toolhead.processed
+
+
+def test_native_lookahead_matches_python():
+    for seed in range(5):
+        expected = run_queue(klippy.toolhead.LookAheadQueue, 5000, seed)
+        native = run_queue(klippy.toolhead.NativeLookAheadQueue, 5000, seed)
+        assert len(native) == 5000
+        assert native == expected
+
+
+def test_native_lookahead_reset():
+    toolhead = ToolHead()
+    queue = klippy.toolhead.NativeLookAheadQueue(toolhead)
+    for move in make_moves(toolhead, 100):
+        queue.add_move(move)
+    queue.reset()
+    del toolhead.processed[:]
+    for move in make_moves(toolhead, 100):
+        queue.add_move(move)
+    queue.flush()
+    expected = ToolHead()
+    python_queue = klippy.toolhead.LookAheadQueue(expected)
+    for move in make_moves(expected, 100):
+        python_queue.add_move(move)
+    python_queue.flush()
+    assert toolhead.processed == expected.processed
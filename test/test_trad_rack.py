@@ -0,0 +1,148 @@
+import importlib
+
+import pytest
+from klippy_testing import PrinterShim
+
+import klippy.gcode
+import klippy.toolhead
+
+CONFIG = """
+[danger_options]
+step_generation_threads: %d
+native_lookahead: %s
+
+[trad_rack]
+selector_max_velocity: 100
+selector_max_accel: 1000
+filament_max_accel: 1000
+"""
+
+
+class Reactor:
+    NOW = 0.0
+    NEVER = 9999999999999999.0
+
+    def monotonic(self):
+        return 0.0
+
+    def register_timer(self, callback, waketime=NEVER):
+        return callback
+
+    def update_timer(self, timer, waketime):
+        pass
+
+
+class MCU:
+    def __init__(self):
+        self.print_time = 0.0
+        self.flushes = []
+
+    def is_fileoutput(self):
+        return False
+
+    def estimated_print_time(self, eventtime):
+        return self.print_time
+
+    def prepare_flush_moves(self, print_time, clear_history_time):
+        self.flushes.append(print_time)
+
+    def flush_moves(self, print_time, clear_history_time):
+        self.prepare_flush_moves(print_time, clear_history_time)
+
+
+class Printer(PrinterShim):
+    def __init__(self, start_args):
+        super().__init__(start_args)
+        self.lookup_object("gcode").Coord = klippy.gcode.Coord
+        self.reactor = Reactor()
+        self.add_object("mcu", MCU())
+
+    def get_reactor(self):
+        return self.reactor
+
+    def lookup_objects(self, module=None):
+        if module is None:
+            return list(self.objects.items())
+        prefix = module + " "
+        return [
+            (k, v)
+            for k, v in self.objects.items()
+            if k == module or k.startswith(prefix)
+        ]
+
+    def register_event_handler(self, event, callback):
+        pass
+
+    def send_event(self, event, *params):
+        pass
+
+    def invoke_shutdown(self, msg):
+        raise AssertionError(msg)
+
+
+class Kinematics:
+    def __init__(self, toolhead, config, is_extruder_synced):
+        self.step_times = []
+        toolhead.register_step_generator(self.generate_steps)
+
+    def generate_steps(self, flush_time):
+        self.step_times.append(flush_time)
+
+    def check_move(self, move):
+        pass
+
+    def set_position(self, newpos, homing_axes):
+        pass
+
+
+def build_toolhead(monkeypatch, tmp_path, threads, native_lookahead=False):
+    config_file = tmp_path / "printer.cfg"
+    config_file.write_text(CONFIG % (threads, native_lookahead))
+    printer = Printer({"config_file": str(config_file)})
+    config = printer.load_config()
+    # trad_rack reads the danger options at import time
+    trad_rack = importlib.import_module("klippy.extras.trad_rack")
+    monkeypatch.setattr(trad_rack, "TradRackKinematics", Kinematics)
+    toolhead = trad_rack.TradRackToolHead(
+        config.getsection("trad_rack"), 50.0, lambda: False
+    )
+    return toolhead
+
+
+@pytest.mark.parametrize("threads", [1, 2])
+def test_toolhead_generates_steps(monkeypatch, tmp_path, threads):
+    toolhead = build_toolhead(monkeypatch, tmp_path, threads)
+    assert (toolhead.stepgen_pool is None) == (threads == 1)
+    toolhead.move([10.0, 0.0, 0.0, 0.0], 100.0)
+    toolhead.flush_step_generation()
+    assert toolhead.kin.step_times
+    assert toolhead.kin.step_times[-1] >= toolhead.print_time
+    # The background flush timer must also be able to run
+    toolhead._flush_handler(0.0)
+
+
+@pytest.mark.parametrize("threads", [1, 2])
+def test_toolhead_flushes_moves(monkeypatch, tmp_path, threads):
+    toolhead = build_toolhead(monkeypatch, tmp_path, threads)
+    mcu = toolhead.printer.lookup_object("mcu")
+    toolhead.move([10.0, 0.0, 0.0, 0.0], 100.0)
+    toolhead.lookahead.flush()
+    assert mcu.flushes[-1] == toolhead.last_flush_time
+    # Let the background flush timer catch up with the queued moves
+    last_flush_time = toolhead.last_flush_time
+    mcu.print_time = last_flush_time
+    toolhead._flush_handler(0.0)
+    assert mcu.flushes[-1] == toolhead.last_flush_time > last_flush_time
+
+
+@pytest.mark.parametrize("native_lookahead", [False, True])
+def test_toolhead_lookahead(monkeypatch, tmp_path, native_lookahead):
+    toolhead = build_toolhead(monkeypatch, tmp_path, 1, native_lookahead)
+    queue_class = klippy.toolhead.LookAheadQueue
+    if native_lookahead:
+        queue_class = klippy.toolhead.NativeLookAheadQueue
+    assert type(toolhead.lookahead) is queue_class
+    toolhead.move([10.0, 20.0, 0.0, 0.0], 100.0)
+    toolhead.move([20.0, 0.0, 0.0, 0.0], 100.0)
+    toolhead.flush_step_generation()
+    assert toolhead.kin.step_times[-1] >= toolhead.print_time
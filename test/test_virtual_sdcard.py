@@ -0,0 +1,232 @@
+import os
+import threading
+import time
+
+import pytest
+
+from klippy.extras import virtual_sdcard
+
+
+class Reactor:
+    NOW = 0.0
+    NEVER = 9999999999999999.0
+
+    def __init__(self):
+        self.waits = 0
+
+    def pause(self, waketime):
+        delay = waketime - self.monotonic()
+        if delay > 0.0:
+            self.waits += 1
+            time.sleep(delay)
+        return waketime
+
+    def monotonic(self):
+        return time.monotonic()
+
+    def unregister_timer(self, timer):
+        pass
+
+
+class PrintStats:
+    def __getattr__(self, name):
+        return lambda *args: None
+
+
+class GCode:
+    error = Exception
+
+    class Mutex:
+        def test(self):
+            return False
+
+    def __init__(self, sdcard, jumps):
+        self.sdcard = sdcard
+        self.jumps = jumps
+        self.lines = []
+
+    def get_mutex(self):
+        return self.Mutex()
+
+    def respond_raw(self, msg):
+        pass
+
+    def run_script(self, line):
+        sdcard = self.sdcard
+        self.lines.append((line, sdcard.file_position))
+        if line in self.jumps:
+            sdcard.set_file_position(self.jumps.pop(line))
+
+
+def run_file(path, jumps=None):
+    jumps = jumps or {}
+    sdcard = object.__new__(virtual_sdcard.VirtualSD)
+    sdcard.reactor = Reactor()
+    sdcard.print_stats = PrintStats()
+    sdcard.gcode = GCode(sdcard, dict(jumps))
+    sdcard.must_pause_work = sdcard.cmd_from_sd = False
+    sdcard.work_timer = None
+    sdcard.current_file = open(path, "rb")
+    sdcard.file_position = sdcard.next_file_position = 0
+    sdcard.work_handler(0.0)
+    assert sdcard.current_file is None
+    return sdcard.gcode.lines
+
+
+def expected_lines(data):
+    out = []
+    pos = 0
+    for line in data.split(b"\n")[:-1]:
+        out.append((line.decode(), pos))
+        pos += len(line) + 1
+    return out
+
+
+def test_file_positions(tmp_path, monkeypatch):
+    monkeypatch.setattr(virtual_sdcard, "READ_SIZE", 64)
+    lines = []
+    for i in range(500):
+        lines.append("G1 X%d Y%d" % (i, i * 2))
+        lines.append("; comment ü ✓ %d" % (i,))
+        lines.append("M117 " + "x" * (i % 150) + "\r")
+    data = ("\n".join(lines) + "\nG1 X0 ; no newline").encode()
+    path = tmp_path / "test.gcode"
+    path.write_bytes(data)
+    assert run_file(path) == expected_lines(data)
+
+
+def test_set_file_position(tmp_path):
+    data = b"G1 X1\n; \xc3\xbc\nG1 X2\nG1 X3\n"
+    path = tmp_path / "test.gcode"
+    path.write_bytes(data)
+    lines = run_file(path, {"G1 X2": 6})
+    assert lines == [
+        ("G1 X1", 0),
+        ("; \xfc", 6),
+        ("G1 X2", 11),
+        ("; \xfc", 6),
+        ("G1 X2", 11),
+        ("G1 X3", 17),
+    ]
+
+
+def test_read_ahead_does_not_block(tmp_path, monkeypatch):
+    path = tmp_path / "test.gcode"
+    path.write_bytes(b"G1 X1\nG1 X2\n")
+    storage_ready = threading.Event()
+    pread = os.pread
+
+    def slow_pread(*args):
+        storage_ready.wait()
+        return pread(*args)
+
+    monkeypatch.setattr(virtual_sdcard.os, "pread", slow_pread)
+    with open(path, "rb") as f:
+        start = time.monotonic()
+        reader = virtual_sdcard.FileReadAhead(f, 0)
+        assert reader.get_data() is None
+        reader.stop()
+        assert time.monotonic() - start < 0.5
+        storage_ready.set()
+        reader.thread.join()
+
+
+def build_index(path):
+    index = virtual_sdcard.GCodeFileIndex(str(path))
+    index.thread.join()
+    assert index.state == "ready"
+    return index
+
+
+def test_file_index(tmp_path, monkeypatch):
+    monkeypatch.setattr(virtual_sdcard, "READ_SIZE", 64)
+    lines = ["; header \xfc"]
+    for layer in range(20):
+        lines.append(";LAYER_CHANGE")
+        for obj in ["part_a", "part_b"]:
+            lines.append("EXCLUDE_OBJECT_START NAME=%s" % (obj,))
+            lines.extend("G1 X%d Y%d" % (layer, i) for i in range(5))
+            lines.append("EXCLUDE_OBJECT_END NAME=%s" % (obj,))
+    data = ("\n".join(lines) + "\n").encode()
+    path = tmp_path / "test.gcode"
+    path.write_bytes(data)
+    offsets = [pos for line, pos in expected_lines(data)]
+    index = build_index(path)
+    assert index.line_count == len(lines)
+    for line in range(1, len(lines) + 1):
+        assert index.get_line_offset(line) == offsets[line - 1]
+    assert index.get_line_offset(len(lines) + 1) is None
+    assert index.get_layer_count() == 20
+    layer_offset = index.get_layer_offset(3)
+    assert data[layer_offset:].startswith(b";LAYER_CHANGE")
+    assert index.get_layer(layer_offset - 1) == 2
+    assert index.get_layer(layer_offset) == 3
+    obj_offset = index.get_object_offset("PART_B", layer_offset)
+    assert data[obj_offset:].startswith(b"EXCLUDE_OBJECT_START NAME=part_b")
+    assert obj_offset < index.get_layer_offset(4)
+    # Second load uses the cache file
+    assert (tmp_path / ".test.gcode.index").exists()
+    monkeypatch.setattr(virtual_sdcard.GCodeFileIndex, "_scan_file", None)
+    cached = build_index(path)
+    assert cached.layer_offsets == index.layer_offsets
+    assert cached.object_offsets == index.object_offsets
+    assert cached.get_line_offset(50) == offsets[49]
+
+
+def test_file_index_no_trailing_newline(tmp_path, monkeypatch):
+    monkeypatch.setattr(virtual_sdcard, "READ_SIZE", 16)
+    data = b"G1 X1\n;LAYER_CHANGE\nG1 X2\nEXCLUDE_OBJECT_START NAME=part"
+    path = tmp_path / "test.gcode"
+    path.write_bytes(data)
+    index = build_index(path)
+    assert index.line_count == 4
+    assert index.get_line_offset(3) == 20
+    assert index.get_line_offset(4) == 26
+    assert index.get_line_offset(5) is None
+    assert index.get_layer_count() == 1
+    assert index.get_object_offset("PART") == 26
+
+
+class GCodeCommand:
+    error = Exception
+
+    def __init__(self, params):
+        self.params = params
+        self.responses = []
+
+    def get(self, name, default):
+        return self.params.get(name, default)
+
+    def get_int(self, name, default, minval=None):
+        return self.params.get(name, default)
+
+    def respond_info(self, msg):
+        self.responses.append(msg)
+
+
+def test_set_position_while_indexing(tmp_path, monkeypatch):
+    path = tmp_path / "test.gcode"
+    path.write_bytes(b"G1 X1\n;LAYER_CHANGE\nG1 X2\n")
+    scan_ready = threading.Event()
+    scan_file = virtual_sdcard.GCodeFileIndex._scan_file
+
+    def slow_scan_file(self):
+        scan_ready.wait()
+        scan_file(self)
+
+    monkeypatch.setattr(
+        virtual_sdcard.GCodeFileIndex, "_scan_file", slow_scan_file
+    )
+    sdcard = object.__new__(virtual_sdcard.VirtualSD)
+    sdcard.work_timer = None
+    sdcard.file_index = virtual_sdcard.GCodeFileIndex(str(path))
+    gcmd = GCodeCommand({"LAYER": 1})
+    # The command must fail right away instead of waiting for the scan
+    start = time.monotonic()
+    with pytest.raises(Exception, match=r"still building \(0% complete\)"):
+        sdcard.cmd_SDCARD_SET_POSITION(gcmd)
+    assert time.monotonic() - start < 0.5
+    scan_ready.set()
+    sdcard.file_index.thread.join()
+    sdcard.cmd_SDCARD_SET_POSITION(gcmd)
+    assert sdcard.file_position == 6
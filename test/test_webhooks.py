@@ -0,0 +1,137 @@
+import collections
+import json
+
+import numpy
+
+import klippy.webhooks
+
+
+class Printer:
+    class WebHooks:
+        def register_endpoint(self, path, callback):
+            pass
+
+    def __init__(self):
+        self.objects = {"webhooks": self.WebHooks()}
+
+    def lookup_object(self, name, default=None):
+        return self.objects.get(name, default)
+
+
+class StatusObject:
+    def __init__(self, status):
+        self.status = status
+        self.status_calls = 0
+
+    def get_status(self, eventtime):
+        self.status_calls += 1
+        return self.status
+
+
+class VersionedStatusObject(StatusObject):
+    def __init__(self, status):
+        super().__init__(status)
+        self.status_version = 0
+
+    def set_status(self, status):
+        self.status = status
+        self.status_version += 1
+
+    def get_status_version(self):
+        return self.status_version
+
+
+class Client:
+    def __init__(self):
+        self.sent = []
+        self.encode_calls = 0
+
+    def is_closed(self):
+        return False
+
+    def encode(self, msg):
+        self.encode_calls += 1
+        return klippy.webhooks.json_encode(msg)
+
+    def send(self, msg):
+        self.send_encoded(self.encode(msg))
+
+    def send_encoded(self, jmsg):
+        self.sent.append(json.loads(jmsg)["params"]["status"])
+
+
+def setup_query(objects):
+    printer = Printer()
+    printer.objects.update(objects)
+    helper = klippy.webhooks.QueryStatusHelper(printer)
+    client = Client()
+    subscription = {name: None for name in objects}
+    helper.clients[client] = (client, subscription, client.send, {})
+    return helper, client
+
+
+def test_unversioned_objects_always_queried():
+    obj = StatusObject({"value": 1})
+    helper, client = setup_query({"obj": obj})
+    helper._do_query(1.0)
+    helper._do_query(2.0)
+    obj.status = {"value": 2}
+    helper._do_query(3.0)
+    assert obj.status_calls == 3
+    assert client.sent == [{"obj": {"value": 1}}, {"obj": {"value": 2}}]
+
+
+def test_versioned_objects_skip_unchanged():
+    obj = VersionedStatusObject({"value": 1, "other": "a"})
+    helper, client = setup_query({"obj": obj})
+    helper._do_query(1.0)
+    helper._do_query(2.0)
+    helper._do_query(3.0)
+    assert obj.status_calls == 1
+    obj.set_status({"value": 2, "other": "a"})
+    helper._do_query(4.0)
+    helper._do_query(5.0)
+    assert obj.status_calls == 2
+    assert client.sent == [
+        {"obj": {"value": 1, "other": "a"}},
+        {"obj": {"value": 2}},
+    ]
+
+
+def test_versioned_objects_full_query():
+    obj = VersionedStatusObject({"value": 1})
+    helper, client = setup_query({"obj": obj})
+    helper._do_query(1.0)
+    query = []
+    helper.pending_queries.append((None, {"obj": None}, query.append, {}))
+    helper._do_query(2.0)
+    assert obj.status_calls == 1
+    assert query[0]["params"]["status"] == {"obj": {"value": 1}}
+
+
+def test_shared_subscription_encoded_once():
+    obj = StatusObject({"value": 1})
+    helper, client = setup_query({"obj": obj})
+    other = Client()
+    helper.clients[other] = (other, {"obj": None}, other.send, {})
+    helper._do_query(1.0)
+    assert client.encode_calls + other.encode_calls == 1
+    assert client.sent == other.sent == [{"obj": {"value": 1}}]
+
+
+def test_json_encode():
+    Coord = collections.namedtuple("Coord", ("x", "y"))
+    status = {
+        "position": Coord(1.5, 2.0),
+        "flag": numpy.bool_(True),
+        "values": numpy.array([0.25, 0.5]),
+        "scalar": numpy.float64(0.1),
+        "name": "test",
+    }
+    assert json.loads(klippy.webhooks.json_encode(status)) == {
+        "position": [1.5, 2.0],
+        "flag": True,
+        "values": [0.25, 0.5],
+        "scalar": 0.1,
+        "name": "test",
+    }